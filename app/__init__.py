@@ -7,9 +7,7 @@ from config import config_by_name  # <-- Import the config_by_name dictionary
 # config_by_name will be passed in from run.py, so we only need the base Config for type hinting if desired
 # from config import Config # Not strictly needed here if config object is passed in
 import logging
-from logging.handlers import RotatingFileHandler
 from datetime import datetime, timezone
-from sqlalchemy import text
 from flask_wtf import CSRFProtect
 
 db = SQLAlchemy() # Initialize SQLAlchemy extension
@@ -20,16 +18,19 @@ login_manager.login_view = 'client_portal.login'
 login_manager.login_message_category = 'info'
 login_manager.login_message = 'Please log in to access the client portal'
 
-def create_app(config_name: str):
+def create_app(config_name: str, config_overrides=None):
     """
     Application factory: creates and configures the Flask app.
-    Accepts a configuration object.
+    Accepts a configuration object; ``config_overrides`` (a dict) replaces
+    individual settings before any extension is initialised.
     """
     app = Flask(__name__, instance_relative_config=True)
 
     # Load configuration from the passed-in object
     selected_config = config_by_name[config_name]
     app.config.from_object(selected_config)
+    app.config.update(config_overrides or {})
+    app.config['CONFIG_NAME'] = config_name  # Lets worker processes build the same app
 
     # Register custom template filters
     from . import template_filters
@@ -51,6 +52,30 @@ def create_app(config_name: str):
     migrate.init_app(app, db) # Initialize Flask-Migrate with the app and SQLAlchemy
     login_manager.init_app(app) # Initialize LoginManager with the app
 
+    # In-process cache of compiled route plans used by patrol verification
+    from app.utils import route_plan
+    route_plan.init_app(app)
+
+    # Stream uploaded files straight to disk, hashing them as they arrive
+    from app.utils import uploads
+    uploads.init_app(app)
+
+    # Keep the denormalized shift/report client_id columns in step with their device
+    from app.utils import tenancy
+    tenancy.init_app(app)
+
+    # Keep the client_stats dashboard rollup in step with inserts and deletes
+    from app.utils import client_stats
+    client_stats.init_app(app)
+
+    # Opt-in per-request SQL instrumentation (SQL_INSTRUMENTATION)
+    from app.utils import sql_instrumentation
+    sql_instrumentation.init_app(app)
+
+    # Request, upload and verification metrics for /admin/metrics
+    from app.utils import metrics
+    metrics.init_app(app)
+
     # Initialize CSRF protection
     csrf = CSRFProtect()
     csrf.init_app(app)
@@ -58,34 +83,18 @@ def create_app(config_name: str):
     # Register CLI commands
     from app import commands
     app.cli.add_command(commands.test_db_connection_command)
+    app.cli.add_command(commands.process_reports_command)
+    app.cli.add_command(commands.rebuild_client_stats_command)
+    app.cli.add_command(commands.init_db_command)
 
     # Create upload folder if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
     # Configure logging
     if not app.debug and not app.testing:
-        # Ensure logs directory exists
-        log_dir = os.path.join(app.root_path, '..', 'logs')
-        os.makedirs(log_dir, exist_ok=True)
-
-        # Create rotating file handler
-        file_handler = RotatingFileHandler(
-            os.path.join(log_dir, 'ultraguard.log'),
-            maxBytes=102400,  # 100KB
-            backupCount=10
-        )
-        
-        # Set log format
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-        
-        # Set log level based on environment
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        
-        # Set overall app logger level
-        app.logger.setLevel(logging.INFO)
+        # Records are queued and written (file + stderr) by a background thread
+        from app.utils.logging_queue import configure_logging
+        configure_logging(app, os.path.join(app.root_path, '..', 'logs'))
         app.logger.info('Ultraguard startup')
     else:
         # For debug/testing, use console logging
@@ -104,48 +113,9 @@ def create_app(config_name: str):
 
         # Ensure models are known to SQLAlchemy
         from . import models
-        
-        # Test database connection and create tables if needed
-        try:
-            app.logger.info("Testing database connection...")
-            with db.engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-                conn.commit()
-            app.logger.info("✅ Database connection successful!")
-            
-            # Check if tables exist and create them if needed
-            try:
-                from .models import User
-                user_count = User.query.count()
-                app.logger.info(f"✅ Database tables exist. Found {user_count} users.")
-            except Exception as table_error:
-                app.logger.warning(f"⚠️  Database tables may not exist yet: {table_error}")
-                app.logger.info("🔄 Creating database tables...")
-                try:
-                    db.create_all()
-                    app.logger.info("✅ Database tables created successfully!")
-                except Exception as create_error:
-                    app.logger.error(f"❌ Failed to create tables: {create_error}", exc_info=True)
-            # Always check if admin user needs to be created
-            from .models import User
-            if User.query.count() == 0:
-                app.logger.info("🔄 Creating initial Ultraguard admin user...")
-                from werkzeug.security import generate_password_hash
-                admin_user = User(
-                    username="admin",
-                    email="admin@ultraguard.com",
-                    password_hash=generate_password_hash("admin123"),
-                    role="ULTRAGUARD_ADMIN",
-                    is_active=True
-                )
-                db.session.add(admin_user)
-                db.session.commit()
-                app.logger.info("✅ Initial Ultraguard admin user created!")
-                app.logger.info("📋 Admin credentials: admin / admin123")
-                
-        except Exception as db_error:
-            app.logger.error(f"❌ Database connection failed: {db_error}")
-            app.logger.error("Please check your DATABASE_URL environment variable.")
+
+    # No database access here: workers boot without touching the database.
+    # Connection check, table creation and the first admin are `flask init-db`.
 
     # Add root route redirect
     @app.route('/')
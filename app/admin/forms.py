@@ -196,6 +196,7 @@ class DeviceCSVUploadForm(FlaskForm):
         FileRequired(),
         FileAllowed(['csv'], 'CSV files only!')
     ])
+    update_existing = BooleanField('Update devices that already exist (matched by IMEI)', default=False)
     submit_csv = SubmitField('Upload CSV')
 
 class DeleteDeviceForm(FlaskForm):
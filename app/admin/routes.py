@@ -8,6 +8,7 @@ from io import StringIO
 from datetime import datetime, timezone, timedelta
 from werkzeug.utils import secure_filename
 import os
+import hmac
 from functools import wraps
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
@@ -17,6 +18,10 @@ from app.models import User, Client, Device, Shift, UploadedPatrolReport, Site,
 # Device will be used later
 from app.admin.forms import LoginForm, ClientForm, ClientUserCreationForm, SystemUserForm, DeviceForm, DeviceCSVUploadForm, DeleteDeviceForm, DeleteForm, PatrolReportUploadForm # <--- ADD new forms
 from wtforms import ValidationError # For custom validation in routes if needed
+from app.utils.client_stats import get_totals
+from app.utils.device_import import find_existing_devices, bulk_insert_devices, upsert_devices, UPSERT_COLUMNS
+from app.utils.stage_metrics import stage_percentiles
+from app.utils import metrics
 
 def admin_required(f):
     @wraps(f)
@@ -105,11 +110,9 @@ def dashboard():
          logout_user() # Log them out if they somehow got here without proper role
          return redirect(url_for('admin.login'))
          
-    # For now, a simple dashboard. We'll add stats later.
-    # Example stats (to be uncommented when Client, Device models are used in queries):
-    # from app.models import Client, Device
-    num_clients = Client.query.count()
-    num_devices = Device.query.count()
+    totals = get_totals() # Summed from the client_stats rollup instead of counting whole tables
+    num_clients = totals.clients
+    num_devices = totals.devices
     ug_admin_users_count = User.query.filter_by(role='ULTRAGUARD_ADMIN').count() # Example for another card
 
     return render_template('dashboard.html', 
@@ -995,18 +998,18 @@ def upload_devices():
                     flash(f"CSV file is missing required column: '{col}'", 'danger')
                     return redirect(url_for('admin.upload_devices'))
 
-            devices_added_count = 0
             errors_found = []
             imei_duplicates = set()
             csv_imeis = {}
+            candidate_rows = []
             valid_rows = []
 
             # First pass: validate all rows and collect errors
             for row_num, row in enumerate(csv_reader, 1):
                 imei = row.get('imei', '').strip()
                 name = row.get('name', '').strip()
-                model = row.get('model', '').strip() or 'Unknown'
-                status = row.get('status', 'active').strip().lower() or 'active'
+                model = row.get('model', '').strip()
+                status = row.get('status', '').strip().lower()
                 last_seen_str = row.get('last_seen', '').strip()
                 notes = row.get('notes', '').strip()
 
@@ -1036,26 +1039,40 @@ def upload_devices():
                     errors_found.append(f"Row {row_num}: Invalid IMEI format for '{imei}'. Must be 14-16 digits.")
                     continue
 
-                # Check for duplicate IMEI in database
-                existing_device = Device.query.filter_by(imei=imei).first()
-                if existing_device:
-                    errors_found.append(f"Row {row_num}: IMEI '{imei}' already exists in the system (Device ID: {existing_device.id}, Client: {existing_device.client.name}).")
-                    continue
-
-                # Validate status
-                if status not in ['active', 'inactive']:
-                    errors_found.append(f"Row {row_num}: Invalid status '{status}'. Must be 'active' or 'inactive'.")
-                    continue
-
-                # If all validations pass, add to valid_rows
-                valid_rows.append({
+                # Blank name/model/status get their defaults below, for new devices only
+                candidate_rows.append((row_num, {
                     'imei': imei,
-                    'name': name or f"Device {imei[:4]}...{imei[-4:]}",
+                    'name': name,
                     'model': model,
                     'status': status,
                     'last_seen': last_seen,
                     'notes': notes
-                })
+                }))
+
+            # Check for IMEIs already in the database with a few IN (...) queries rather than one per row
+            update_existing = form.update_existing.data
+            existing_devices = find_existing_devices([device_data['imei'] for _, device_data in candidate_rows])
+            for row_num, device_data in candidate_rows:
+                existing_device = existing_devices.get(device_data['imei'])
+                if existing_device:
+                    if not update_existing:
+                        errors_found.append(f"Row {row_num}: IMEI '{device_data['imei']}' already exists in the system (Device ID: {existing_device.id}, Client: {existing_device.client_name}).")
+                        continue
+                    if existing_device.client_id != client.id:
+                        errors_found.append(f"Row {row_num}: IMEI '{device_data['imei']}' belongs to another client (Device ID: {existing_device.id}, Client: {existing_device.client_name}) and cannot be updated from here.")
+                        continue
+                else:
+                    device_data['name'] = device_data['name'] or f"Device {device_data['imei'][:4]}...{device_data['imei'][-4:]}"
+                    device_data['model'] = device_data['model'] or 'Unknown'
+                    device_data['status'] = device_data['status'] or 'active'
+
+                # Validate status (blank keeps an existing device's status)
+                if device_data['status'] and device_data['status'] not in ['active', 'inactive']:
+                    errors_found.append(f"Row {row_num}: Invalid status '{device_data['status']}'. Must be 'active' or 'inactive'.")
+                    continue
+
+                # If all validations pass, add to valid_rows
+                valid_rows.append(device_data)
 
             # If there are validation errors, don't proceed with import
             if errors_found:
@@ -1064,24 +1081,20 @@ def upload_devices():
                 flash('No devices were added due to errors in the CSV file. Please correct and re-upload.', 'warning')
                 return redirect(url_for('admin.upload_devices'))
 
-            # Second pass: add valid devices to database
+            # Second pass: write valid devices to database in bulk
             try:
-                for device_data in valid_rows:
-                    new_device = Device(
-                        client_id=form.client_id.data,
-                        imei=device_data['imei'],
-                        name=device_data['name'],
-                        model=device_data['model'],
-                        status=device_data['status'],
-                        last_seen=device_data['last_seen'],
-                        notes=device_data['notes']
-                    )
-                    db.session.add(new_device)
-                    devices_added_count += 1
-
-                db.session.commit()
-                flash(f'{devices_added_count} new devices successfully imported from CSV!', 'success')
-                current_app.logger.info(f"Successfully imported {devices_added_count} devices for client {form.client_id.data}")
+                if update_existing:
+                    # Only sync the optional columns the file actually has
+                    sync_columns = [col for col in UPSERT_COLUMNS if col in required_cols or col in csv_reader.fieldnames]
+                    result = upsert_devices(client.id, valid_rows, existing_devices, columns=sync_columns)
+                    db.session.commit()
+                    flash(f'Device CSV synced: {result.inserted} added, {result.updated} updated, {result.unchanged} unchanged.', 'success')
+                    current_app.logger.info(f"Device CSV upsert for client {client.id}: {result.inserted} inserted, {result.updated} updated, {result.unchanged} unchanged")
+                else:
+                    devices_added_count = bulk_insert_devices(client.id, valid_rows)
+                    db.session.commit()
+                    flash(f'{devices_added_count} new devices successfully imported from CSV!', 'success')
+                    current_app.logger.info(f"Successfully imported {devices_added_count} devices for client {form.client_id.data}")
 
             except IntegrityError as e:
                 db.session.rollback()
@@ -1271,6 +1284,28 @@ def upload_patrol_report():
                          title='Upload Patrol Report',
                          form=form)
 
+@bp.route('/reports/processing-metrics')
+@login_required
+@admin_required
+def report_processing_metrics():
+    days = request.args.get('days', 30, type=int)
+    days = max(1, min(days, 365))
+    return render_template('admin/reports/processing_metrics.html',
+                           title='Report Processing Times',
+                           stages=stage_percentiles(days=days),
+                           days=days)
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    # Scraped by Prometheus rather than viewed, so guarded by a bearer token instead of a login
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token or not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return current_app.response_class('Unauthorized\n', status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return current_app.response_class(metrics.render_metrics(), content_type=metrics.CONTENT_TYPE)
+
 @bp.route('/landing_redirect')
 def landing_redirect():
     if current_user.is_authenticated and hasattr(current_user, 'is_ultraguard_admin') and current_user.is_ultraguard_admin():
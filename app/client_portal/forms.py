@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileRequired, FileAllowed
+from flask_wtf.file import FileField, FileRequired, FileAllowed, MultipleFileField
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, SelectField, SelectMultipleField, DateField, TimeField, HiddenField
 from wtforms.validators import DataRequired, Length, Optional, ValidationError
 from app.models import Checkpoint, Device, Route, Site, Shift
@@ -92,11 +92,18 @@ class CheckpointForm(FlaskForm):
         except ValueError:
             raise ValidationError('Please enter a valid number for radius.')
 
+class BatchReportUploadForm(FlaskForm):
+    report_files = MultipleFileField('Report Files', validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'csv.gz', 'zip'], 'CSV (optionally .csv.gz) or ZIP files only!')
+    ])
+    submit_batch = SubmitField('Upload and verify')
+
 class PatrolReportUploadForm(FlaskForm):
     shift_id = SelectField('Select Shift to Associate Report With', coerce=int, validators=[DataRequired()])
     report_file = FileField('iTalk Geo Fence Report File', validators=[
         FileRequired(),
-        FileAllowed(['csv', 'xlsx'], 'CSV or XLSX files only!')
+        FileAllowed(['csv', 'csv.gz', 'zip', 'xlsx'], 'CSV (optionally .csv.gz or .zip) or XLSX files only!')
     ])
     source_system = StringField('Source System (e.g., italk ptt)', default='italk ptt', validators=[Optional(), Length(max=50)])
     submit_report = SubmitField('Upload iTalk Geo Fence report')
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from urllib.parse import urlparse
 from datetime import datetime, timezone
@@ -6,15 +6,23 @@ from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy import text, select, or_
 from app import db, login_manager
 from app.client_portal import bp
-from app.models import User, Client, Site, Checkpoint, Route, Shift, Device, UploadedPatrolReport, RouteCheckpoint
-from app.client_portal.forms import ClientLoginForm, SiteForm, PatrolReportUploadForm, CheckpointForm, RouteForm, ShiftForm
+from app.models import User, Client, Site, Checkpoint, Route, Shift, Device, UploadedPatrolReport, RouteCheckpoint, VerifiedVisit
+from app.client_portal.forms import ClientLoginForm, SiteForm, PatrolReportUploadForm, BatchReportUploadForm, CheckpointForm, RouteForm, ShiftForm
 from app.exceptions import (
     FileUploadError, InvalidFileTypeError, CSVValidationError,
     DeviceIdentifierMismatchError, VerificationLogicError
 )
 from app.utils.file_handlers import save_uploaded_file, validate_csv_structure, read_csv_data
 from app.utils.verification import verify_patrol_report
-from app.utils.report_processing import handle_report_submission_and_processing
+from app.utils.report_processing import handle_report_submission_and_processing, REPORT_STATUS_PROCESSING
+from app.utils.batch_upload import handle_batch_upload
+from app.utils.stage_metrics import report_stage_metrics
+from app.utils.pagination import keyset_paginate
+from app.utils.client_stats import get_client_stats
+from app.repository import (
+    shifts_for_client, reports_for_client, report_for_client, verified_visits_for_report,
+    routes_for_client, route_with_checkpoints
+)
 from functools import wraps
 
 # Helper decorator for client portal access
@@ -31,6 +39,16 @@ def client_portal_access_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _keyset_page(query, columns, key, descending=False):
+    """One page of a client listing, positioned by the ?after= / ?before= cursors in the request."""
+    return keyset_paginate(
+        query, columns, key,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=current_app.config.get('ITEMS_PER_PAGE', 10),
+        descending=descending
+    )
+
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -163,55 +181,28 @@ def dashboard():
         logout_user()
         return redirect(url_for('client_portal.login'))
 
-    # Get client's data
-    sites = Site.query.filter_by(client_id=client.id).count()
-    devices = Device.query.filter_by(client_id=client.id).count()
-    routes = Route.query.filter_by(client_id=client.id).count()
-
-    # Count checkpoints associated with client's routes using the correct join
-    checkpoints = Checkpoint.query\
-        .join(RouteCheckpoint, Checkpoint.id == RouteCheckpoint.checkpoint_id)\
-        .join(Route, RouteCheckpoint.route_id == Route.id)\
-        .filter(Route.client_id == client.id)\
-        .distinct()\
-        .count()
-
-    # Count total shifts for client's devices
-    total_shifts = Shift.query\
-        .join(Device, Shift.device_id == Device.id)\
-        .filter(Device.client_id == client.id)\
-        .count()
-
-    # Count patrol reports for client's devices through shifts
-    reports = UploadedPatrolReport.query\
-        .join(Shift, UploadedPatrolReport.shift_id == Shift.id)\
-        .join(Device, Shift.device_id == Device.id)\
-        .filter(Device.client_id == client.id)\
-        .count()
+    # Counters come from the client_stats rollup: one primary-key read however much history there is
+    stats = get_client_stats(client.id)
 
     return render_template('client_portal/dashboard.html',
                          title=f'{client.name} - Dashboard',
                          client=client,
-                         num_sites=sites,
-                         num_devices=devices,
-                         num_routes=routes,
-                         num_checkpoints=checkpoints,
-                         num_total_shifts=total_shifts,
-                         num_reports=reports)
+                         num_sites=stats.sites,
+                         num_devices=stats.devices,
+                         num_routes=stats.routes,
+                         num_checkpoints=stats.checkpoints,
+                         num_total_shifts=stats.shifts,
+                         num_reports=stats.reports)
 
 @bp.route('/sites')
 @login_required
 @client_portal_access_required
 def list_sites():
     # client_id is confirmed by client_portal_access_required
-    sites = Site.query.filter_by(client_id=current_user.client_id).order_by(Site.name).all()
-    # For pagination (optional, can be implemented later):
-    # page = request.args.get('page', 1, type=int)
-    # sites_pagination = Site.query.filter_by(client_id=current_user.client_id).order_by(Site.name).paginate(
-    #     page=page, per_page=current_app.config.get('ITEMS_PER_PAGE', 10), error_out=False
-    # )
-    # sites = sites_pagination.items
-    # return render_template('client_portal/sites/list.html', title='My Sites', sites=sites, pagination=sites_pagination)
+    sites = _keyset_page(
+        Site.query.filter_by(client_id=current_user.client_id),
+        (Site.name, Site.id), lambda site: (site.name, site.id)
+    )
     return render_template('client_portal/sites/list.html', title='My Sites', sites=sites)
 
 @bp.route('/sites/add', methods=['GET', 'POST'])
@@ -318,14 +309,17 @@ def delete_site(site_id):
 @login_required
 @client_portal_access_required
 def list_checkpoints():
-    checkpoints = Checkpoint.query.filter_by(client_id=current_user.client_id).order_by(Checkpoint.name).all()
+    checkpoints = _keyset_page(
+        Checkpoint.query.filter_by(client_id=current_user.client_id),
+        (Checkpoint.name, Checkpoint.id), lambda checkpoint: (checkpoint.name, checkpoint.id)
+    )
     return render_template('client_portal/checkpoints/list.html', title='My Checkpoints', checkpoints=checkpoints)
 
 @bp.route('/routes')
 @login_required
 @client_portal_access_required
 def list_routes():
-    routes = Route.query.filter_by(client_id=current_user.client_id).order_by(Route.name).all()
+    routes = routes_for_client(current_user.client_id)
     return render_template('client_portal/routes/list.html', title='My Routes', routes=routes)
 
 @bp.route('/routes/add', methods=['GET', 'POST'])
@@ -384,8 +378,8 @@ def add_route():
 @login_required
 @client_portal_access_required
 def edit_route(route_id):
-    route = db.session.get(Route, route_id)
-    if not route or route.client_id != current_user.client_id:
+    route, route_checkpoints = route_with_checkpoints(current_user.client_id, route_id)
+    if not route:
         abort(404)
 
     form = RouteForm(obj=route, original_name=route.name, client_id=current_user.client_id)
@@ -402,7 +396,7 @@ def edit_route(route_id):
             
             # Efficiently update checkpoints
             # Get the set of currently associated checkpoint IDs
-            current_checkpoint_ids = {rc.checkpoint_id for rc in route.checkpoints}
+            current_checkpoint_ids = {rc.checkpoint_id for rc in route_checkpoints}
             # Get the set of submitted checkpoint IDs
             submitted_checkpoint_ids = set(form.checkpoints.data)
 
@@ -442,7 +436,7 @@ def edit_route(route_id):
 
     # Pre-populate the form with the route's current checkpoints for the GET request
     if request.method == 'GET':
-        form.checkpoints.data = [rc.checkpoint_id for rc in route.checkpoints]
+        form.checkpoints.data = [rc.checkpoint_id for rc in route_checkpoints]
 
     return render_template('client_portal/routes/add_edit.html', title=f"Edit Route: {route.name}", form=form, route=route, form_action_label='Update Route')
 
@@ -483,11 +477,10 @@ def delete_route(route_id):
 @login_required
 @client_portal_access_required
 def list_shifts():
-    shifts = Shift.query\
-        .join(Device, Shift.device_id == Device.id)\
-        .filter(Device.client_id == current_user.client_id)\
-        .order_by(Shift.start_time.desc())\
-        .all()
+    shifts = _keyset_page(
+        shifts_for_client(current_user.client_id),
+        (Shift.start_time, Shift.id), lambda shift: (shift.start_time, shift.id), descending=True
+    )
     return render_template('client_portal/shifts/list.html', title='My Shifts', shifts=shifts)
 
 @bp.route('/devices')
@@ -496,7 +489,10 @@ def list_my_devices():
     if not (hasattr(current_user, 'is_client_user_type') and current_user.is_client_user_type()):
         flash('Please log in to access the client portal.', 'warning')
         return redirect(url_for('client_portal.login'))
-    devices = Device.query.filter_by(client_id=current_user.client.id).all()
+    devices = _keyset_page(
+        Device.query.filter_by(client_id=current_user.client.id),
+        (Device.name, Device.id), lambda device: (device.name, device.id)
+    )
     return render_template('client_portal/devices/list.html', title='My Devices', devices=devices)
 
 @bp.route('/devices/<int:id>/edit', methods=['GET', 'POST'])
@@ -530,7 +526,7 @@ def upload_patrol_report():
     
     form = PatrolReportUploadForm()
     # We need to adjust form.shift_id.choices to only show shifts for the current_user.client
-    client_shifts = Shift.query.join(Device).filter(Device.client_id == current_user.client_id)\
+    client_shifts = shifts_for_client(current_user.client_id)\
         .order_by(Shift.start_time.desc()).limit(100).all()
     
     form.shift_id.choices = [(0, '--- Select a Shift ---')] + \
@@ -545,7 +541,7 @@ def upload_patrol_report():
             return redirect(url_for('client_portal.upload_patrol_report'))
         
         # Verify shift belongs to client
-        if shift.device.client_id != current_user.client_id:
+        if shift.client_id != current_user.client_id:
             flash('Invalid shift selected.', 'danger')
             return redirect(url_for('client_portal.upload_patrol_report'))
         
@@ -570,6 +566,25 @@ def upload_patrol_report():
                          title='Upload Patrol Report', 
                          form=form)
 
+@bp.route('/reports/batch-upload', methods=['GET', 'POST'])
+@login_required
+@client_portal_access_required
+def batch_upload_reports():
+    form = BatchReportUploadForm()
+    results = None
+    if form.validate_on_submit():
+        try:
+            results = handle_batch_upload(form.report_files.data, current_user.client_id, current_user.id)
+        except FileUploadError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+        else:
+            current_app.logger.info(f"ClientUser {current_user.id} batch-uploaded {len(results)} report file(s).")
+    return render_template('client_portal/reports/batch_upload.html',
+                           title='Batch Upload Patrol Reports',
+                           form=form,
+                           results=results)
+
 @bp.route('/reports')
 @login_required
 def list_uploaded_reports():
@@ -577,15 +592,55 @@ def list_uploaded_reports():
         flash('Please log in to access the client portal.', 'warning')
         return redirect(url_for('client_portal.login'))
     
-    reports = UploadedPatrolReport.query\
-        .join(Shift, UploadedPatrolReport.shift_id == Shift.id)\
-        .join(Device, Shift.device_id == Device.id)\
-        .filter(Device.client_id == current_user.client.id)\
-        .order_by(UploadedPatrolReport.upload_timestamp.desc())\
-        .all()
+    reports = _keyset_page(
+        reports_for_client(current_user.client_id),
+        (UploadedPatrolReport.upload_timestamp, UploadedPatrolReport.id),
+        lambda report: (report.upload_timestamp, report.id), descending=True
+    )
     
     return render_template('client_portal/reports/list.html', title='My Reports', reports=reports)
 
+def _get_client_report_or_404(report_id):
+    report = report_for_client(current_user.client_id, report_id)
+    if not report:
+        current_app.logger.warning(f"ClientUser {current_user.id} (Client {current_user.client_id}) attempt to access unauthorized/non-existent report {report_id}.")
+        abort(404)
+    return report
+
+@bp.route('/reports/<int:report_id>')
+@login_required
+@client_portal_access_required
+def view_uploaded_report(report_id):
+    report = _get_client_report_or_404(report_id)
+    verified_visits = verified_visits_for_report(report.id)
+    return render_template('client_portal/reports/view.html',
+                         title=f'Report {report.id}',
+                         report=report,
+                         verified_visits=verified_visits,
+                         stage_metrics=report_stage_metrics(report.id),
+                         is_processing=report.processing_status == REPORT_STATUS_PROCESSING,
+                         poll_interval_ms=current_app.config.get('REPORT_STATUS_POLL_INTERVAL_MS', 3000))
+
+@bp.route('/reports/<int:report_id>/status')
+@login_required
+@client_portal_access_required
+def report_status(report_id):
+    report = _get_client_report_or_404(report_id)
+    job = report.processing_job
+    return jsonify({
+        'report_id': report.id,
+        'processing_status': report.processing_status,
+        'is_processing': report.processing_status == REPORT_STATUS_PROCESSING,
+        'error_message': report.error_message,
+        'job': {
+            'status': job.status,
+            'attempts': job.attempts,
+            'enqueued_at': job.enqueued_at.isoformat() if job.enqueued_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        } if job else None
+    })
+
 @bp.route('/checkpoints/add', methods=['GET', 'POST'])
 @login_required
 @client_portal_access_required
@@ -743,9 +798,8 @@ def edit_shift(shift_id):
     if not shift:
         abort(404)
     
-    # Verify ownership through device
-    device = db.session.get(Device, shift.device_id)
-    if not device or device.client_id != current_user.client_id:
+    # Verify ownership
+    if shift.client_id != current_user.client_id:
         current_app.logger.warning(f"ClientUser {current_user.id} unauthorized edit attempt on shift {shift_id}.")
         abort(404)
     
@@ -796,9 +850,8 @@ def delete_shift(shift_id):
         flash("Shift not found.", 'danger')
         return redirect(url_for('client_portal.list_shifts'))
     
-    # Verify ownership through device
-    device = db.session.get(Device, shift.device_id)
-    if not device or device.client_id != current_user.client_id:
+    # Verify ownership
+    if shift.client_id != current_user.client_id:
         flash("You do not have permission to delete this shift.", 'danger')
         return redirect(url_for('client_portal.list_shifts'))
     
@@ -42,7 +42,7 @@ def handle_upload_patrol_report(form):
         
         try:
             # Save the uploaded file
-            file_path = save_uploaded_file(form.report_file.data, current_user.client_id, report.id)
+            file_path = save_uploaded_file(form.report_file.data).path
             
             # Update report with file info
             report.filename = form.report_file.data.filename
@@ -67,7 +67,7 @@ def handle_upload_patrol_report(form):
                 )
             
             # Verify the patrol report
-            verified_visits, missed_checkpoints = verify_patrol_report(report.id, shift, locations)
+            verified_visits, missed_checkpoints, _ = verify_patrol_report(report.id, shift, locations)
             
             # Update report status based on verification results
             if missed_checkpoints:
@@ -31,4 +31,84 @@ def test_db_connection_command():
     except Exception as e:
         click.echo(f"❌ Error connecting to the database or querying: {str(e)}")
         click.echo(f"Database URI attempted: {db.engine.url}")
-        raise click.Abort() 
\ No newline at end of file
+        raise click.Abort()
+
+@click.command('process-reports')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty instead of polling.')
+@click.option('--poll-interval', default=2.0, show_default=True, type=float, help='Seconds to wait between polls of an empty queue.')
+@click.option('--max-jobs', default=None, type=int, help='Exit after processing this many jobs.')
+@with_appcontext
+def process_reports_command(burst, poll_interval, max_jobs):
+    """Runs a background worker that processes queued patrol reports."""
+    from app.utils.report_queue import run_worker
+
+    click.echo("🔄 Report worker started. Press Ctrl+C to stop.")
+    try:
+        processed = run_worker(poll_interval=poll_interval, burst=burst, max_jobs=max_jobs)
+    except KeyboardInterrupt:
+        click.echo("\nReport worker interrupted.")
+        return
+    click.echo(f"✅ Report worker processed {processed} job(s).")
+
+@click.command('rebuild-client-stats')
+@click.option('--client-id', 'client_ids', multiple=True, type=int, help='Only rebuild these clients (repeatable). Defaults to all clients.')
+@with_appcontext
+def rebuild_client_stats_command(client_ids):
+    """Recomputes the client_stats dashboard counters from the base tables."""
+    from app.utils.client_stats import rebuild_client_stats
+
+    rebuilt = rebuild_client_stats(list(client_ids) or None)
+    db.session.commit()
+    click.echo(f"✅ Rebuilt dashboard counters for {rebuilt} client(s).")
+
+# Revision matching the schema the app used to create with create_all(), before migrations were applied on deploy
+BASELINE_REVISION = 'd52fcaf39ebd'
+
+@click.command('init-db')
+@click.option('--skip-admin', is_flag=True, help='Do not create the initial Ultraguard admin user.')
+@with_appcontext
+def init_db_command(skip_admin):
+    """
+    Checks the database connection, creates missing tables and the first admin user.
+    Run `flask db upgrade` afterwards to apply pending migrations.
+    """
+    from sqlalchemy import inspect, text
+    from flask_migrate import stamp
+
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        click.echo(f"❌ Database connection failed: {str(e)}")
+        click.echo("Please check your DATABASE_URL environment variable.")
+        raise click.Abort()
+    click.echo("✅ Database connection successful!")
+
+    inspector = inspect(db.engine)
+    if not inspector.has_table(User.__tablename__):
+        click.echo("🔄 Creating database tables...")
+        db.create_all()
+        stamp(revision='head')  # The new tables already match the latest migration
+        click.echo("✅ Database tables created successfully!")
+    elif not inspector.has_table('alembic_version'):
+        # Created by create_all() before migrations were tracked: let `flask db upgrade` apply everything since
+        stamp(revision=BASELINE_REVISION)
+        click.echo(f"✅ Database tables exist; marked as migration {BASELINE_REVISION}.")
+    else:
+        click.echo("✅ Database tables exist.")
+
+    if skip_admin or User.query.count() > 0:
+        return
+    from werkzeug.security import generate_password_hash
+
+    admin_user = User(
+        username="admin",
+        email="admin@ultraguard.com",
+        password_hash=generate_password_hash("admin123"),
+        role="ULTRAGUARD_ADMIN",
+        is_active=True
+    )
+    db.session.add(admin_user)
+    db.session.commit()
+    click.echo("✅ Initial Ultraguard admin user created!")
+    click.echo("📋 Admin credentials: admin / admin123 (change this password)")
@@ -35,4 +35,20 @@ class DeviceIdentifierMismatchError(CSVValidationError):
 
 class VerificationLogicError(UltraguardError):
     """Errors specific to the patrol verification logic."""
-    pass 
\ No newline at end of file
+    pass
+
+class LocationPersistenceError(UltraguardError):
+    """When a report's track is not stored as one row per location."""
+    pass
+
+class JobQueueError(UltraguardError):
+    """Errors raised while claiming or running background processing jobs."""
+    pass
+
+class JobLeaseLostError(JobQueueError):
+    """A worker's claim on a job was taken over by another worker after its lease expired."""
+    pass
+
+class BatchUploadError(FileUploadError):
+    """A batch upload that cannot be accepted as a whole (bad archive, too many files)."""
+    pass
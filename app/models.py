@@ -24,6 +24,20 @@ class Client(db.Model):
     def __repr__(self):
         return f'<Client {self.name}>'
 
+class ClientStats(db.Model): # Materialized dashboard counters, kept current by app.utils.client_stats
+    __tablename__ = 'client_stats'
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id', ondelete='CASCADE'), primary_key=True)
+    sites = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    devices = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    routes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    checkpoints = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Distinct checkpoints used by the client's routes
+    shifts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reports = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ClientStats Client:{self.client_id}>'
+
 class User(db.Model, UserMixin): # For both Ultraguard Admins and Client Users
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True) # Required by UserMixin
@@ -83,6 +97,7 @@ class Device(db.Model):
         backref=db.backref('device', lazy=True),
         lazy='dynamic'
     )
+    __table_args__ = (db.Index('ix_device_client_id_name_id', 'client_id', 'name', 'id'),) # Client device listing order
 
     def __repr__(self):
         return f'<Device {self.name} (IMEI: {self.imei})>'
@@ -129,6 +144,7 @@ class Route(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    plan_version = db.Column(db.Integer, nullable=False, default=1, server_default='1') # Bumped whenever the route, its checkpoints or their mapping change
 
     # client relationship is defined via backref from Client model
     route_checkpoints = db.relationship('RouteCheckpoint', backref='route', lazy='dynamic', order_by='RouteCheckpoint.sequence_order', cascade="all, delete-orphan")
@@ -153,7 +169,8 @@ class RouteCheckpoint(db.Model): # Association between Route and Checkpoint
 
     __table_args__ = (
         db.UniqueConstraint('route_id', 'checkpoint_id', 'sequence_order', name='_route_checkpoint_sequence_uc'),
-        db.UniqueConstraint('route_id', 'sequence_order', name='_route_sequence_order_uc')
+        db.UniqueConstraint('route_id', 'sequence_order', name='_route_sequence_order_uc'),
+        db.Index('ix_route_checkpoint_checkpoint_id', 'checkpoint_id') # Routes using a checkpoint (route_id lookups use the unique constraints)
     )
 
     def __repr__(self):
@@ -165,11 +182,16 @@ class Shift(db.Model):
     device_id = db.Column(db.Integer, db.ForeignKey('device.id'), nullable=False)
     route_id = db.Column(db.Integer, db.ForeignKey('route.id'), nullable=False)
     site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False) # Denormalized device.client_id, set on write (app.utils.tenancy)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(50), default='active')
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    __table_args__ = (
+        db.Index('ix_shift_client_id_start_time_id', 'client_id', 'start_time', 'id'), # Client shift listing (keyset order)
+        db.Index('ix_shift_device_id', 'device_id'),
+    )
     
     def __repr__(self):
         return f'<Shift {self.id} at {self.start_time}>'
@@ -179,11 +201,15 @@ class UploadedPatrolReport(db.Model):
     __tablename__ = 'uploaded_patrol_report'
     id = db.Column(db.Integer, primary_key=True)
     shift_id = db.Column(db.Integer, db.ForeignKey('shift.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False) # Denormalized shift.device.client_id, set on write (app.utils.tenancy)
     uploaded_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     
     # File handling fields
     filename = db.Column(db.String(255), nullable=False)  # Original filename
-    file_path = db.Column(db.String(512), nullable=True)  # Allow NULL for file_path
+    file_path = db.Column(db.String(512), nullable=True)  # Blob in the content-addressed store (uploads/blobs/<sha256>); may be shared
+    file_sha256 = db.Column(db.String(64), nullable=True)  # Hex digest computed while the upload streamed in
+    file_size = db.Column(db.BigInteger, nullable=True)  # Bytes
+    row_count = db.Column(db.Integer, nullable=True)  # Lines after the header, counted during the upload
     device_identifier_from_report = db.Column(db.String(50), nullable=True)  # Device ID from CSV
     
     # Status and timestamps
@@ -196,14 +222,57 @@ class UploadedPatrolReport(db.Model):
     uploader = db.relationship('User', foreign_keys=[uploaded_by_user_id], backref='uploaded_reports')
     reported_locations = db.relationship('ReportedLocation', backref='report', lazy='dynamic', cascade='all, delete-orphan')
     verified_visits = db.relationship('VerifiedVisit', backref='report', lazy='dynamic', cascade='all, delete-orphan')
+    __table_args__ = (
+        db.Index('ix_uploaded_patrol_report_client_id_upload_timestamp_id', 'client_id', 'upload_timestamp', 'id'), # Client report listing (keyset order)
+        db.Index('ix_uploaded_patrol_report_shift_id_file_sha256', 'shift_id', 'file_sha256'), # Duplicate upload lookup (also covers shift_id)
+    )
 
     def __repr__(self):
         return f'<UploadedPatrolReport {self.id} for Shift {self.shift_id}>'
 
+class ReportProcessingJob(db.Model): # Queue entry for background report processing
+    __tablename__ = 'report_processing_job'
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('uploaded_patrol_report.id'), unique=True, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker_id = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    enqueued_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime, nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # Renewed by the running worker; past it the job may be reclaimed
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    report = db.relationship('UploadedPatrolReport', backref=db.backref('processing_job', uselist=False, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<ReportProcessingJob {self.id} Report:{self.report_id} ({self.status})>'
+
+class ReportProcessingMetric(db.Model): # Time spent in one stage of processing a report
+    __tablename__ = 'report_processing_metric'
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('uploaded_patrol_report.id'), nullable=False)
+    stage = db.Column(db.String(32), nullable=False)  # save, parse, device_check, persist, verify, commit
+    wall_ms = db.Column(db.Float, nullable=False)
+    cpu_ms = db.Column(db.Float, nullable=True)  # CPU time of the processing thread
+    rows = db.Column(db.Integer, nullable=True)
+    bytes = db.Column(db.BigInteger, nullable=True)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    report = db.relationship('UploadedPatrolReport', backref=db.backref('processing_metrics', lazy='dynamic', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.UniqueConstraint('report_id', 'stage', name='_report_processing_metric_stage_uc'),
+        db.Index('ix_report_processing_metric_stage_recorded_at', 'stage', 'recorded_at'), # Per-stage percentiles over a period
+    )
+
+    def __repr__(self):
+        return f'<ReportProcessingMetric Report:{self.report_id} {self.stage} {self.wall_ms:.1f}ms>'
+
 class ReportedLocation(db.Model): # Data points from the uploaded CSV
     __tablename__ = 'reported_location'
     id = db.Column(db.Integer, primary_key=True)
-    report_id = db.Column(db.Integer, db.ForeignKey('uploaded_patrol_report.id'), nullable=False)
+    report_id = db.Column(db.Integer, db.ForeignKey('uploaded_patrol_report.id'), nullable=False, index=True)
     timestamp = db.Column(db.DateTime, nullable=False) # From the CSV
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
@@ -230,7 +299,10 @@ class VerifiedVisit(db.Model): # Records a successful visit to a planned checkpo
     planned_checkpoint = db.relationship('RouteCheckpoint', backref=db.backref('verified_visits', lazy=True))
     verifying_location = db.relationship('ReportedLocation', backref=db.backref('verified_visit_record', uselist=False, lazy=True))
 
-    __table_args__ = (db.UniqueConstraint('report_id', 'route_checkpoint_id', name='_report_planned_checkpoint_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('report_id', 'route_checkpoint_id', name='_report_planned_checkpoint_uc'),
+        db.Index('ix_verified_visit_report_id_visit_timestamp', 'report_id', 'visit_timestamp'), # A report's visits in time order
+    )
 
     def __repr__(self):
         return f'<VerifiedVisit ReportID:{self.report_id} RouteCheckpointID:{self.route_checkpoint_id}>' 
\ No newline at end of file
@@ -0,0 +1,57 @@
+# Tenant-scoped query builders for the client portal. Each one eager-loads what its
+# view renders, so a page costs a fixed number of queries however many rows it shows.
+# Shifts and reports filter on their denormalized client_id (app.utils.tenancy).
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Route, RouteCheckpoint, Shift, UploadedPatrolReport, VerifiedVisit
+
+def shifts_for_client(client_id):
+    """The client's shifts, with device, route and site loaded in the same query."""
+    return Shift.query\
+        .filter(Shift.client_id == client_id)\
+        .options(joinedload(Shift.device), joinedload(Shift.route), joinedload(Shift.site))
+
+def reports_for_client(client_id):
+    """The client's uploaded reports, with shift and device loaded in the same query."""
+    return UploadedPatrolReport.query\
+        .filter(UploadedPatrolReport.client_id == client_id)\
+        .options(joinedload(UploadedPatrolReport.shift).joinedload(Shift.device))
+
+def report_for_client(client_id, report_id):
+    """One of the client's reports with shift and device loaded, or None."""
+    return reports_for_client(client_id).filter(UploadedPatrolReport.id == report_id).one_or_none()
+
+def verified_visits_for_report(report_id):
+    """A report's visits in time order, each with its route checkpoint and checkpoint."""
+    return VerifiedVisit.query\
+        .filter(VerifiedVisit.report_id == report_id)\
+        .options(joinedload(VerifiedVisit.planned_checkpoint).joinedload(RouteCheckpoint.checkpoint))\
+        .order_by(VerifiedVisit.visit_timestamp)\
+        .all()
+
+def routes_for_client(client_id):
+    """(route, number of checkpoints) pairs for the client's routes, by name, counted in one grouped query."""
+    checkpoint_counts = db.session.query(
+        RouteCheckpoint.route_id, func.count(RouteCheckpoint.id).label('checkpoint_count')
+    ).group_by(RouteCheckpoint.route_id).subquery()
+    return db.session.query(Route, func.coalesce(checkpoint_counts.c.checkpoint_count, 0))\
+        .outerjoin(checkpoint_counts, checkpoint_counts.c.route_id == Route.id)\
+        .filter(Route.client_id == client_id)\
+        .order_by(Route.name)\
+        .all()
+
+def route_with_checkpoints(client_id, route_id):
+    """
+    One of the client's routes and its RouteCheckpoints in sequence order
+    (each with its Checkpoint loaded), or (None, []) if it is not theirs.
+    """
+    route = Route.query.filter_by(id=route_id, client_id=client_id).one_or_none()
+    if route is None:
+        return None, []
+    route_checkpoints = RouteCheckpoint.query\
+        .filter(RouteCheckpoint.route_id == route.id)\
+        .options(joinedload(RouteCheckpoint.checkpoint))\
+        .order_by(RouteCheckpoint.sequence_order)\
+        .all()
+    return route, route_checkpoints
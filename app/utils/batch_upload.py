@@ -0,0 +1,264 @@
+import multiprocessing
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import or_
+from werkzeug.datastructures import FileStorage
+from app import db
+from app.models import Device, Shift, UploadedPatrolReport
+from app.exceptions import BatchUploadError, CSVValidationError, FileUploadError
+from app.utils.file_handlers import spool_uploaded_file, store_uploaded_file, iter_csv_rows
+from app.utils.report_processing import (
+    create_report_for_upload, find_duplicate_report, process_report,
+    REPORT_STATUS_ERROR_PROCESSING
+)
+from app.utils.report_queue import enqueue_report_job
+from app.utils import metrics
+from app.utils.track import EPOCH
+from app.utils.uploads import spool_stream
+
+# Outcome of one file in a batch
+BATCH_STATUS_REJECTED = 'rejected'  # Not a usable report file
+BATCH_STATUS_UNMATCHED = 'unmatched'  # No shift for its device and time
+BATCH_STATUS_DUPLICATE = 'duplicate'  # Same file already uploaded for the matched shift
+BATCH_STATUS_QUEUED = 'queued'  # Handed to the background worker
+BATCH_STATUS_PROCESSED = 'processed'  # Verified; the report has its final status
+BATCH_STATUS_FAILED = 'failed'  # Verification could not be completed
+
+BatchFileResult = namedtuple('BatchFileResult', 'filename status message report_id shift_id')
+
+def expand_batch_files(files, max_files=None):
+    """
+    Turn the uploaded files into one FileStorage per report.
+
+    A .zip is expanded into its CSV (and .csv.gz) members, each spooled to
+    disk in chunks so no member is held in memory; any other file is
+    passed through as it is.
+    """
+    max_files = max_files or current_app.config.get('BATCH_UPLOAD_MAX_FILES', 100)
+    too_many = BatchUploadError(f"A batch can hold at most {max_files} reports.")
+    reports = []
+    for file in files:
+        if not file or not file.filename:
+            continue
+        if not file.filename.lower().endswith('.zip'):
+            if len(reports) >= max_files:
+                raise too_many
+            reports.append(file)
+            continue
+        try:
+            with zipfile.ZipFile(file.stream) as archive:
+                for info in archive.infolist():
+                    name = info.filename
+                    if info.is_dir() or name.startswith('__MACOSX/') or not name.lower().endswith(('.csv', '.csv.gz')):
+                        continue
+                    if len(reports) >= max_files:
+                        raise too_many
+                    with archive.open(info) as member:
+                        spool = spool_stream(member, max_bytes=current_app.config.get('UPLOAD_MAX_FILE_SIZE'))
+                    reports.append(FileStorage(stream=spool, filename=os.path.basename(name)))
+        except zipfile.BadZipFile:
+            raise BatchUploadError(f"'{file.filename}' is not a valid zip archive.")
+    return reports
+
+def first_fix(file_path):
+    """(device IMEI, naive UTC datetime) of a stored report's first row, read without parsing the rest."""
+    rows = iter_csv_rows(file_path)
+    try:
+        device_id, epoch_seconds = next(rows)[:2]
+    except StopIteration:
+        raise CSVValidationError("CSV file contains no data rows after the header.")
+    finally:
+        rows.close()
+    return device_id, EPOCH + timedelta(seconds=epoch_seconds)
+
+def match_shift(client_id, device_imei, timestamp):
+    """
+    The client's shift a track belongs to: same device, with the track's
+    first fix inside the shift window (widened by
+    BATCH_UPLOAD_MATCH_TOLERANCE_MINUTES). The latest-starting shift wins
+    when windows overlap; None if nothing matches.
+    """
+    tolerance = timedelta(minutes=current_app.config.get('BATCH_UPLOAD_MATCH_TOLERANCE_MINUTES', 30))
+    return Shift.query\
+        .join(Device, Shift.device_id == Device.id)\
+        .filter(Shift.client_id == client_id,
+                Device.imei == device_imei,
+                Shift.start_time <= timestamp + tolerance,
+                or_(Shift.end_time.is_(None), Shift.end_time >= timestamp - tolerance))\
+        .order_by(Shift.start_time.desc(), Shift.id.desc())\
+        .first()
+
+def _prepare(file, client_id, user_id, batch_reports):
+    """
+    Match one file to a shift, then store it and create its report; returns
+    (BatchFileResult, report id to process or None). The first fix is read
+    from the spool, so rejected and unmatched files never reach the blob store.
+    ``batch_reports`` maps (shift id, sha256) to the reports created earlier
+    in the batch, which are not yet verified but are duplicates all the same.
+    """
+    filename = file.filename
+    try:
+        spool = spool_uploaded_file(file)
+    except FileUploadError as e:
+        return BatchFileResult(filename, BATCH_STATUS_REJECTED, str(e), None, None), None
+    try:
+        try:
+            device_imei, timestamp = first_fix(spool.path)
+        except (CSVValidationError, UnicodeDecodeError, OSError, zipfile.BadZipFile) as e:
+            # MissingHeaderError and DataTypeError are CSVValidationErrors
+            return BatchFileResult(filename, BATCH_STATUS_REJECTED, f"Could not read the report: {e}", None, None), None
+
+        shift = match_shift(client_id, device_imei, timestamp)
+        if shift is None:
+            message = f"No shift found for device {device_imei} around {timestamp:%Y-%m-%d %H:%M}."
+            return BatchFileResult(filename, BATCH_STATUS_UNMATCHED, message, None, None), None
+
+        duplicate_id = batch_reports.get((shift.id, spool.digest.hexdigest))
+        if duplicate_id is None:
+            duplicate = find_duplicate_report(shift.id, spool.digest.hexdigest)
+            duplicate_id = duplicate.id if duplicate is not None else None
+        if duplicate_id is not None:
+            message = 'Already uploaded for this shift; the existing results are kept.'
+            return BatchFileResult(filename, BATCH_STATUS_DUPLICATE, message, duplicate_id, shift.id), None
+
+        try:
+            saved = store_uploaded_file(spool)
+        except FileUploadError as e:
+            return BatchFileResult(filename, BATCH_STATUS_REJECTED, str(e), None, None), None
+    finally:
+        spool.close()  # Discards the file unless store_uploaded_file kept it
+
+    report = create_report_for_upload(shift.id, user_id, filename, saved)
+    batch_reports[(shift.id, saved.sha256)] = report.id
+    return BatchFileResult(filename, BATCH_STATUS_QUEUED, 'Waiting for verification.', report.id, shift.id), report.id
+
+# --- Parallel verification ---
+
+_pool = None
+
+# Settings a worker takes from the web app, which may have been given them as create_app overrides
+WORKER_CONFIG_KEYS = ('SQLALCHEMY_DATABASE_URI', 'UPLOAD_FOLDER')
+
+def _init_worker(config_name, config_overrides):
+    from app import create_app
+    create_app(config_name, config_overrides).app_context().push()
+
+def _process_in_worker(report_id):
+    try:
+        return process_report(report_id)
+    finally:
+        db.session.remove()
+        metrics.flush()  # Pool workers exit without running atexit handlers
+
+def _worker_count():
+    workers = current_app.config.get('BATCH_UPLOAD_WORKERS')
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # Worker processes cannot see an in-memory SQLite database
+    url = db.engine.url
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return 1
+    return workers
+
+def _process_pool(workers):
+    """Process pool shared by the batches of this (web worker) process, created on first use."""
+    global _pool
+    if _pool is None:
+        # 'spawn' so workers never inherit the parent's open database connections
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(current_app.config['CONFIG_NAME'], {key: current_app.config[key] for key in WORKER_CONFIG_KEYS})
+        )
+    return _pool
+
+def _discard_pool():
+    """Drop a pool one of whose workers died (killed, out of memory); the next batch starts a fresh one."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _record_failure(report_id, error):
+    current_app.logger.error(f"Batch verification of report {report_id} failed: {error}", exc_info=error)
+    report = db.session.get(UploadedPatrolReport, report_id)
+    if report is not None:
+        report.processing_status = REPORT_STATUS_ERROR_PROCESSING
+        report.error_message = f"Processing failed: {error}"
+        db.session.commit()
+
+def process_reports(report_ids):
+    """
+    Verify saved reports, in parallel across BATCH_UPLOAD_WORKERS processes
+    when there is more than one; returns {report_id: process_report() result}.
+    """
+    workers = _worker_count()
+    outcomes = {}
+    if workers <= 1 or len(report_ids) <= 1:
+        for report_id in report_ids:
+            outcomes[report_id] = process_report(report_id)
+        return outcomes
+
+    futures = {}
+    try:
+        pool = _process_pool(workers)
+        for report_id in report_ids:
+            futures[report_id] = pool.submit(_process_in_worker, report_id)
+    except BrokenProcessPool as e:
+        _discard_pool()
+        for report_id in report_ids:
+            if report_id not in futures:
+                _record_failure(report_id, e)
+                outcomes[report_id] = (False, 'danger', f"Processing failed: {e}", report_id)
+    for report_id, future in futures.items():
+        try:
+            outcomes[report_id] = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _discard_pool()
+            _record_failure(report_id, e)
+            outcomes[report_id] = (False, 'danger', f"Processing failed: {e}", report_id)
+    db.session.expire_all()  # Reports were updated by the workers
+    return outcomes
+
+def handle_batch_upload(files, client_id, user_id):
+    """
+    Store many reports at once, match each to the client's shift by device
+    IMEI and time, and verify them in parallel (or queue them for the
+    background worker with REPORT_PROCESSING_ASYNC).
+
+    Returns:
+        list: one BatchFileResult per report file, in upload order
+    """
+    results, to_process, batch_reports = [], [], {}
+    for file in expand_batch_files(files):
+        result, report_id = _prepare(file, client_id, user_id, batch_reports)
+        results.append(result)
+        if report_id is not None:
+            to_process.append(report_id)
+    if not to_process:
+        db.session.commit()
+        return results
+
+    if current_app.config.get('REPORT_PROCESSING_ASYNC', False):
+        for report_id in to_process:
+            enqueue_report_job(db.session.get(UploadedPatrolReport, report_id))
+        db.session.commit()
+        return results
+
+    db.session.commit()  # Worker processes must see the new reports
+    outcomes = process_reports(to_process)
+    current_app.logger.info(f"Batch upload for client {client_id}: {len(results)} file(s), {len(to_process)} verified")
+    return [
+        result._replace(
+            status=BATCH_STATUS_PROCESSED if outcomes[result.report_id][0] else BATCH_STATUS_FAILED,
+            message=outcomes[result.report_id][2]
+        ) if result.report_id in outcomes and result.status == BATCH_STATUS_QUEUED else result
+        for result in results
+    ]
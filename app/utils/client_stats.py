@@ -0,0 +1,255 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import event, select, update, delete, insert, func, distinct, inspect
+from sqlalchemy.orm import object_session
+from app import db
+from app.models import Client, ClientStats, Site, Device, Route, RouteCheckpoint, Shift, UploadedPatrolReport
+
+COUNTER_COLUMNS = ('sites', 'devices', 'routes', 'checkpoints', 'shifts', 'reports')
+
+# session.info key for clients whose distinct-checkpoint count must be recomputed after the flush
+PENDING_CHECKPOINT_CLIENTS = 'client_stats_pending_checkpoints'
+
+_stats = ClientStats.__table__
+
+# Same fields as a client_stats row; returned when a client has no row yet
+ClientCounters = namedtuple('ClientCounters', ('client_id',) + COUNTER_COLUMNS + ('updated_at',))
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+def _counter_queries():
+    """Per-counter (grouped SELECT client_id, count, client id column) used to (re)compute the rollup."""
+    return {
+        'sites': (select(Site.client_id, func.count(Site.id)).group_by(Site.client_id), Site.client_id),
+        'devices': (select(Device.client_id, func.count(Device.id)).group_by(Device.client_id), Device.client_id),
+        'routes': (select(Route.client_id, func.count(Route.id)).group_by(Route.client_id), Route.client_id),
+        'checkpoints': (
+            select(Route.client_id, func.count(distinct(RouteCheckpoint.checkpoint_id)))
+            .join(Route, RouteCheckpoint.route_id == Route.id)
+            .group_by(Route.client_id),
+            Route.client_id
+        ),
+        'shifts': (select(Shift.client_id, func.count(Shift.id)).group_by(Shift.client_id), Shift.client_id),
+        'reports': (
+            select(UploadedPatrolReport.client_id, func.count(UploadedPatrolReport.id)).group_by(UploadedPatrolReport.client_id),
+            UploadedPatrolReport.client_id
+        ),
+    }
+
+def compute_client_stats(connection, client_ids=None):
+    """Count everything from the base tables: {client_id: {counter: value}} for every existing client (or the given ones)."""
+    client_query = select(Client.id)
+    if client_ids is not None:
+        client_query = client_query.where(Client.id.in_(client_ids))
+    stats = {client_id: dict.fromkeys(COUNTER_COLUMNS, 0) for client_id in connection.execute(client_query).scalars()}
+    if not stats:
+        return stats
+    for column, (query, client_column) in _counter_queries().items():
+        if client_ids is not None:
+            query = query.where(client_column.in_(list(stats)))
+        for client_id, count in connection.execute(query):
+            if client_id in stats:
+                stats[client_id][column] = count
+    return stats
+
+def _upsert_stats(connection, rows):
+    """
+    Write whole client_stats rows with INSERT ... ON CONFLICT (client_id) DO
+    UPDATE, so two writers creating the same missing row cannot collide.
+    """
+    dialect = connection.dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        for row in rows:
+            values = {column: value for column, value in row.items() if column != 'client_id'}
+            if connection.execute(update(_stats).where(_stats.c.client_id == row['client_id']).values(**values)).rowcount == 0:
+                connection.execute(insert(_stats).values(**row))
+        return
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(_stats)
+    statement = statement.on_conflict_do_update(
+        index_elements=['client_id'],
+        set_={column: statement.excluded[column] for column in COUNTER_COLUMNS + ('updated_at',)}
+    )
+    connection.execute(statement, rows)
+
+def rebuild_client_stats(client_ids=None, connection=None):
+    """
+    Recompute client_stats rows from the base tables.
+
+    Used by ``flask rebuild-client-stats`` and as a fallback when a client
+    has no row yet. Rows are upserted, and rows of clients that no longer
+    exist removed, on the given connection (or the session's), inside the
+    current transaction.
+
+    Returns:
+        int: Number of client rows written
+    """
+    connection = connection if connection is not None else db.session.connection()
+    stats = compute_client_stats(connection, client_ids)
+    stale = delete(_stats).where(_stats.c.client_id.not_in(list(stats)))
+    if client_ids is not None:
+        stale = stale.where(_stats.c.client_id.in_(list(client_ids)))
+    connection.execute(stale)
+    if stats:
+        now = _utcnow()
+        _upsert_stats(connection, [dict(counts, client_id=client_id, updated_at=now) for client_id, counts in stats.items()])
+    return len(stats)
+
+def adjust_client_stats(client_id, connection=None, **deltas):
+    """Add deltas (e.g. ``devices=5``) to a client's counters, rebuilding its row if it does not exist."""
+    if client_id is None or not any(deltas.values()):
+        return
+    connection = connection if connection is not None else db.session.connection()
+    values = {column: _stats.c[column] + delta for column, delta in deltas.items()}
+    result = connection.execute(
+        update(_stats).where(_stats.c.client_id == client_id).values(updated_at=_utcnow(), **values)
+    )
+    if result.rowcount == 0:
+        rebuild_client_stats([client_id], connection=connection)
+
+def get_client_stats(client_id):
+    """
+    Dashboard counters for a client as a row with one attribute per counter.
+    A client without a row (the rollup was cleared) is counted from the base
+    tables; the read writes nothing, ``flask rebuild-client-stats`` restores rows.
+    """
+    row = db.session.execute(select(*_stats.c).where(_stats.c.client_id == client_id)).one_or_none()
+    if row is None:
+        counts = compute_client_stats(db.session.connection(), [client_id]).get(client_id, dict.fromkeys(COUNTER_COLUMNS, 0))
+        row = ClientCounters(client_id=client_id, updated_at=None, **counts)
+    return row
+
+def get_totals():
+    """(number of clients, sum of each counter) across all clients from the rollup."""
+    return db.session.execute(
+        select(func.count().label('clients'), *(func.coalesce(func.sum(_stats.c[column]), 0).label(column) for column in COUNTER_COLUMNS))
+        .select_from(_stats)
+    ).one()
+
+# --- Maintenance hooks ---
+
+def _route_client(connection, route_id):
+    if route_id is None:
+        return None
+    return connection.execute(select(Route.client_id).where(Route.id == route_id)).scalar()
+
+# model -> counter it feeds; each of these models carries its owning client_id
+_OWNERS = {
+    Site: 'sites',
+    Device: 'devices',
+    Route: 'routes',
+    Shift: 'shifts',
+    UploadedPatrolReport: 'reports',
+}
+
+def _after_insert(mapper, connection, target):
+    adjust_client_stats(target.client_id, connection, **{_OWNERS[mapper.class_]: 1})
+
+def _after_delete(mapper, connection, target):
+    # The committed client, in case it was changed on the object before the delete
+    history = inspect(target).attrs.client_id.history
+    client_id = history.deleted[0] if history.deleted else target.client_id
+    adjust_client_stats(client_id, connection, **{_OWNERS[mapper.class_]: -1})
+
+def _after_update(mapper, connection, target):
+    # Moving a row to another owner (e.g. a device to another client) is rare; it
+    # can also carry shifts and reports along (see app.utils.tenancy), so both
+    # clients are recounted.
+    history = inspect(target).attrs.client_id.history
+    if not history.has_changes() or not history.deleted:
+        return
+    client_ids = {history.deleted[0], target.client_id}
+    client_ids.discard(None)
+    if client_ids:
+        rebuild_client_stats(client_ids, connection=connection)
+
+def _mark_route_checkpoint(mapper, connection, target):
+    # The distinct-checkpoint count cannot be adjusted by +/-1, so affected
+    # clients are recounted once at the end of the flush.
+    session = object_session(target)
+    if session is None:
+        return
+    route_ids = {target.route_id}
+    route_ids.update(inspect(target).attrs.route_id.history.deleted or ())
+    pending = session.info.setdefault(PENDING_CHECKPOINT_CLIENTS, set())
+    for route_id in route_ids:
+        pending.add(_route_client(connection, route_id))
+
+def _route_checkpoint_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.route_id.history.has_changes() or state.attrs.checkpoint_id.history.has_changes():
+        _mark_route_checkpoint(mapper, connection, target)
+
+def _refresh_checkpoint_counts(session, flush_context):
+    client_ids = session.info.pop(PENDING_CHECKPOINT_CLIENTS, set())
+    client_ids.discard(None)
+    if not client_ids:
+        return
+    connection = session.connection()
+    counts = dict(connection.execute(
+        select(Route.client_id, func.count(distinct(RouteCheckpoint.checkpoint_id)))
+        .join(Route, RouteCheckpoint.route_id == Route.id)
+        .where(Route.client_id.in_(client_ids))
+        .group_by(Route.client_id)
+    ).all())
+    for client_id in client_ids:
+        result = connection.execute(
+            update(_stats).where(_stats.c.client_id == client_id)
+            .values(checkpoints=counts.get(client_id, 0), updated_at=_utcnow())
+        )
+        if result.rowcount == 0:
+            rebuild_client_stats([client_id], connection=connection)
+
+# counted table -> SELECT of the clients owning its rows, for bulk statements
+_BULK_OWNERS = {model.__table__: select(model.client_id) for model in _OWNERS}
+_BULK_OWNERS[RouteCheckpoint.__table__] = select(Route.client_id).join_from(
+    RouteCheckpoint, Route, RouteCheckpoint.route_id == Route.id
+)
+
+def _do_orm_execute(orm_execute_state):
+    # Query.update()/delete() bypass the mapper hooks above. A bulk DELETE
+    # recounts the clients owning the matched rows; the new owners of rows a
+    # bulk UPDATE touches are not known, so it recounts every client (these
+    # are rare admin edits).
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if not orm_execute_state.is_orm_statement:
+        return
+    statement = orm_execute_state.statement
+    owners = _BULK_OWNERS.get(statement.table)
+    if owners is None:
+        return
+    client_ids = None
+    if orm_execute_state.is_delete and statement.whereclause is not None:
+        client_ids = set(orm_execute_state.session.execute(owners.where(statement.whereclause).distinct()).scalars())
+        client_ids.discard(None)
+    result = orm_execute_state.invoke_statement()
+    if client_ids is None or client_ids:
+        rebuild_client_stats(client_ids, connection=orm_execute_state.session.connection())
+    return result
+
+def _after_client_insert(mapper, connection, target):
+    rebuild_client_stats([target.id], connection=connection)
+
+def _after_client_delete(mapper, connection, target):
+    connection.execute(delete(_stats).where(_stats.c.client_id == target.id))
+
+def init_app(app):
+    if event.contains(Client, 'after_insert', _after_client_insert):
+        return
+    event.listen(Client, 'after_insert', _after_client_insert)
+    event.listen(Client, 'after_delete', _after_client_delete)
+    for model in _OWNERS:
+        event.listen(model, 'after_insert', _after_insert)
+        event.listen(model, 'after_delete', _after_delete)
+        event.listen(model, 'after_update', _after_update)
+    event.listen(RouteCheckpoint, 'after_insert', _mark_route_checkpoint)
+    event.listen(RouteCheckpoint, 'after_delete', _mark_route_checkpoint)
+    event.listen(RouteCheckpoint, 'after_update', _route_checkpoint_updated)
+    # Only the app's sessions (db.session), not every SQLAlchemy Session in the process
+    event.listen(db.session, 'after_flush', _refresh_checkpoint_counts)
+    event.listen(db.session, 'do_orm_execute', _do_orm_execute)
@@ -1,51 +1,160 @@
 import os
 import csv
+import gzip
+import io
+import zipfile
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
-from werkzeug.utils import secure_filename
 from flask import current_app
 from app.exceptions import (
     FileUploadError, InvalidFileTypeError, CSVValidationError,
     MissingHeaderError, DataTypeError, DeviceIdentifierMismatchError
 )
-import pandas as pd
+from app.utils.track import TrackBuilder, to_epoch_seconds, EPOCH
+from app.utils.uploads import UploadSpool, spool_stream, store_blob
+from app.utils.metrics import UPLOAD_BYTES
+from app.utils.logging_queue import RecordSummary
 
-def get_upload_path(client_id, report_id):
-    """Generate a secure path for storing uploaded files."""
-    try:
-        # Create a path structure: uploads/client_{id}/reports/report_{id}/
-        base_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f'client_{client_id}', 'reports', f'report_{report_id}')
-        os.makedirs(base_path, exist_ok=True)
-        return base_path
-    except OSError as e:
-        current_app.logger.error(f"Error creating upload directory: {str(e)}", exc_info=True)
-        raise FileUploadError(f"Failed to create upload directory: {str(e)}")
-
-def save_uploaded_file(file, client_id, report_id):
-    """Save an uploaded file securely and return its path."""
+SavedUpload = namedtuple('SavedUpload', 'path sha256 size row_count is_new')
+
+# Accepted report file name endings, and the leading bytes compressed ones must start with
+REPORT_FILE_SUFFIXES = ('.csv', '.csv.gz', '.zip')
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+_COMPRESSED_MAGIC = {'.csv.gz': GZIP_MAGIC, '.zip': ZIP_MAGIC}
+
+def _report_file_suffix(filename):
+    lowered = (filename or '').lower()
+    for suffix in sorted(REPORT_FILE_SUFFIXES, key=len, reverse=True):
+        if lowered.endswith(suffix):
+            return suffix
+    return None
+
+def save_uploaded_file(file):
+    """
+    Store an uploaded report file in the content-addressed blob store.
+
+    A file Werkzeug already streamed to disk (app.utils.uploads) had its
+    SHA-256, size and row count computed while it arrived; any other stream
+    is spooled in fixed-size chunks and digested on the way. Content that
+    does not match its type (text for .csv, gzip for .csv.gz, zip for .zip)
+    is rejected before it is kept. Compressed files are stored as uploaded
+    and decompressed while they are parsed (see open_report_csv). The file
+    ends up at uploads/blobs/<sha256>, so identical uploads share one copy.
+
+    Returns:
+        SavedUpload: path, sha256, size in bytes, row count (lines after the
+        header; None for compressed files) and whether this upload created the blob
+    """
+    return store_uploaded_file(spool_uploaded_file(file))
+
+def spool_uploaded_file(file):
+    """
+    First half of save_uploaded_file: check the file's name and content
+    type and return it as an UploadSpool on disk, not yet in the blob store.
+    The spool's path can be read (e.g. for its first row) before deciding
+    to keep it with store_uploaded_file; closing it discards the file.
+    """
     if not file:
         raise FileUploadError("No file provided")
     
     # Check file extension
-    allowed_extensions = {'csv'}
-    if '.' not in file.filename or file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
-        raise InvalidFileTypeError(f"Invalid file type. Only CSV files are allowed.")
+    suffix = _report_file_suffix(file.filename)
+    if suffix is None:
+        raise InvalidFileTypeError(f"Invalid file type. Only CSV files (.csv, or compressed as .csv.gz or .zip) are allowed.")
     
     try:
-        # Generate secure filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = secure_filename(f"{timestamp}_{file.filename}")
-        
-        # Get the upload path and save the file
-        upload_path = get_upload_path(client_id, report_id)
-        file_path = os.path.join(upload_path, filename)
-        
-        file.save(file_path)
-        current_app.logger.info(f"File saved successfully: {file_path}")
-        return file_path
+        spool = file.stream
+        if not isinstance(spool, UploadSpool):
+            spool = spool_stream(
+                spool,
+                max_bytes=current_app.config.get('UPLOAD_MAX_FILE_SIZE'),
+                chunk_size=current_app.config.get('UPLOAD_CHUNK_SIZE')
+            )
+        digest = spool.digest
+        magic = _COMPRESSED_MAGIC.get(suffix)
+        if not (digest.head.startswith(magic) if magic else digest.looks_like_text()):
+            spool.close()
+            raise InvalidFileTypeError(f"Invalid file type. The file content is not {'a ' + suffix + ' archive' if magic else 'CSV text'}.")
+        spool.flush()
+        return spool
+    except InvalidFileTypeError:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error saving uploaded file: {str(e)}", exc_info=True)
+        raise FileUploadError(f"Failed to save uploaded file: {str(e)}")
+
+def store_uploaded_file(spool):
+    """Second half of save_uploaded_file: move a checked spool into the blob store; returns a SavedUpload."""
+    try:
+        digest = spool.digest
+        compressed = digest.head.startswith((GZIP_MAGIC, ZIP_MAGIC))
+        file_path, is_new = store_blob(spool)
+        UPLOAD_BYTES.observe(digest.size)
+        row_count = None if compressed else digest.row_count
+        current_app.logger.info(
+            f"File {'saved' if is_new else 'already stored'}: {file_path} ({digest.size} bytes{'' if compressed else f', {row_count} rows'})"
+        )
+        return SavedUpload(file_path, digest.hexdigest, digest.size, row_count, is_new)
     except Exception as e:
+        spool.close()
         current_app.logger.error(f"Error saving uploaded file: {str(e)}", exc_info=True)
         raise FileUploadError(f"Failed to save uploaded file: {str(e)}")
 
+class _SizeLimitedReader(io.RawIOBase):
+    """Raw reader over a decompressing stream that stops once more than ``limit`` bytes come out (zip/gzip bombs)."""
+
+    def __init__(self, stream, limit):
+        self._stream = stream
+        self._limit = limit
+        self._count = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._stream.readinto(buffer)
+        self._count += count
+        if self._limit and self._count > self._limit:
+            raise CSVValidationError(f"Decompressed report exceeds the {self._limit // (1024 * 1024)} MB limit.")
+        return count
+
+def _zip_csv_member(archive):
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir() and info.filename.lower().endswith('.csv') and not info.filename.startswith('__MACOSX/')
+    ]
+    if len(members) != 1:
+        raise CSVValidationError(f"Zip archive must contain exactly one CSV file (found {len(members)}).")
+    return members[0]
+
+@contextmanager
+def open_report_csv(file_path: str):
+    """
+    Open a stored report as CSV text (utf-8-sig, newline='') for csv.reader.
+
+    Gzip and zip files (recognised by their leading bytes, since blobs have
+    no extension) are decompressed as they are read, never written out
+    uncompressed; their output is capped at REPORT_MAX_UNCOMPRESSED_SIZE.
+    """
+    with open(file_path, 'rb') as raw:
+        magic = raw.read(len(ZIP_MAGIC))
+        raw.seek(0)
+        if not (magic.startswith(GZIP_MAGIC) or magic == ZIP_MAGIC):
+            with io.TextIOWrapper(raw, encoding='utf-8-sig', newline='') as text:
+                yield text
+            return
+        with ExitStack() as stack:
+            if magic.startswith(GZIP_MAGIC):
+                stream = stack.enter_context(gzip.GzipFile(fileobj=raw, mode='rb'))
+            else:
+                archive = stack.enter_context(zipfile.ZipFile(raw))
+                stream = stack.enter_context(archive.open(_zip_csv_member(archive)))
+            limit = current_app.config.get('REPORT_MAX_UNCOMPRESSED_SIZE')
+            reader = io.BufferedReader(_SizeLimitedReader(stream, limit), buffer_size=64 * 1024)
+            yield stack.enter_context(io.TextIOWrapper(reader, encoding='utf-8-sig', newline=''))
+
 def validate_csv_structure(file_path):
     """Validate the structure of the uploaded CSV file."""
     required_columns = {'Device_Identifier', 'Timestamp', 'Latitude', 'Longitude'}
@@ -94,9 +203,10 @@ def read_csv_data(file_path):
     """Read and parse the CSV file data."""
     locations = []
     errors = []
+    row_warnings = RecordSummary(current_app.logger, f"Rows skipped in '{os.path.basename(file_path)}'")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with row_warnings, open(file_path, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row_num, row in enumerate(reader, start=2):  # Start from 2 to account for header row
                 try:
@@ -112,18 +222,15 @@ def read_csv_data(file_path):
                 except ValueError as e:
                     error_msg = f"Error in row {row_num}: {str(e)}"
                     errors.append(error_msg)
-                    current_app.logger.warning(error_msg)
+                    row_warnings.add(error_msg)
                 except KeyError as e:
                     error_msg = f"Missing required column in row {row_num}: {str(e)}"
                     errors.append(error_msg)
-                    current_app.logger.warning(error_msg)
+                    row_warnings.add(error_msg)
         
         if not locations:
             raise CSVValidationError("No valid location data found in CSV file")
         
-        if errors:
-            current_app.logger.warning(f"Found {len(errors)} errors while reading CSV file")
-        
         return locations
     except Exception as e:
         if isinstance(e, CSVValidationError):
@@ -142,123 +249,186 @@ EVENT_DETAILS_COLUMN_NAME = 'Event_Details'
 
 TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
 
+def parse_epoch_seconds(value: str, day_cache: dict = None) -> float:
+    """
+    Parse a CSV timestamp in TIMESTAMP_FORMAT straight to epoch seconds (UTC).
+
+    Well-formed 'YYYY-MM-DD HH:MM:SS' values are sliced and converted with int(),
+    which is several times faster than strptime; anything else (single-digit
+    fields, stray whitespace, invalid dates) falls back to strptime so the
+    accepted inputs and ValueError behaviour are unchanged. Tracks span one or
+    two calendar days, so the date part is resolved once per distinct day
+    through ``day_cache`` and each row only adds its time of day.
+    """
+    if (len(value) == 19 and value[4] == '-' and value[7] == '-' and value[10] == ' '
+            and value[13] == ':' and value[16] == ':'
+            and (value[:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:]).isdigit()):
+        hour, minute, second = int(value[11:13]), int(value[14:16]), int(value[17:])
+        if hour < 24 and minute < 60 and second < 60:
+            day = value[:10]
+            day_seconds = day_cache.get(day) if day_cache is not None else None
+            if day_seconds is None:
+                try:
+                    day_seconds = (datetime(int(value[:4]), int(value[5:7]), int(value[8:10])) - EPOCH).total_seconds()
+                except ValueError:
+                    day_seconds = None
+                else:
+                    if day_cache is not None:
+                        day_cache[day] = day_seconds
+            if day_seconds is not None:
+                return day_seconds + hour * 3600 + minute * 60 + second
+    return to_epoch_seconds(datetime.strptime(value, TIMESTAMP_FORMAT))
+
+def _read_header(reader):
+    """Return the first non-blank row of the reader (csv.DictReader skips blank lines the same way)."""
+    for row in reader:
+        if row:
+            return row
+    return None
+
+def iter_csv_rows(file_path: str):
+    """
+    Stream typed location rows from a patrol report CSV in a single pass.
+
+    Column positions are resolved once from the header, so each row is handled
+    as a plain list; .csv.gz and .zip reports are decompressed as they are read.
+    Yields one tuple per data row:
+    (device_id, epoch_seconds, latitude, longitude, event_type, event_details).
+    Raises:
+        FileNotFoundError: If the file_path does not exist.
+        MissingHeaderError: If required headers are not found.
+        DataTypeError: If a row has missing or invalid critical values (with its row number).
+        CSVValidationError: If the file is empty.
+    """
+    with open_report_csv(file_path) as csvfile:
+        reader = csv.reader(csvfile)
+
+        # 1. Validate Headers
+        headers = _read_header(reader)
+        if not headers:
+            raise CSVValidationError("CSV file is empty or headers could not be read.")
+
+        missing_headers = [h for h in EXPECTED_HEADERS if h not in headers]
+        if missing_headers:
+            raise MissingHeaderError(missing_headers=missing_headers)
+
+        # Later duplicates win, matching csv.DictReader
+        column_index = {name: i for i, name in enumerate(headers)}
+        device_idx = column_index[DEVICE_ID_COLUMN_NAME]
+        timestamp_idx = column_index[TIMESTAMP_COLUMN_NAME]
+        lat_idx = column_index[LATITUDE_COLUMN_NAME]
+        lon_idx = column_index[LONGITUDE_COLUMN_NAME]
+        event_type_idx = column_index.get(EVENT_TYPE_COLUMN_NAME)
+        event_details_idx = column_index.get(EVENT_DETAILS_COLUMN_NAME)
+        width = len(headers)
+
+        # 2. Read and Process Rows
+        day_cache = {}
+        row_num = 1  # Header row
+        for row in reader:
+            if not row:
+                continue  # Blank lines are skipped and not counted, as with csv.DictReader
+            row_num += 1
+            if len(row) < width:
+                row = row + [None] * (width - len(row))
+
+            # Extract Device ID
+            device_id = (row[device_idx] or '').strip()
+            if not device_id:
+                raise DataTypeError(column=DEVICE_ID_COLUMN_NAME, expected_type="Non-empty string", row_num=row_num,
+                                    message="Device identifier is missing or empty in a row.")
+
+            # Extract and Validate Timestamp
+            timestamp_str = row[timestamp_idx]
+            if not timestamp_str:
+                raise DataTypeError(column=TIMESTAMP_COLUMN_NAME, expected_type="Valid timestamp string", row_num=row_num,
+                                    message="Timestamp is missing.")
+            try:
+                epoch_seconds = parse_epoch_seconds(timestamp_str, day_cache)
+            except ValueError:
+                raise DataTypeError(column=TIMESTAMP_COLUMN_NAME, expected_type=f"Format '{TIMESTAMP_FORMAT}'", row_num=row_num,
+                                    message="Timestamp format is incorrect.")
+
+            # Extract and Validate Latitude
+            lat_str = row[lat_idx]
+            if not lat_str:
+                raise DataTypeError(column=LATITUDE_COLUMN_NAME, expected_type="Numeric value", row_num=row_num,
+                                    message="Latitude is missing.")
+            try:
+                latitude = float(lat_str)
+            except ValueError:
+                latitude = None
+            if latitude is None or not (-90 <= latitude <= 90):
+                raise DataTypeError(column=LATITUDE_COLUMN_NAME, expected_type="Float between -90 and 90", row_num=row_num,
+                                    message="Latitude is invalid or out of range.")
+
+            # Extract and Validate Longitude
+            lon_str = row[lon_idx]
+            if not lon_str:
+                raise DataTypeError(column=LONGITUDE_COLUMN_NAME, expected_type="Numeric value", row_num=row_num,
+                                    message="Longitude is missing.")
+            try:
+                longitude = float(lon_str)
+            except ValueError:
+                longitude = None
+            if longitude is None or not (-180 <= longitude <= 180):
+                raise DataTypeError(column=LONGITUDE_COLUMN_NAME, expected_type="Float between -180 and 180", row_num=row_num,
+                                    message="Longitude is invalid or out of range.")
+
+            yield (
+                device_id, epoch_seconds, latitude, longitude,
+                row[event_type_idx] if event_type_idx is not None else None,
+                row[event_details_idx] if event_details_idx is not None else None
+            )
+
+def read_csv_track(file_path: str):
+    """Parse a patrol report CSV into a columnar Track (same exceptions as iter_csv_rows)."""
+    builder = TrackBuilder()
+    append = builder.append
+    for row in iter_csv_rows(file_path):
+        append(*row)
+    return builder.build()
+
 def validate_and_read_csv_data(file_path: str):
     """
     Validates CSV structure, reads data, extracts device ID, and converts to appropriate types.
+    The file is read once through iter_csv_rows.
     Args:
         file_path (str): The full path to the CSV file.
     Returns:
-        tuple: (list_of_location_data_dicts, device_id_from_csv_str)
+        tuple: (Track, device_id_from_csv_str)
     Raises:
         FileNotFoundError: If the file_path does not exist.
         MissingHeaderError: If required headers are not found.
         DataTypeError: If data in critical columns cannot be converted.
         CSVValidationError: For other general CSV issues (e.g., empty file after headers).
     """
-    locations_data = []
-    device_ids_found = set()
-
     try:
-        with open(file_path, mode='r', encoding='utf-8-sig') as csvfile:
-            reader = csv.DictReader(csvfile)
-
-            # 1. Validate Headers
-            headers = reader.fieldnames
-            if not headers:
-                raise CSVValidationError("CSV file is empty or headers could not be read.")
-
-            missing_headers = [h for h in EXPECTED_HEADERS if h not in headers]
-            if missing_headers:
-                raise MissingHeaderError(missing_headers=missing_headers)
-
-            # 2. Read and Process Rows
-            for i, row in enumerate(reader):
-                row_num = i + 2  # For user-friendly error messages (1 for header, 1 for 0-indexed)
-
-                # Extract Device ID
-                current_row_device_id = row.get(DEVICE_ID_COLUMN_NAME, '').strip()
-                if not current_row_device_id:
-                    raise DataTypeError(column=DEVICE_ID_COLUMN_NAME, expected_type="Non-empty string", row_num=row_num,
-                                        message="Device identifier is missing or empty in a row.")
-                device_ids_found.add(current_row_device_id)
-
-                # Extract and Validate Timestamp
-                timestamp_str = row.get(TIMESTAMP_COLUMN_NAME)
-                if not timestamp_str:
-                    raise DataTypeError(column=TIMESTAMP_COLUMN_NAME, expected_type="Valid timestamp string", row_num=row_num,
-                                        message="Timestamp is missing.")
-                try:
-                    timestamp = datetime.strptime(timestamp_str, TIMESTAMP_FORMAT)
-                except ValueError:
-                    raise DataTypeError(column=TIMESTAMP_COLUMN_NAME, expected_type=f"Format '{TIMESTAMP_FORMAT}'", row_num=row_num,
-                                        message="Timestamp format is incorrect.")
-
-                # Extract and Validate Latitude
-                lat_str = row.get(LATITUDE_COLUMN_NAME)
-                if not lat_str:
-                    raise DataTypeError(column=LATITUDE_COLUMN_NAME, expected_type="Numeric value", row_num=row_num,
-                                        message="Latitude is missing.")
-                try:
-                    latitude = float(lat_str)
-                    if not (-90 <= latitude <= 90):
-                        raise ValueError("Latitude out of range")
-                except ValueError:
-                    raise DataTypeError(column=LATITUDE_COLUMN_NAME, expected_type="Float between -90 and 90", row_num=row_num,
-                                        message="Latitude is invalid or out of range.")
-
-                # Extract and Validate Longitude
-                lon_str = row.get(LONGITUDE_COLUMN_NAME)
-                if not lon_str:
-                    raise DataTypeError(column=LONGITUDE_COLUMN_NAME, expected_type="Numeric value", row_num=row_num,
-                                        message="Longitude is missing.")
-                try:
-                    longitude = float(lon_str)
-                    if not (-180 <= longitude <= 180):
-                        raise ValueError("Longitude out of range")
-                except ValueError:
-                    raise DataTypeError(column=LONGITUDE_COLUMN_NAME, expected_type="Float between -180 and 180", row_num=row_num,
-                                        message="Longitude is invalid or out of range.")
+        track = read_csv_track(file_path)
 
-                # Optional fields
-                event_type = row.get(EVENT_TYPE_COLUMN_NAME)
-                event_details = row.get(EVENT_DETAILS_COLUMN_NAME)
+        if not len(track):
+            raise CSVValidationError("CSV file contains no data rows after the header.")
 
-                locations_data.append({
-                    'timestamp': timestamp,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'event_type': event_type,
-                    'event_details': event_details,
-                    'original_device_id': current_row_device_id
-                })
+        # Determine the primary device ID for the report
+        if len(track.device_ids) > 1:
+            current_app.logger.warning(f"Multiple device IDs found in CSV '{file_path}': {set(track.device_ids)}. Using the first one encountered.")
+            # For simplicity, we'll use the first device ID found.
+            # A stricter approach might raise an error here.
 
-            if not locations_data:
-                raise CSVValidationError("CSV file contains no data rows after the header.")
-
-            # Determine the primary device ID for the report
-            if len(device_ids_found) > 1:
-                current_app.logger.warning(f"Multiple device IDs found in CSV '{file_path}': {device_ids_found}. Using the first one encountered.")
-                # For simplicity, we'll use the first device ID found.
-                # A stricter approach might raise an error here.
-
-            primary_device_id_from_csv = locations_data[0]['original_device_id'] if locations_data else None
-            if not primary_device_id_from_csv and device_ids_found:
-                primary_device_id_from_csv = list(device_ids_found)[0]
-
-            return locations_data, primary_device_id_from_csv
+        return track, track.device_id
 
     except FileNotFoundError:
         current_app.logger.error(f"CSV file not found at path: {file_path}")
         raise
-    except CSVValidationError as e:
-        current_app.logger.warning(f"CSV Validation Error for '{file_path}': {str(e)}")
-        raise
     except MissingHeaderError as e:
         current_app.logger.warning(f"Missing Headers in CSV '{file_path}': {str(e)}")
         raise
     except DataTypeError as e:
         current_app.logger.warning(f"Data Type Error in CSV '{file_path}': {str(e)}")
         raise
+    except CSVValidationError as e:
+        current_app.logger.warning(f"CSV Validation Error for '{file_path}': {str(e)}")
+        raise
     except Exception as e:
         current_app.logger.error(f"Unexpected error reading CSV '{file_path}': {str(e)}", exc_info=True)
         raise CSVValidationError(f"An unexpected error occurred while reading the CSV file: {str(e)}")
@@ -268,6 +438,7 @@ def validate_report_structure(file_path):
     required_columns = {'Device_Identifier', 'Timestamp', 'Latitude', 'Longitude'}
     ext = os.path.splitext(file_path)[1].lower()
     try:
+        import pandas as pd  # Only needed for these tabular (CSV/XLSX) helpers; kept out of app startup
         if ext == '.csv':
             df = pd.read_csv(file_path)
         elif ext == '.xlsx':
@@ -306,7 +477,9 @@ def read_report_data(file_path):
     locations = []
     errors = []
     ext = os.path.splitext(file_path)[1].lower()
+    row_warnings = RecordSummary(current_app.logger, f"Rows skipped in '{os.path.basename(file_path)}'")
     try:
+        import pandas as pd  # Only needed for these tabular (CSV/XLSX) helpers; kept out of app startup
         if ext == '.csv':
             df = pd.read_csv(file_path)
         elif ext == '.xlsx':
@@ -327,15 +500,14 @@ def read_report_data(file_path):
             except ValueError as e:
                 error_msg = f"Error in row {row_num+2}: {str(e)}"
                 errors.append(error_msg)
-                current_app.logger.warning(error_msg)
+                row_warnings.add(error_msg)
             except KeyError as e:
                 error_msg = f"Missing required column in row {row_num+2}: {str(e)}"
                 errors.append(error_msg)
-                current_app.logger.warning(error_msg)
+                row_warnings.add(error_msg)
+        row_warnings.emit()
         if not locations:
             raise CSVValidationError("No valid location data found in report file")
-        if errors:
-            current_app.logger.warning(f"Found {len(errors)} errors while reading report file")
         return locations
     except Exception as e:
         if isinstance(e, CSVValidationError):
@@ -0,0 +1,107 @@
+import io
+from flask import current_app
+from sqlalchemy import insert, select, delete
+from app import db
+from app.exceptions import LocationPersistenceError
+from app.models import ReportedLocation, VerifiedVisit
+from app.utils.track import Track, from_epoch_seconds
+
+DEFAULT_BATCH_SIZE = 2000  # Rows per multi-VALUES INSERT (6 bound parameters per row)
+
+EVENT_TYPE_MAX_LENGTH = ReportedLocation.__table__.c.event_type.type.length
+
+COPY_COLUMNS = ('report_id', 'timestamp', 'latitude', 'longitude', 'event_type', 'event_details')
+
+def _iter_row_values(report_id, track, start, stop):
+    """Row dicts for track points [start, stop), converting one slice of each column at a time."""
+    event_types = [value[:EVENT_TYPE_MAX_LENGTH] if value else value for value in track.event_types]
+    event_details = track.event_details
+    columns = zip(
+        track.epochs[start:stop].tolist(),
+        track.latitudes[start:stop].tolist(),
+        track.longitudes[start:stop].tolist(),
+        track.event_type_codes[start:stop].tolist(),
+        track.event_detail_codes[start:stop].tolist()
+    )
+    for epoch_seconds, latitude, longitude, type_code, details_code in columns:
+        yield {
+            'report_id': report_id,
+            'timestamp': from_epoch_seconds(epoch_seconds),
+            'latitude': latitude,
+            'longitude': longitude,
+            'event_type': event_types[type_code],
+            'event_details': event_details[details_code]
+        }
+
+def _copy_text_value(value):
+    """Encode a value for PostgreSQL's COPY text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, float):
+        return repr(value)
+    text = value.isoformat(sep=' ') if hasattr(value, 'isoformat') else str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def _insert_batches(report_id, track, batch_size):
+    table = ReportedLocation.__table__
+    for start in range(0, len(track), batch_size):
+        rows = list(_iter_row_values(report_id, track, start, start + batch_size))
+        db.session.execute(insert(table).values(rows))
+
+def _copy_from_stdin(report_id, track):
+    buffer = io.StringIO()
+    for row in _iter_row_values(report_id, track, 0, len(track)):
+        buffer.write('\t'.join(_copy_text_value(row[column]) for column in COPY_COLUMNS))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    # Run COPY on the session's own connection so it shares the report's transaction
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {ReportedLocation.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN",
+            buffer
+        )
+
+def clear_report_results(report_id):
+    """Remove previously stored locations and visits so a report can be processed again."""
+    db.session.execute(delete(VerifiedVisit).where(VerifiedVisit.report_id == report_id))
+    db.session.execute(delete(ReportedLocation).where(ReportedLocation.report_id == report_id))
+
+def persist_reported_locations(report_id, locations, batch_size=None):
+    """
+    Bulk insert a parsed track as ReportedLocation rows.
+
+    Uses COPY FROM STDIN on PostgreSQL and batched multi-row INSERT ... VALUES
+    statements elsewhere, inside the current session transaction.
+
+    Args:
+        report_id: ID of the UploadedPatrolReport
+        locations: Track from the CSV parser (or a list of location dictionaries)
+        batch_size: Rows per INSERT statement (non-PostgreSQL only)
+
+    Returns:
+        list: ReportedLocation IDs aligned with ``locations``
+    """
+    if not locations:
+        return []
+    if not isinstance(locations, Track):
+        locations = Track.from_locations(locations)
+    batch_size = batch_size or current_app.config.get('REPORTED_LOCATION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    if db.engine.dialect.name == 'postgresql':
+        _copy_from_stdin(report_id, locations)
+    else:
+        _insert_batches(report_id, locations, batch_size)
+
+    # IDs are assigned in insertion order, so the ordered IDs line up with the input rows
+    location_ids = db.session.execute(
+        select(ReportedLocation.id)
+        .where(ReportedLocation.report_id == report_id)
+        .order_by(ReportedLocation.id)
+    ).scalars().all()
+    if len(location_ids) != len(locations):
+        raise LocationPersistenceError(
+            f"Stored {len(location_ids)} reported locations for report {report_id}, expected {len(locations)}"
+        )
+    return location_ids
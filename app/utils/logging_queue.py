@@ -0,0 +1,136 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask.logging import default_handler
+
+LOG_FORMAT = '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped (and counted) while the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def emit(self, record):
+        try:
+            if self.queue.full():
+                self.dropped += 1
+                return
+            record = self.prepare(record)
+            if self.dropped:
+                record.msg = f"{record.msg} ({self.dropped} earlier log record(s) dropped, queue full)"
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+class RecordSummary:
+    """
+    Collects repetitive log messages (one per CSV row, one per visit) and
+    logs them as a single record: the count and the first few examples.
+
+        with RecordSummary(logger, f"Report {report_id}: rows skipped") as summary:
+            for ...:
+                summary.add(f"row {row_num}: {error}")
+    """
+
+    def __init__(self, logger, title, level=logging.WARNING, max_examples=5):
+        self.logger = logger
+        self.title = title
+        self.level = level
+        self.max_examples = max_examples
+        self.count = 0
+        self.examples = []
+
+    def add(self, message):
+        self.count += 1
+        if len(self.examples) < self.max_examples:
+            self.examples.append(message)
+
+    def emit(self):
+        if not self.count:
+            return
+        more = f" (+{self.count - len(self.examples)} more)" if self.count > len(self.examples) else ''
+        self.logger.log(self.level, f"{self.title}: {self.count}; " + '; '.join(self.examples) + more)
+        self.count = 0
+        self.examples = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.emit()
+        return False
+
+# The listener of this process; replaced in a forked child, where the writer thread does not exist
+_listener = None
+_queue_handler = None
+_handlers = ()
+_queue_size = 0
+
+def _start_listener():
+    global _listener
+    _queue_handler.queue = queue.Queue(maxsize=_queue_size)
+    _listener = QueueListener(_queue_handler.queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop_listener():
+    """Write out everything still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def build_handlers(app, log_dir):
+    """The handlers that do the actual I/O, run on the listener thread."""
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(formatter)
+    handlers.append(stream_handler)
+    if not app.config.get('LOG_TO_STDOUT'):
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            os.path.join(log_dir, 'ultraguard.log'),
+            maxBytes=app.config.get('LOG_FILE_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=app.config.get('LOG_FILE_BACKUP_COUNT', 5)
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    for handler in handlers:
+        handler.setLevel(logging.INFO)
+    return handlers
+
+def configure_logging(app, log_dir):
+    """
+    Route app.logger through a queue to a background writer thread.
+
+    Request and worker code only enqueues records; formatting, the file and
+    stderr writes and log rotation happen on the QueueListener's thread.
+    The writer is restarted in processes forked after this call (gunicorn
+    workers with preload_app).
+    """
+    global _queue_handler, _handlers, _queue_size
+    stop_listener()
+    _handlers = build_handlers(app, log_dir)
+    _queue_size = app.config.get('LOG_QUEUE_SIZE', 10000)
+    if _queue_handler is None:
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=_queue_size))
+        atexit.register(stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_start_listener)
+    _start_listener()
+
+    app.logger.removeHandler(default_handler)  # Its stderr writes now go through the queue
+    for handler in list(app.logger.handlers):
+        if isinstance(handler, QueueHandler):
+            app.logger.removeHandler(handler)
+    app.logger.addHandler(_queue_handler)
+    app.logger.setLevel(logging.INFO)
+    return _listener
@@ -0,0 +1,399 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import func, select
+from app import db
+from app.models import UploadedPatrolReport, ReportProcessingJob
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+ARCHIVE_FILENAME = 'archive.json'  # Totals of processes that have exited
+LOCK_FILENAME = '.lock'
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(10))  # 1 KB .. 256 MB
+RATE_BUCKETS = (100, 1000, 10000, 50000, 100000, 250000, 500000, 1000000)
+
+class _Metric:
+    """In-process values of one metric family, keyed by label values."""
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Per-process gauge; exported with a ``pid`` label, only while the process is alive."""
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = value
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with _lock:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [0] * (len(self.buckets) + 3)
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+_registry = {}
+_lock = threading.Lock()  # Guards metric values; gthread workers record from several threads
+
+REQUEST_SECONDS = Histogram(
+    'ultraguard_http_request_duration_seconds', 'Time spent handling a request, by endpoint.', ('endpoint', 'method'))
+REQUESTS = Counter(
+    'ultraguard_http_requests_total', 'Requests handled, by endpoint and status code.', ('endpoint', 'method', 'status'))
+UPLOAD_BYTES = Histogram(
+    'ultraguard_upload_size_bytes', 'Size of stored report uploads.', buckets=BYTES_BUCKETS)
+VERIFICATION_SECONDS = Histogram(
+    'ultraguard_report_verification_seconds', 'Wall time of checkpoint verification per report.')
+VERIFICATION_POINTS_PER_SECOND = Histogram(
+    'ultraguard_report_verification_points_per_second', 'Track points verified per second, per report.', buckets=RATE_BUCKETS)
+VERIFIED_POINTS = Counter(
+    'ultraguard_report_verified_points_total', 'Track points run through checkpoint verification.')
+DB_POOL_CHECKED_OUT = Gauge(
+    'ultraguard_db_pool_checked_out', 'Database connections currently checked out of the pool.', ('pid',))
+DB_POOL_OVERFLOW = Gauge(
+    'ultraguard_db_pool_overflow', 'Connections open beyond pool_size (negative while the pool is not full).', ('pid',))
+DB_POOL_SIZE = Gauge(
+    'ultraguard_db_pool_size', 'Configured pool_size of the database pool.', ('pid',))
+
+def observe_verification(seconds, points):
+    """Record one report's verification time and throughput."""
+    VERIFICATION_SECONDS.observe(seconds)
+    VERIFIED_POINTS.inc(points)
+    if seconds > 0 and points:
+        VERIFICATION_POINTS_PER_SECOND.observe(points / seconds)
+
+# --- Multiprocess aggregation ---
+#
+# Every process (gunicorn worker, batch verification worker) keeps its
+# values in memory and a daemon thread writes them to
+# METRICS_DIR/<pid>-<token>.json every METRICS_FLUSH_INTERVAL seconds, so
+# idle workers report too. A scrape adds up all files, so any worker can
+# answer it. Files of exited processes are folded into archive.json so
+# counters never go backwards.
+
+_directory = None
+_flush_interval = 5.0
+_last_flush = 0.0
+_flush_lock = threading.Lock()  # One writer of this process's file at a time
+_flusher = None
+_process_token = uuid.uuid4().hex[:8]  # Keeps a reused pid from overwriting an exited process's file
+
+def _reset_after_fork():
+    # Values recorded before a fork belong to the parent; its flush thread does not exist here
+    global _lock, _flush_lock, _last_flush, _process_token
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    for metric in _registry.values():
+        metric.values.clear()
+    _last_flush = 0.0
+    _process_token = uuid.uuid4().hex[:8]
+    _start_flusher()
+
+def _flush_periodically():
+    while True:
+        time.sleep(_flush_interval)
+        flush()
+
+def _start_flusher():
+    global _flusher
+    _flusher = threading.Thread(target=_flush_periodically, name='metrics-flush', daemon=True)
+    _flusher.start()
+
+def _snapshot_path():
+    return os.path.join(_directory, f'{os.getpid()}-{_process_token}.json')
+
+def _snapshot():
+    with _lock:
+        return {
+            name: {'type': metric.type, 'samples': [[list(key), list(value) if isinstance(value, list) else value]
+                                                    for key, value in metric.values.items()]}
+            for name, metric in _registry.items() if metric.values
+        }
+
+def _write_json(path, data):
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)  # Readers never see a half-written file
+
+def flush():
+    """Write this process's values to METRICS_DIR (no-op without one)."""
+    global _last_flush
+    if _directory is None:
+        return
+    with _flush_lock:
+        _last_flush = time.monotonic()
+        try:
+            _write_json(_snapshot_path(), _snapshot())
+        except OSError:
+            pass  # Metrics must never break a request
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+@contextmanager
+def _directory_lock(timeout=5.0, stale_after=30.0):
+    # O_EXCL lock file, as in report_queue, so it also works without fcntl
+    path = os.path.join(_directory, LOCK_FILENAME)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale_after:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for metrics lock {path}")
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _merge(totals, snapshot, pid=None):
+    for name, family in snapshot.items():
+        metric = _registry.get(name)
+        if metric is None or metric.type != family['type']:
+            continue  # Renamed or removed since the file was written
+        merged = totals.setdefault(name, {})
+        for key, value in family['samples']:
+            key = tuple(key)
+            if metric.type == 'gauge':
+                if pid is not None:
+                    merged[key] = value
+            elif metric.type == 'histogram':
+                current = merged.get(key)
+                if current is None or len(current) != len(value):
+                    merged[key] = list(value)
+                else:
+                    merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return totals
+
+def _without_gauges(totals):
+    return {
+        name: {'type': _registry[name].type, 'samples': [[list(key), value] for key, value in samples.items()]}
+        for name, samples in totals.items() if _registry[name].type != 'gauge'
+    }
+
+def collect():
+    """
+    {metric name: {label values: value}} summed over every process sharing
+    METRICS_DIR (or just this process without one).
+    """
+    if _directory is None:
+        return _merge({}, _snapshot(), pid=os.getpid())
+    flush()
+    with _directory_lock():
+        archive_path = os.path.join(_directory, ARCHIVE_FILENAME)
+        archive = _read_json(archive_path)
+        totals = _merge({}, archive)
+        exited = []
+        for filename in os.listdir(_directory):
+            pid = filename.split('-', 1)[0]
+            if not filename.endswith('.json') or not pid.isdigit():
+                continue
+            snapshot = _read_json(os.path.join(_directory, filename))
+            if _pid_alive(int(pid)):
+                _merge(totals, snapshot, pid=int(pid))
+            else:
+                exited.append((filename, snapshot))
+        if exited:
+            archived = _merge({}, archive)
+            for _, snapshot in exited:
+                _merge(totals, snapshot)
+                _merge(archived, snapshot)
+            _write_json(archive_path, _without_gauges(archived))
+            for filename, _ in exited:
+                os.remove(os.path.join(_directory, filename))
+    return totals
+
+def clear_directory(directory):
+    """Remove the files of a previous run (e.g. from gunicorn's on_starting hook)."""
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith('.json') or filename.endswith('.tmp') or filename == LOCK_FILENAME:
+            os.remove(os.path.join(directory, filename))
+
+# --- Exposition ---
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+def _family_lines(name, documentation, type_, samples, label_names, buckets=None):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {type_}']
+    for key in sorted(samples):
+        value = samples[key]
+        if type_ != 'histogram':
+            lines.append(f'{name}{_format_labels(label_names, key)} {_format_value(value)}')
+            continue
+        cumulative = 0
+        for bound, count in zip(buckets + (math.inf,), value[:-2]):
+            cumulative += count
+            labels = _format_labels(label_names, key, [('le', _format_value(float(bound)))])
+            lines.append(f'{name}_bucket{labels} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(label_names, key)} {_format_value(value[-2])}')
+        lines.append(f'{name}_count{_format_labels(label_names, key)} {value[-1]}')
+    return lines
+
+def _database_families():
+    """Gauges read from the database at scrape time, so they agree across workers."""
+    reports = dict(db.session.execute(
+        select(UploadedPatrolReport.processing_status, func.count(UploadedPatrolReport.id))
+        .group_by(UploadedPatrolReport.processing_status)
+    ).all())
+    jobs = dict(db.session.execute(
+        select(ReportProcessingJob.status, func.count(ReportProcessingJob.id)).group_by(ReportProcessingJob.status)
+    ).all())
+    return [
+        ('ultraguard_reports', 'Uploaded patrol reports by processing status.', {(status,): count for status, count in reports.items()}, ('status',)),
+        ('ultraguard_report_jobs', 'Background processing jobs by status (queued = queue depth).', {(status,): count for status, count in jobs.items()}, ('status',)),
+    ]
+
+def render_metrics():
+    """All metrics in the Prometheus text format."""
+    _update_pool_gauges()
+    totals = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.extend(_family_lines(
+            name, metric.documentation, metric.type, totals.get(name, {}), metric.labels, getattr(metric, 'buckets', None)
+        ))
+    for name, documentation, samples, label_names in _database_families():
+        lines.extend(_family_lines(name, documentation, 'gauge', samples, label_names))
+    return '\n'.join(lines) + '\n'
+
+# --- Hooks ---
+
+def _update_pool_gauges():
+    pool = db.engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return  # SQLite's static/singleton pools have no counters
+    pid = os.getpid()
+    DB_POOL_CHECKED_OUT.set(pool.checkedout(), pid=pid)
+    DB_POOL_OVERFLOW.set(pool.overflow(), pid=pid)
+    DB_POOL_SIZE.set(pool.size(), pid=pid)
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    if _directory is not None and time.monotonic() - _last_flush >= _flush_interval:
+        _update_pool_gauges()  # Written out by the next timer flush
+    # Matched endpoint rather than path, so URL parameters do not multiply the series
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+    return response
+
+def init_app(app):
+    """
+    Collect request, upload and verification metrics for /admin/metrics.
+
+    With METRICS_DIR set, values are shared through files in that directory
+    so every gunicorn worker on the host reports the same totals. The flush
+    thread is restarted in processes forked after this call.
+    """
+    global _directory, _flush_interval
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        _flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+        if _directory is None:
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=_reset_after_fork)
+            atexit.register(flush)
+            _directory = directory
+            _start_flusher()
+        _directory = directory
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
@@ -0,0 +1,139 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 25
+
+def encode_cursor(values):
+    """Opaque, URL-safe token for a row's sort key (datetimes are kept as ISO strings)."""
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError(f"Unsupported cursor value {value!r}")
+    return value
+
+def decode_cursor(token):
+    """Sort key tuple from a cursor token, or None if the token is missing or malformed (only scalars and datetimes are accepted)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        if not isinstance(payload, list):
+            return None
+        return tuple(_decode_value(value) for value in payload)
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeDecodeError):
+        return None
+
+def _fits_column(value, column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return False
+    if python_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+def _cursor_values(token, columns):
+    """Decoded cursor if it has one value of each column's Python type, so it is safe to bind; None otherwise."""
+    values = decode_cursor(token)
+    if values is None or len(values) != len(columns):
+        return None
+    if not all(_fits_column(value, column) for value, column in zip(values, columns)):
+        return None
+    return values
+
+def _seek_condition(columns, values, descending):
+    """Rows strictly after ``values`` in (columns) order, spelled out so every backend can use the index."""
+    clauses = []
+    for position, column in enumerate(columns):
+        equal_prefix = [columns[i] == values[i] for i in range(position)]
+        beyond = column < values[position] if descending else column > values[position]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+class KeysetPage:
+    """One page of a keyset-paginated listing plus the cursors for its neighbours."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=DEFAULT_PER_PAGE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+def keyset_paginate(query, columns, key, after=None, before=None, per_page=None, descending=False):
+    """
+    Fetch one page of ``query`` ordered by ``columns`` using seek pagination.
+
+    Unlike OFFSET, the cost of a page does not grow with how far into the
+    history it is: the cursor's sort key becomes a WHERE condition that the
+    matching (columns) index satisfies directly. The last column must be
+    unique (normally the primary key) so the order is total and cursors
+    stay stable while rows are added.
+
+    Args:
+        query: Filtered query without ORDER BY or LIMIT
+        columns: Sort columns, e.g. (UploadedPatrolReport.upload_timestamp, UploadedPatrolReport.id)
+        key: Function returning a row's sort values in the same order as ``columns``
+        after: Cursor of the last row of the previous page (moving forward)
+        before: Cursor of the first row of the next page (moving back)
+        per_page: Page size
+        descending: Newest/highest first
+
+    Returns:
+        KeysetPage
+    """
+    per_page = per_page or DEFAULT_PER_PAGE
+    # A cursor that does not fit the columns is treated as absent: the first page is served
+    after_values = _cursor_values(after, columns)
+    before_values = _cursor_values(before, columns) if after_values is None else None
+
+    backwards = before_values is not None
+    # Walking back means reading in the opposite order from the cursor and flipping the result
+    scan_descending = descending != backwards
+    ordering = [column.desc() if scan_descending else column.asc() for column in columns]
+    if after_values is not None:
+        query = query.filter(_seek_condition(columns, after_values, descending))
+    elif backwards:
+        query = query.filter(_seek_condition(columns, before_values, not descending))
+
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = encode_cursor(key(rows[0])), encode_cursor(key(rows[-1]))
+        if backwards:
+            prev_cursor = first if has_more else None
+            next_cursor = last
+        else:
+            prev_cursor = first if after_values is not None else None
+            next_cursor = last if has_more else None
+    return KeysetPage(rows, next_cursor=next_cursor, prev_cursor=prev_cursor, per_page=per_page)
@@ -4,11 +4,17 @@ from app import db
 from app.models import UploadedPatrolReport, Shift
 from app.exceptions import (
     FileUploadError, InvalidFileTypeError, CSVValidationError,
-    DeviceIdentifierMismatchError, VerificationLogicError, DataTypeError, MissingHeaderError
+    DeviceIdentifierMismatchError, VerificationLogicError, DataTypeError, MissingHeaderError,
+    JobLeaseLostError
 )
 from app.utils.file_handlers import save_uploaded_file, validate_and_read_csv_data
 from app.utils.verification import verify_patrol_report
+from app.utils.report_queue import enqueue_report_job, live_job_exists
+from app.utils.location_persistence import persist_reported_locations, clear_report_results
+from app.utils.stage_metrics import StageTimer
+from app.utils.metrics import observe_verification
 from datetime import datetime, timezone
+from sqlalchemy import or_, and_
 
 # Status constants
 REPORT_STATUS_PROCESSING = 'processing'
@@ -20,35 +26,61 @@ REPORT_STATUS_ERROR_DEVICE_MISMATCH = 'error_device_mismatch'
 REPORT_STATUS_ERROR_VERIFICATION = 'error_verification'
 REPORT_STATUS_ERROR_PROCESSING = 'error_processing'
 
+# Reports whose results an identical re-upload can reuse (errors may be transient, so those are re-run)
+DEDUPLICATED_STATUSES = (REPORT_STATUS_COMPLETED, REPORT_STATUS_COMPLETED_MISSED)
+
+def find_duplicate_report(shift_id: int, file_sha256: str):
+    """
+    The earliest report for the shift with the same file content that is
+    verified, or still waiting for or running on the background worker, or
+    None. A 'processing' report without a live job (its processing died) is
+    not reused, so the re-upload processes the file again.
+    """
+    return UploadedPatrolReport.query\
+        .filter(UploadedPatrolReport.shift_id == shift_id,
+                UploadedPatrolReport.file_sha256 == file_sha256,
+                or_(UploadedPatrolReport.processing_status.in_(DEDUPLICATED_STATUSES),
+                    and_(UploadedPatrolReport.processing_status == REPORT_STATUS_PROCESSING,
+                         live_job_exists(UploadedPatrolReport.id))))\
+        .order_by(UploadedPatrolReport.id)\
+        .first()
+
+def create_report_for_upload(shift_id: int, user_id: int, filename: str, saved):
+    """Add a 'processing' report for a stored upload (a SavedUpload) to the session and flush it to get its id."""
+    report = UploadedPatrolReport(
+        shift_id=shift_id,
+        uploaded_by_user_id=user_id,
+        filename=secure_filename(filename),
+        upload_timestamp=datetime.now(timezone.utc),
+        processing_status=REPORT_STATUS_PROCESSING,
+        file_path=saved.path,
+        file_sha256=saved.sha256,
+        file_size=saved.size,
+        row_count=saved.row_count
+    )
+    db.session.add(report)
+    db.session.flush()  # Assigns report.id
+    return report
+
 def handle_report_submission_and_processing(shift_id: int, uploaded_file, current_user_id: int, client_id: int):
     """
     Handles the entire lifecycle of a patrol report submission and processing.
+    Re-uploading a file already verified (or queued) for the same shift returns
+    that report instead of processing the content again.
+    With REPORT_PROCESSING_ASYNC enabled, the report is saved and queued for the
+    background worker (`flask process-reports`) instead of processed in the request.
     Returns: tuple (success_bool, flash_category_str, flash_message_str, report_id_or_None)
     """
     report = None  # Initialize report variable
     shift = db.session.get(Shift, shift_id)
+    timer = StageTimer()
 
     try:
-        # --- STEP 1: Create the report record with file_path as NULL ---
-        report = UploadedPatrolReport(
-            shift_id=shift.id,
-            uploaded_by_user_id=current_user_id,
-            filename=secure_filename(uploaded_file.filename),
-            upload_timestamp=datetime.now(timezone.utc),
-            processing_status=REPORT_STATUS_PROCESSING,
-            file_path=None  # Initially NULL
-        )
-        db.session.add(report)
-        db.session.flush()  # This assigns report.id and makes the object persistent in the session
-
-        # --- STEP 2: Save the file using report.id, then update file_path ---
+        # --- STEP 1: Store the file in the content-addressed blob store ---
         try:
-            file_path = save_uploaded_file(
-                uploaded_file,
-                client_id=client_id,
-                report_id=report.id  # Now report.id is available
-            )
-            report.file_path = file_path  # Use the returned string directly
+            with timer.stage('save') as sample:
+                saved = save_uploaded_file(uploaded_file)
+                sample.bytes, sample.rows = saved.size, saved.row_count
         except InvalidFileTypeError as e_filetype:
             db.session.rollback()
             current_app.logger.error(f"InvalidFileTypeError for client {client_id}: {str(e_filetype)}", exc_info=True)
@@ -70,34 +102,24 @@ def handle_report_submission_and_processing(shift_id: int, uploaded_file, curren
                 current_app.logger.error(f"Could not save error report after InvalidFileTypeError: {db_err_on_error_save}", exc_info=True)
                 return (False, 'danger', f"Invalid file type: {str(e_filetype)}", None)
 
-        # --- Continue with CSV validation, device check, verification ---
-        reported_locations_data, device_id_from_csv = validate_and_read_csv_data(report.file_path)
-        report.device_identifier_from_report = device_id_from_csv
+        # --- STEP 2: An identical file for the same shift short-circuits to the existing results ---
+        duplicate = find_duplicate_report(shift.id, saved.sha256)
+        if duplicate is not None:
+            current_app.logger.info(f"Upload for shift {shift.id} (client {client_id}) duplicates report {duplicate.id} (sha256 {saved.sha256})")
+            return (True, 'info', 'This file was already uploaded for this shift; showing the existing verification results.', duplicate.id)
 
-        if not device_id_from_csv or device_id_from_csv.strip().lower() != shift.device.imei.strip().lower():
-            raise DeviceIdentifierMismatchError(
-                f"Device ID in report ('{device_id_from_csv or 'Not Found'}') "
-                f"does not match expected device IMEI ('{shift.device.imei}') for the selected shift."
-            )
+        # --- STEP 3: Create the report record pointing at the stored file ---
+        report = create_report_for_upload(shift.id, current_user_id, uploaded_file.filename, saved)
+        timer.record(report.id)
 
-        verification_successful, missed_checkpoints = verify_patrol_report(
-            report.id, shift, reported_locations_data
-        )
+        # --- STEP 4: Hand off to the background worker, or persist and process inline ---
+        if current_app.config.get('REPORT_PROCESSING_ASYNC', False):
+            enqueue_report_job(report)
+            db.session.commit()
+            current_app.logger.info(f"Queued report {report.id} for background processing (client {client_id})")
+            return (True, 'info', 'Report uploaded. Checkpoint verification is running in the background.', report.id)
 
-        if verification_successful:
-            missed_count = len(missed_checkpoints)
-            if missed_count > 0:
-                report.processing_status = REPORT_STATUS_COMPLETED_MISSED
-                db.session.commit()  # Commit everything: report creation, file_path update, verification results
-                return (True, 'warning', f'Report processed. {missed_count} checkpoint(s) were missed.', report.id)
-            else:
-                report.processing_status = REPORT_STATUS_COMPLETED
-                db.session.commit()
-                return (True, 'success', 'Report uploaded and all checkpoints verified successfully!', report.id)
-        else:
-            report.processing_status = REPORT_STATUS_ERROR_PROCESSING
-            db.session.commit()  # Commit the report with error status
-            return (False, 'danger', f'Error during report verification: {report.error_message or "Unknown verification error."}', report.id)
+        db.session.commit()  # Persist the report and its file_path before processing
 
     except FileUploadError as e:
         db.session.rollback()
@@ -120,42 +142,6 @@ def handle_report_submission_and_processing(shift_id: int, uploaded_file, curren
             current_app.logger.error(f"Could not save error report after FileUploadError: {db_err_on_error_save}", exc_info=True)
             return (False, 'danger', f"Upload Failed: {str(e)}", None)
 
-    except (MissingHeaderError, DataTypeError, DeviceIdentifierMismatchError, CSVValidationError) as e:
-        if report and report.id is not None:
-            try:
-                report.processing_status = REPORT_STATUS_ERROR_DEVICE_MISMATCH if isinstance(e, DeviceIdentifierMismatchError) else REPORT_STATUS_ERROR_VALIDATION
-                report.error_message = str(e)
-                db.session.commit()  # Commit the report with its file_path and error status
-                report_id_for_return = report.id
-            except Exception as db_err:
-                db.session.rollback()
-                current_app.logger.error(f"Error committing report status after CSV error: {db_err}", exc_info=True)
-                report_id_for_return = None
-        else:
-            db.session.rollback()
-            report_id_for_return = None
-
-        current_app.logger.warning(f"CSV/Device Validation Error for client {client_id}, report ID {report_id_for_return or 'N/A'}: {str(e)}")
-        return (False, 'danger', f"Invalid Report Data: {str(e)}", report_id_for_return)
-
-    except VerificationLogicError as e:
-        if report and report.id:
-            try:
-                report.processing_status = REPORT_STATUS_ERROR_PROCESSING
-                report.error_message = f"Verification Error: {str(e)}"
-                db.session.commit()
-                report_id_for_return = report.id
-            except Exception as db_err:
-                db.session.rollback()
-                current_app.logger.error(f"Error committing report status after verification error: {db_err}", exc_info=True)
-                report_id_for_return = None
-        else:
-            db.session.rollback()
-            report_id_for_return = None
-
-        current_app.logger.error(f"VerificationLogicError for client {client_id}, report ID {report_id_for_return or 'N/A'}: {str(e)}", exc_info=True)
-        return (False, 'danger', f"Verification Error: {str(e)}", report_id_for_return)
-
     except Exception as e:  # Catch-all for truly unexpected errors
         db.session.rollback()
         error_report_id = None
@@ -177,4 +163,124 @@ def handle_report_submission_and_processing(shift_id: int, uploaded_file, curren
             current_app.logger.error(f"COULD NOT SAVE ERROR REPORT after critical failure: {db_err_on_critical_save}", exc_info=True)
 
         current_app.logger.critical(f"UNEXPECTED Exception for client {client_id}, original report attempt related to shift {shift.id}: {str(e)}", exc_info=True)
-        return (False, 'danger', "A critical unexpected error occurred. Please contact support.", error_report_id) 
\ No newline at end of file
+        return (False, 'danger', "A critical unexpected error occurred. Please contact support.", error_report_id)
+
+    return process_report(report.id)
+
+def process_report(report_id: int, heartbeat=None):
+    """
+    Validates, device-checks and verifies a saved report, updating its status.
+    Called inline by handle_report_submission_and_processing or by the background worker,
+    which passes its job's lease as ``heartbeat`` to renew it between stages.
+    Returns: tuple (success_bool, flash_category_str, flash_message_str, report_id_or_None)
+    """
+    report = db.session.get(UploadedPatrolReport, report_id)
+    if report is None:
+        current_app.logger.error(f"Cannot process report {report_id}: report not found")
+        return (False, 'danger', 'Report not found.', None)
+
+    shift = report.shift
+    client_id = report.client_id
+    timer = StageTimer()  # Per-stage wall/CPU time, stored in report_processing_metric
+    heartbeat = heartbeat or (lambda: None)
+
+    try:
+        # --- Continue with CSV validation, device check, verification ---
+        with timer.stage('parse', bytes=report.file_size) as sample:
+            track, device_id_from_csv = validate_and_read_csv_data(report.file_path)
+            sample.rows = len(track)
+        heartbeat()
+        report.device_identifier_from_report = device_id_from_csv
+        if report.row_count is None:
+            report.row_count = len(track)  # Compressed uploads are only counted once decompressed
+
+        with timer.stage('device_check'):
+            if not device_id_from_csv or device_id_from_csv.strip().lower() != shift.device.imei.strip().lower():
+                raise DeviceIdentifierMismatchError(
+                    f"Device ID in report ('{device_id_from_csv or 'Not Found'}') "
+                    f"does not match expected device IMEI ('{shift.device.imei}') for the selected shift."
+                )
+
+        # Store the raw track in bulk so verified visits can reference their fixes
+        with timer.stage('persist', rows=len(track)):
+            clear_report_results(report.id)  # No-op unless the report is being reprocessed
+            location_ids = persist_reported_locations(report.id, track)
+        heartbeat()
+
+        with timer.stage('verify', rows=len(track)) as sample:
+            verification_successful, missed_checkpoints, out_of_order_checkpoints = verify_patrol_report(
+                report.id, shift, track, location_ids=location_ids
+            )
+            db.session.add_all(verification_successful)
+        observe_verification(sample.wall_ms / 1000, len(track))
+        heartbeat()
+
+        if verification_successful:
+            missed_count = len(missed_checkpoints)
+            if missed_count > 0:
+                report.processing_status = REPORT_STATUS_COMPLETED_MISSED
+                message = f'Report processed. {missed_count} checkpoint(s) were missed.'
+                if out_of_order_checkpoints:
+                    message = f'Report processed. {missed_count} checkpoint(s) were missed ({len(out_of_order_checkpoints)} visited out of sequence).'
+                outcome = (True, 'warning', message, report.id)
+            else:
+                report.processing_status = REPORT_STATUS_COMPLETED
+                outcome = (True, 'success', 'Report uploaded and all checkpoints verified successfully!', report.id)
+        else:
+            report.processing_status = REPORT_STATUS_ERROR_PROCESSING
+            outcome = (False, 'danger', f'Error during report verification: {report.error_message or "Unknown verification error."}', report.id)
+
+        timer.record(report.id)
+        with timer.stage('commit'):
+            db.session.commit()  # Commit everything: verification results, status and stage timings
+        timer.record_safely(report.id, commit=True)
+        return outcome
+
+    except (MissingHeaderError, DataTypeError, DeviceIdentifierMismatchError, CSVValidationError) as e:
+        try:
+            report.processing_status = REPORT_STATUS_ERROR_DEVICE_MISMATCH if isinstance(e, DeviceIdentifierMismatchError) else REPORT_STATUS_ERROR_VALIDATION
+            report.error_message = str(e)
+            timer.record(report.id)
+            db.session.commit()  # Commit the report with its file_path and error status
+            report_id_for_return = report.id
+        except Exception as db_err:
+            db.session.rollback()
+            current_app.logger.error(f"Error committing report status after CSV error: {db_err}", exc_info=True)
+            report_id_for_return = None
+
+        current_app.logger.warning(f"CSV/Device Validation Error for client {client_id}, report ID {report_id_for_return or 'N/A'}: {str(e)}")
+        return (False, 'danger', f"Invalid Report Data: {str(e)}", report_id_for_return)
+
+    except VerificationLogicError as e:
+        try:
+            report.processing_status = REPORT_STATUS_ERROR_PROCESSING
+            report.error_message = f"Verification Error: {str(e)}"
+            timer.record(report.id)
+            db.session.commit()
+            report_id_for_return = report.id
+        except Exception as db_err:
+            db.session.rollback()
+            current_app.logger.error(f"Error committing report status after verification error: {db_err}", exc_info=True)
+            report_id_for_return = None
+
+        current_app.logger.error(f"VerificationLogicError for client {client_id}, report ID {report_id_for_return or 'N/A'}: {str(e)}", exc_info=True)
+        return (False, 'danger', f"Verification Error: {str(e)}", report_id_for_return)
+
+    except JobLeaseLostError:
+        db.session.rollback()  # The worker that reclaimed the job writes the results
+        raise
+
+    except Exception as e:  # Catch-all for truly unexpected errors
+        db.session.rollback()
+        try:
+            report = db.session.get(UploadedPatrolReport, report_id)
+            report.processing_status = REPORT_STATUS_ERROR_PROCESSING
+            report.error_message = "A critical unexpected error occurred during processing."
+            timer.record(report.id)
+            db.session.commit()
+        except Exception as db_err_on_critical_save:
+            db.session.rollback()
+            current_app.logger.error(f"COULD NOT SAVE ERROR STATUS after critical failure: {db_err_on_critical_save}", exc_info=True)
+
+        current_app.logger.critical(f"UNEXPECTED Exception for client {client_id}, report {report_id} (shift {shift.id}): {str(e)}", exc_info=True)
+        return (False, 'danger', "A critical unexpected error occurred. Please contact support.", report_id)
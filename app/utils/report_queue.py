@@ -0,0 +1,218 @@
+import os
+import time
+import socket
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, update, or_, and_
+from app import db
+from app.models import ReportProcessingJob
+from app.exceptions import JobQueueError, JobLeaseLostError
+
+# Job status constants
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_DONE = 'done'
+JOB_STATUS_FAILED = 'failed'
+
+QUEUE_LOCK_FILENAME = 'report_queue.lock'
+
+def enqueue_report_job(report):
+    """Add a queued processing job for a saved report to the current session."""
+    job = ReportProcessingJob(report_id=report.id, status=JOB_STATUS_QUEUED)
+    db.session.add(job)
+    return job
+
+def _utcnow():
+    """Naive UTC time, as the job timestamps are stored."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def lease_duration():
+    return timedelta(seconds=current_app.config.get('REPORT_JOB_LEASE_SECONDS', 600))
+
+def _lease_expired():
+    # Jobs claimed before leases were stored have no expiry and count as expired
+    return or_(ReportProcessingJob.lease_expires_at.is_(None), ReportProcessingJob.lease_expires_at < _utcnow())
+
+def live_job_exists(report_id_column):
+    """EXISTS clause: the report has a queued job, or a running one whose lease has not expired, so it will still be processed."""
+    return select(ReportProcessingJob.id)\
+        .where(ReportProcessingJob.report_id == report_id_column,
+               or_(ReportProcessingJob.status == JOB_STATUS_QUEUED,
+                   and_(ReportProcessingJob.status == JOB_STATUS_RUNNING, ~_lease_expired())))\
+        .exists()
+
+class JobLease:
+    """
+    Heartbeat for a claimed job, called by process_report between stages.
+
+    Renews the job's lease (at most every third of REPORT_JOB_LEASE_SECONDS)
+    in its own short transaction, so other workers see it while the report's
+    transaction is still open. Raises JobLeaseLostError when the job has been
+    reclaimed by another worker, so the report is not written twice.
+    """
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.worker_id = job.worker_id
+        self.attempts = job.attempts
+        self.duration = lease_duration()
+        self.renewed_at = time.monotonic()
+
+    def __call__(self):
+        if time.monotonic() - self.renewed_at < self.duration.total_seconds() / 3:
+            return
+        with db.engine.connect() as connection:
+            renewed = connection.execute(
+                update(ReportProcessingJob.__table__)
+                .where(ReportProcessingJob.id == self.job_id,
+                       ReportProcessingJob.status == JOB_STATUS_RUNNING,
+                       ReportProcessingJob.worker_id == self.worker_id,
+                       ReportProcessingJob.attempts == self.attempts)
+                .values(lease_expires_at=_utcnow() + self.duration)
+            ).rowcount
+            connection.commit()
+        if not renewed:
+            raise JobLeaseLostError(f"Report processing job {self.job_id} was reclaimed from worker {self.worker_id}")
+        self.renewed_at = time.monotonic()
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+@contextmanager
+def _queue_file_lock(timeout=10.0, stale_after=60.0):
+    """
+    Cross-process mutex for databases without SKIP LOCKED (SQLite).
+
+    Uses an O_EXCL lock file in the instance folder so it also works where
+    fcntl is unavailable. Lock files older than ``stale_after`` seconds are
+    assumed to belong to a crashed worker and are removed.
+    """
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    path = os.path.join(current_app.instance_path, QUEUE_LOCK_FILENAME)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale_after:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise JobQueueError(f"Timed out waiting for report queue lock {path}")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _claim(worker_id, skip_locked):
+    now = _utcnow()
+    # Running jobs whose lease has expired belong to a worker that died or stalled mid-job
+    stmt = select(ReportProcessingJob)\
+        .where(or_(
+            ReportProcessingJob.status == JOB_STATUS_QUEUED,
+            and_(ReportProcessingJob.status == JOB_STATUS_RUNNING, _lease_expired())
+        ))\
+        .order_by(ReportProcessingJob.id)\
+        .limit(1)
+    if skip_locked:
+        stmt = stmt.with_for_update(skip_locked=True)
+
+    job = db.session.execute(stmt).scalar_one_or_none()
+    if job is None:
+        db.session.rollback()  # End the read transaction
+        return None
+
+    job.status = JOB_STATUS_RUNNING
+    job.worker_id = worker_id
+    job.started_at = now
+    job.lease_expires_at = now + lease_duration()
+    job.finished_at = None
+    job.attempts = (job.attempts or 0) + 1
+    db.session.commit()
+    return job
+
+def claim_next_job(worker_id=None):
+    """
+    Atomically claim the oldest queued job, or return None if the queue is empty.
+
+    On PostgreSQL the row is claimed with SELECT ... FOR UPDATE SKIP LOCKED so
+    concurrent workers never block on each other; other databases serialize
+    claims through a lock file.
+    """
+    worker_id = worker_id or default_worker_id()
+    if db.engine.dialect.name == 'postgresql':
+        return _claim(worker_id, skip_locked=True)
+    with _queue_file_lock():
+        return _claim(worker_id, skip_locked=False)
+
+def run_job(job):
+    """Process the report behind a claimed job and record the outcome on the job."""
+    from app.utils.report_processing import process_report
+
+    job_id, report_id = job.id, job.report_id
+    lease = JobLease(job)
+    try:
+        success, _, message, _ = process_report(report_id, heartbeat=lease)
+        job = db.session.get(ReportProcessingJob, job_id)
+        job.status = JOB_STATUS_DONE
+        job.last_error = None if success else message
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+        return success
+    except JobLeaseLostError as e:
+        # Another worker owns the job now; leave it and the report to that worker
+        db.session.rollback()
+        current_app.logger.warning(str(e))
+        return False
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Report processing job {job_id} (report {report_id}) failed: {str(e)}", exc_info=True)
+        job = db.session.get(ReportProcessingJob, job_id)
+        job.last_error = str(e)
+        if job.attempts >= current_app.config.get('REPORT_JOB_MAX_ATTEMPTS', 3):
+            job.status = JOB_STATUS_FAILED
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            job.status = JOB_STATUS_QUEUED
+        db.session.commit()
+        return False
+
+def run_worker(poll_interval=2.0, burst=False, max_jobs=None, worker_id=None):
+    """
+    Claim and run jobs until stopped.
+
+    Args:
+        poll_interval: Seconds to sleep when the queue is empty
+        burst: Exit as soon as the queue is empty instead of polling
+        max_jobs: Optional number of jobs after which the worker exits
+
+    Returns:
+        int: Number of jobs processed
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    current_app.logger.info(f"Report worker {worker_id} started")
+    while max_jobs is None or processed < max_jobs:
+        job = claim_next_job(worker_id)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        current_app.logger.info(f"Worker {worker_id} claimed job {job.id} for report {job.report_id} (attempt {job.attempts})")
+        run_job(job)
+        processed += 1
+        db.session.remove()  # Start every job with an empty identity map
+    current_app.logger.info(f"Report worker {worker_id} stopped after {processed} job(s)")
+    return processed
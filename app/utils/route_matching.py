@@ -0,0 +1,86 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+def longest_ordered_chain(location_indexes, columns):
+    """
+    Best in-order assignment of fixes to a route's checkpoint sequence.
+
+    Given candidate hits (location i satisfies route checkpoint column j),
+    finds the largest set of hits whose locations and columns both strictly
+    increase, i.e. the most checkpoints that can be credited as visited in
+    sequence_order with each fix used once. This is a longest increasing
+    subsequence over the hits, solved by patience sorting in O(H log H) for
+    H hits. A route that lists the same checkpoint twice (e.g. returning to
+    HQ) has two columns, so each visit is matched to its own place in the
+    sequence.
+
+    Among equally long chains, each chosen checkpoint is given its earliest
+    hit that keeps the order.
+
+    Args:
+        location_indexes: Hit location indexes, ascending
+        columns: Hit columns (indexes into the sequence-ordered route checkpoints)
+
+    Returns:
+        list: (location_index, column) pairs in route order
+    """
+    location_indexes = np.asarray(location_indexes)
+    columns = np.asarray(columns)
+    if location_indexes.size == 0:
+        return []
+
+    # Within one location visit columns high-to-low so a single fix never extends its own chain
+    order = np.lexsort((-columns, location_indexes))
+    hit_columns = columns[order].tolist()
+
+    tail_columns = []  # tail_columns[k]: smallest last column of any chain of length k + 1
+    tail_hits = []
+    previous = [-1] * len(hit_columns)
+    for hit, column in enumerate(hit_columns):
+        length = bisect_left(tail_columns, column)
+        if length:
+            previous[hit] = tail_hits[length - 1]
+        if length == len(tail_columns):
+            tail_columns.append(column)
+            tail_hits.append(hit)
+        else:
+            tail_columns[length] = column
+            tail_hits[length] = hit
+
+    chain_columns = []
+    hit = tail_hits[-1]
+    while hit != -1:
+        chain_columns.append(hit_columns[hit])
+        hit = previous[hit]
+    chain_columns.reverse()
+
+    # Re-pick the earliest feasible hit per chain column; since some chain
+    # with these columns exists, taking the earliest each time cannot fail.
+    hits_by_column = {}
+    for location_index, column in zip(location_indexes.tolist(), columns.tolist()):
+        hits_by_column.setdefault(column, []).append(location_index)
+
+    assignment = []
+    last_location = -1
+    for column in chain_columns:
+        candidates = hits_by_column[column]
+        location_index = candidates[bisect_right(candidates, last_location)]
+        assignment.append((location_index, column))
+        last_location = location_index
+    return assignment
+
+def sequence_position_bounds(column, matched_positions):
+    """
+    Exclusive (low, high) track positions between which ``column`` may still
+    be visited without breaking the order of the matched columns.
+
+    Args:
+        matched_positions: dict of column -> track position of its visit
+    """
+    low, high = float('-inf'), float('inf')
+    for other, position in matched_positions.items():
+        if other < column:
+            low = max(low, position)
+        elif other > column:
+            high = min(high, position)
+    return low, high
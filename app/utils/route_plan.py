@@ -0,0 +1,227 @@
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, select, update, inspect
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Route, RouteCheckpoint, Checkpoint
+from app.utils.spatial_index import CheckpointGridIndex
+
+DEFAULT_CACHE_SIZE = 128
+
+# Detached, immutable stand-ins for Checkpoint / RouteCheckpoint rows. They
+# expose the attributes verification reads, so matchers and callers can use
+# them exactly like the ORM objects.
+PlannedCheckpoint = namedtuple('PlannedCheckpoint', 'id name latitude longitude radius')
+PlannedRouteCheckpoint = namedtuple(
+    'PlannedRouteCheckpoint',
+    'id route_id checkpoint_id sequence_order expected_time_window_start expected_time_window_end checkpoint'
+)
+
+def _seconds_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+
+def _read_only(values, dtype=float):
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+class RoutePlan:
+    """
+    Compiled, read-only view of a route's checkpoints in sequence order.
+
+    Holds everything verification needs up front: coordinates in degrees and
+    radians, cos(latitude), radii, time windows as seconds of day and the
+    spatial index. Behaves as a sequence of PlannedRouteCheckpoint, so it
+    can be passed wherever a list of RouteCheckpoint objects is expected.
+    """
+
+    def __init__(self, route_id, version, route_checkpoints):
+        self.route_id = route_id
+        self.version = version
+        self.route_checkpoints = tuple(route_checkpoints)
+        checkpoints = [rc.checkpoint for rc in self.route_checkpoints]
+
+        self.latitudes = _read_only([cp.latitude for cp in checkpoints])
+        self.longitudes = _read_only([cp.longitude for cp in checkpoints])
+        self.radii = _read_only([cp.radius for cp in checkpoints])
+        self.lat_radians = _read_only(np.radians(self.latitudes))
+        self.lon_radians = _read_only(np.radians(self.longitudes))
+        self.cos_lat = _read_only(np.cos(self.lat_radians))
+
+        has_window, starts, ends = [], [], []
+        for rc in self.route_checkpoints:
+            windowed = bool(rc.expected_time_window_start and rc.expected_time_window_end)
+            has_window.append(windowed)
+            starts.append(_seconds_of_day(rc.expected_time_window_start) if windowed else 0.0)
+            ends.append(_seconds_of_day(rc.expected_time_window_end) if windowed else 0.0)
+        self.has_window = _read_only(has_window, dtype=bool)
+        self.window_starts = _read_only(starts)
+        self.window_ends = _read_only(ends)
+
+        self.index = CheckpointGridIndex(self.latitudes.tolist(), self.longitudes.tolist(), self.radii.tolist())
+
+    @classmethod
+    def compile(cls, route_checkpoints, route_id=None, version=None):
+        """Build a plan from RouteCheckpoint objects (or PlannedRouteCheckpoint tuples) in sequence order."""
+        if isinstance(route_checkpoints, RoutePlan):
+            return route_checkpoints
+        return cls(route_id, version, [_snapshot(rc) for rc in route_checkpoints])
+
+    def __len__(self):
+        return len(self.route_checkpoints)
+
+    def __getitem__(self, position):
+        return self.route_checkpoints[position]
+
+    def __iter__(self):
+        return iter(self.route_checkpoints)
+
+    def __repr__(self):
+        return f'<RoutePlan route={self.route_id} v{self.version} ({len(self)} checkpoints)>'
+
+def _snapshot(rc):
+    if isinstance(rc, PlannedRouteCheckpoint):
+        return rc
+    cp = rc.checkpoint
+    return PlannedRouteCheckpoint(
+        id=rc.id,
+        route_id=rc.route_id,
+        checkpoint_id=rc.checkpoint_id,
+        sequence_order=rc.sequence_order,
+        expected_time_window_start=rc.expected_time_window_start,
+        expected_time_window_end=rc.expected_time_window_end,
+        checkpoint=PlannedCheckpoint(cp.id, cp.name, cp.latitude, cp.longitude, cp.radius)
+    )
+
+class RoutePlanCache:
+    """Thread-safe LRU of RoutePlan objects keyed by route id; entries carry the route's plan_version."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, route_id, version):
+        with self._lock:
+            plan = self._plans.get(route_id)
+            if plan is None or plan.version != version:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(route_id)
+            self.hits += 1
+            return plan
+
+    def put(self, plan):
+        with self._lock:
+            self._plans[plan.route_id] = plan
+            self._plans.move_to_end(plan.route_id)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def __len__(self):
+        return len(self._plans)
+
+def get_route_plan_cache(app=None):
+    app = app or current_app
+    return app.extensions['route_plan_cache']
+
+def load_route_plan(route_id):
+    """
+    Return the compiled plan for a route, or None if the route does not exist.
+
+    A cached plan is reused while Route.plan_version is unchanged, which
+    costs one primary-key lookup; otherwise the route's checkpoints are
+    loaded with a single joined query and compiled.
+    """
+    version = db.session.execute(select(Route.plan_version).where(Route.id == route_id)).scalar_one_or_none()
+    if version is None:
+        return None
+
+    cache = get_route_plan_cache()
+    plan = cache.get(route_id, version)
+    if plan is not None:
+        return plan
+
+    route_checkpoints = db.session.execute(
+        select(RouteCheckpoint)
+        .options(joinedload(RouteCheckpoint.checkpoint))
+        .where(RouteCheckpoint.route_id == route_id)
+        .order_by(RouteCheckpoint.sequence_order)
+    ).scalars().all()
+    plan = RoutePlan.compile(route_checkpoints, route_id=route_id, version=version)
+    cache.put(plan)
+    return plan
+
+# --- Invalidation ---
+
+def _bump_plan_versions(session, route_ids=None):
+    """Increment plan_version for the given routes (all routes when route_ids is None)."""
+    stmt = update(Route.__table__).values(plan_version=Route.__table__.c.plan_version + 1)
+    if route_ids is not None:
+        route_ids = {route_id for route_id in route_ids if route_id is not None}
+        if not route_ids:
+            return
+        stmt = stmt.where(Route.__table__.c.id.in_(route_ids))
+    session.execute(stmt)
+    # Keep loaded Route objects from holding on to the old number
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Route) and (route_ids is None or obj.id in route_ids):
+            session.expire(obj, ['plan_version'])
+
+def _affected_route_ids(session):
+    route_ids = set()
+    checkpoint_ids = set()
+    with session.no_autoflush:
+        for obj in list(session.dirty) + list(session.deleted) + list(session.new):
+            if isinstance(obj, Route):
+                if obj in session.dirty and session.is_modified(obj, include_collections=False):
+                    route_ids.add(obj.id)
+            elif isinstance(obj, RouteCheckpoint):
+                # New rows attached through the relationship have no route_id until the flush
+                route_ids.add(obj.route_id if obj.route_id is not None else getattr(obj.route, 'id', None))
+                route_ids.update(inspect(obj).attrs.route_id.history.deleted or ())
+            elif isinstance(obj, Checkpoint) and obj not in session.new:
+                if obj in session.deleted or session.is_modified(obj, include_collections=False):
+                    checkpoint_ids.add(obj.id)
+        if checkpoint_ids:
+            route_ids.update(session.execute(
+                select(RouteCheckpoint.route_id).where(RouteCheckpoint.checkpoint_id.in_(checkpoint_ids))
+            ).scalars())
+    route_ids.discard(None)
+    return route_ids
+
+def _before_flush(session, flush_context, instances):
+    route_ids = _affected_route_ids(session)
+    if route_ids:
+        _bump_plan_versions(session, route_ids)
+
+# Tables whose rows make up a compiled plan
+_PLAN_TABLES = (Route.__table__, RouteCheckpoint.__table__, Checkpoint.__table__)
+
+def _do_orm_execute(orm_execute_state):
+    # Query.update()/delete() skip the flush; the rows they touch are not
+    # known here, so every plan is invalidated (these are rare admin edits).
+    # Bulk statements on any other table leave the cache alone.
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if not orm_execute_state.is_orm_statement:
+        return
+    if orm_execute_state.statement.table in _PLAN_TABLES:
+        _bump_plan_versions(orm_execute_state.session)
+
+def init_app(app):
+    app.extensions['route_plan_cache'] = RoutePlanCache(
+        app.config.get('ROUTE_PLAN_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+    )
+    # Only the app's sessions (db.session), not every SQLAlchemy Session in the process
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'do_orm_execute', _do_orm_execute)
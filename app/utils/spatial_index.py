@@ -0,0 +1,84 @@
+import math
+import numpy as np
+
+# Meters spanned by one degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE = 6371000 * math.pi / 180
+
+# Cells are padded slightly so rounding in the haversine bound never drops a candidate
+CELL_MARGIN = 1.05
+MIN_CELL_METERS = 1.0
+
+class CheckpointGridIndex:
+    """
+    Uniform lat/lon grid over a route's checkpoints.
+
+    Cells are sized from the largest checkpoint radius, so any location that
+    can be within range of a checkpoint lies in the checkpoint's own cell or
+    one of its eight neighbours. Each cell maps to the checkpoint columns
+    (indexes into the route's sequence-ordered checkpoint list) registered in
+    it or its neighbours, kept in ascending order so callers preserve the
+    first-match-in-sequence semantics of the full scan.
+
+    Routes close to a pole or to the antimeridian fall back to returning every
+    checkpoint, since the grid does not wrap.
+    """
+
+    def __init__(self, latitudes, longitudes, radii):
+        self.size = len(latitudes)
+        self.all_columns = np.arange(self.size)
+        self.exhaustive = False
+        self._cells = {}
+
+        if self.size == 0:
+            return
+
+        reach_meters = max(max(radii), MIN_CELL_METERS) * CELL_MARGIN
+        self.cell_lat = reach_meters / METERS_PER_DEGREE
+        max_abs_lat = max(abs(lat) for lat in latitudes) + self.cell_lat
+        if max_abs_lat >= 89.0:
+            self.exhaustive = True
+            return
+        self.cell_lon = self.cell_lat / math.cos(math.radians(max_abs_lat))
+        if any(abs(lon) + self.cell_lon >= 180.0 for lon in longitudes):
+            self.exhaustive = True
+            return
+
+        cells = {}
+        for column, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            row, col = self.cell_of(lat, lon)
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    cells.setdefault((row + d_row, col + d_col), []).append(column)
+        self._cells = {cell: np.array(sorted(columns)) for cell, columns in cells.items()}
+
+    @classmethod
+    def from_route_checkpoints(cls, route_checkpoints):
+        """Build an index over RouteCheckpoint objects ordered by sequence_order."""
+        checkpoints = [rc.checkpoint for rc in route_checkpoints]
+        return cls(
+            [cp.latitude for cp in checkpoints],
+            [cp.longitude for cp in checkpoints],
+            [cp.radius for cp in checkpoints]
+        )
+
+    def cell_of(self, latitude, longitude):
+        """Return the (row, col) grid cell containing a coordinate."""
+        return math.floor(latitude / self.cell_lat), math.floor(longitude / self.cell_lon)
+
+    def cells_of(self, latitudes, longitudes):
+        """Vectorized cell_of: return (rows, cols) integer arrays."""
+        rows = np.floor(np.asarray(latitudes) / self.cell_lat).astype(np.int64)
+        cols = np.floor(np.asarray(longitudes) / self.cell_lon).astype(np.int64)
+        return rows, cols
+
+    def candidates_for_cell(self, cell):
+        """Checkpoint columns that may be within range of a location in ``cell``."""
+        if self.exhaustive:
+            return self.all_columns
+        return self._cells.get(cell, self.all_columns[:0])
+
+    def candidates(self, latitude, longitude):
+        """Checkpoint columns that may be within range of a single location."""
+        if self.exhaustive:
+            return self.all_columns
+        return self.candidates_for_cell(self.cell_of(latitude, longitude))
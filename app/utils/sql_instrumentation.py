@@ -0,0 +1,137 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_MAX_QUERIES = 50
+DEFAULT_MAX_DB_MS = 500
+DEFAULT_REPEAT_THRESHOLD = 10
+
+# Stack of QueryStats collecting the statements run in the current context
+_active_stats = ContextVar('sql_instrumentation_stats', default=())
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)')
+
+def statement_shape(statement):
+    """Statement text with whitespace collapsed and IN (?, ?, ...) lists folded, for grouping repeats."""
+    return _PLACEHOLDER_LIST.sub('(...)', _WHITESPACE.sub(' ', statement).strip())
+
+class QueryStats:
+    """Queries run during one request (or ``track_queries`` block): count, DB time and statement shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    @property
+    def total_ms(self):
+        return self.total_seconds * 1000
+
+    def repeated(self, threshold=2):
+        """(shape, count) for statements run at least ``threshold`` times, most frequent first; the N+1 signature."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def summary(self, repeat_threshold=DEFAULT_REPEAT_THRESHOLD, limit=3):
+        text = f'{self.count} queries in {self.total_ms:.1f} ms'
+        repeats = self.repeated(repeat_threshold)[:limit]
+        if repeats:
+            text += '; repeated: ' + '; '.join(f'{count}x {shape[:200]}' for shape, count in repeats)
+        return text
+
+    def __repr__(self):
+        return f'<QueryStats {self.count} queries {self.total_ms:.1f} ms>'
+
+# --- Engine hooks ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_stats.get():
+        conn.info.setdefault('sql_instrumentation_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active_stats.get()
+    started = conn.info.get('sql_instrumentation_started')
+    if not active or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    for stats in active:
+        stats.record(statement, elapsed)
+
+def install():
+    """Attach the cursor hooks to every engine (idempotent). Statements are only recorded inside track_queries()."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+@contextmanager
+def track_queries():
+    """Record the statements run inside the block; yields the QueryStats. Blocks may nest."""
+    install()
+    stats = QueryStats()
+    token = _active_stats.set(_active_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@contextmanager
+def query_budget(max_queries):
+    """
+    Fail when the block runs more than ``max_queries`` statements.
+
+    Meant for tests, e.g. ``with query_budget(8): client.get('/portal/shifts')``;
+    the error lists the most repeated statements so an N+1 is easy to spot.
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise QueryBudgetExceeded(f'Query budget of {max_queries} exceeded: {stats.summary(repeat_threshold=2, limit=5)}')
+
+# --- Per-request reporting ---
+
+def _start_request():
+    g.sql_stats_context = track_queries()
+    g.sql_stats = g.sql_stats_context.__enter__()
+
+def _finish_request(response):
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    config = current_app.config
+    repeat_threshold = config.get('SQL_INSTRUMENTATION_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+    over_budget = (
+        stats.count > config.get('SQL_INSTRUMENTATION_MAX_QUERIES', DEFAULT_MAX_QUERIES)
+        or stats.total_ms > config.get('SQL_INSTRUMENTATION_MAX_DB_MS', DEFAULT_MAX_DB_MS)
+        or stats.repeated(repeat_threshold)
+    )
+    if over_budget:
+        current_app.logger.warning(f'SQL: {request.method} {request.path}: {stats.summary(repeat_threshold)}')
+    response.headers.add('Server-Timing', f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries"')
+    return response
+
+def _stop_request(exc):
+    context = g.pop('sql_stats_context', None)
+    if context is not None:
+        context.__exit__(None, None, None)
+
+def init_app(app):
+    """Opt in with SQL_INSTRUMENTATION = True: per-request query counts, DB time and N+1 warnings."""
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+    install()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_stop_request)
@@ -0,0 +1,138 @@
+import math
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import case, delete, func, insert, select
+from app import db
+from app.models import ReportProcessingMetric
+
+# Pipeline stages in the order they run
+STAGES = ('save', 'parse', 'device_check', 'persist', 'verify', 'commit')
+
+StagePercentiles = namedtuple('StagePercentiles', 'stage count p50 p95 p99 mean_cpu_ms rows_per_second')
+
+_metrics = ReportProcessingMetric.__table__
+
+class StageSample:
+    """Timing of one stage; ``rows`` and ``bytes`` may be filled in inside the ``with`` block."""
+
+    def __init__(self, stage, rows=None, bytes=None):
+        self.stage = stage
+        self.rows = rows
+        self.bytes = bytes
+        self.wall_ms = None
+        self.cpu_ms = None
+
+class StageTimer:
+    """
+    Collects wall and CPU time per pipeline stage of one report.
+
+    ``with timer.stage('parse') as sample: ...`` times the block (also when
+    it raises) and ``record(report_id)`` writes the samples to
+    report_processing_metric in the current transaction. CPU time is the
+    calling thread's, so concurrent requests do not inflate it.
+    """
+
+    def __init__(self):
+        self.samples = []
+
+    @contextmanager
+    def stage(self, name, rows=None, bytes=None):
+        sample = StageSample(name, rows=rows, bytes=bytes)
+        wall_started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            yield sample
+        finally:
+            sample.wall_ms = (time.perf_counter() - wall_started) * 1000
+            sample.cpu_ms = (time.thread_time() - cpu_started) * 1000
+            self.samples.append(sample)
+
+    def record(self, report_id):
+        """Add the collected samples to the session, replacing earlier ones for the same stages (reprocessing)."""
+        if not self.samples or report_id is None:
+            return
+        now = datetime.now(timezone.utc)
+        stages = {sample.stage for sample in self.samples}
+        db.session.execute(delete(_metrics).where(_metrics.c.report_id == report_id, _metrics.c.stage.in_(stages)))
+        db.session.execute(insert(_metrics), [
+            {'report_id': report_id, 'stage': sample.stage, 'wall_ms': sample.wall_ms, 'cpu_ms': sample.cpu_ms,
+             'rows': sample.rows, 'bytes': sample.bytes, 'recorded_at': now}
+            for sample in self.samples
+        ])
+        self.samples = []
+
+    def record_safely(self, report_id, commit=False):
+        """record() that logs instead of raising, so timing never fails a report."""
+        try:
+            self.record(report_id)
+            if commit:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Could not record processing metrics for report {report_id}: {e}")
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+def report_stage_metrics(report_id):
+    """A report's stage timings in pipeline order."""
+    metrics = ReportProcessingMetric.query.filter_by(report_id=report_id).all()
+    return sorted(metrics, key=lambda metric: _stage_order(metric.stage))
+
+def _percentile(ordered, fraction):
+    # Nearest-rank percentile of an ascending list
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+def stage_percentiles(days=30):
+    """
+    p50/p95/p99 wall time per stage over the last ``days`` days, with mean
+    CPU time and throughput (rows per second of wall time, where rows are known).
+
+    Counts, means and throughput are aggregated in the database. PostgreSQL
+    also computes the percentiles (percentile_cont ... WITHIN GROUP);
+    elsewhere only the wall times are read, stage by stage in order, and
+    ranked in Python.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    recent = _metrics.c.recorded_at >= since
+    counted = _metrics.c.rows > 0
+    fractions = (0.50, 0.95, 0.99)
+    summary = select(
+        _metrics.c.stage,
+        func.count().label('count'),
+        func.avg(_metrics.c.cpu_ms).label('mean_cpu_ms'),
+        func.sum(case((counted, _metrics.c.rows))).label('counted_rows'),
+        func.sum(case((counted, _metrics.c.wall_ms))).label('counted_wall_ms')
+    ).where(recent).group_by(_metrics.c.stage)
+
+    in_database = db.engine.dialect.name == 'postgresql'
+    if in_database:
+        summary = summary.add_columns(*(
+            func.percentile_cont(fraction).within_group(_metrics.c.wall_ms).label(f'p{round(fraction * 100)}')
+            for fraction in fractions
+        ))
+    stages = {row.stage: row for row in db.session.execute(summary)}
+
+    if in_database:
+        percentiles = {stage: (row.p50, row.p95, row.p99) for stage, row in stages.items()}
+    else:
+        walls = db.session.execute(
+            select(_metrics.c.stage, _metrics.c.wall_ms).where(recent).order_by(_metrics.c.stage, _metrics.c.wall_ms)
+        ).all()
+        by_stage = {}
+        for stage, wall_ms in walls:
+            by_stage.setdefault(stage, []).append(wall_ms)
+        percentiles = {stage: tuple(_percentile(ordered, fraction) for fraction in fractions) for stage, ordered in by_stage.items()}
+
+    results = []
+    for stage in sorted(stages, key=_stage_order):
+        row = stages[stage]
+        counted_seconds = (row.counted_wall_ms or 0) / 1000
+        results.append(StagePercentiles(
+            stage, row.count, *percentiles[stage],
+            float(row.mean_cpu_ms) if row.mean_cpu_ms is not None else None,
+            row.counted_rows / counted_seconds if counted_seconds else None
+        ))
+    return results
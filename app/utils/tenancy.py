@@ -0,0 +1,57 @@
+from sqlalchemy import event, select, update, inspect
+from app.models import Device, Shift, UploadedPatrolReport
+
+# Shift.client_id and UploadedPatrolReport.client_id copy the owning
+# device's client so tenant-scoped listings filter on their own indexed
+# column instead of joining through device. These hooks keep the copies
+# right on every ORM write.
+
+def _device_client_id(connection, device_id):
+    return connection.execute(select(Device.client_id).where(Device.id == device_id)).scalar()
+
+def _shift_client_id(connection, shift_id):
+    return connection.execute(
+        select(Device.client_id).join(Shift, Shift.device_id == Device.id).where(Shift.id == shift_id)
+    ).scalar()
+
+def _changed(target, attribute):
+    return inspect(target).attrs[attribute].history.has_changes()
+
+def _set_shift_client(mapper, connection, target):
+    if target.client_id is None or _changed(target, 'device_id'):
+        target.client_id = _device_client_id(connection, target.device_id)
+
+def _shift_moved(mapper, connection, target):
+    _set_shift_client(mapper, connection, target)
+    if _changed(target, 'client_id'):
+        connection.execute(
+            update(UploadedPatrolReport.__table__)
+            .where(UploadedPatrolReport.__table__.c.shift_id == target.id)
+            .values(client_id=target.client_id)
+        )
+
+def _set_report_client(mapper, connection, target):
+    if target.client_id is None or _changed(target, 'shift_id'):
+        target.client_id = _shift_client_id(connection, target.shift_id)
+
+def _device_moved(mapper, connection, target):
+    # Runs before the device row is updated, so the other listeners already see consistent shifts and reports
+    if not _changed(target, 'client_id'):
+        return
+    shifts = Shift.__table__
+    reports = UploadedPatrolReport.__table__
+    connection.execute(update(shifts).where(shifts.c.device_id == target.id).values(client_id=target.client_id))
+    connection.execute(
+        update(reports)
+        .where(reports.c.shift_id.in_(select(shifts.c.id).where(shifts.c.device_id == target.id)))
+        .values(client_id=target.client_id)
+    )
+
+def init_app(app):
+    if event.contains(Shift, 'before_insert', _set_shift_client):
+        return
+    event.listen(Shift, 'before_insert', _set_shift_client)
+    event.listen(Shift, 'before_update', _shift_moved)
+    event.listen(UploadedPatrolReport, 'before_insert', _set_report_client)
+    event.listen(UploadedPatrolReport, 'before_update', _set_report_client)
+    event.listen(Device, 'before_update', _device_moved)
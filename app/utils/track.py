@@ -0,0 +1,185 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+import sys
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
+NO_VALUE_CODE = 0  # Code for a missing event type/details/device value
+
+def to_epoch_seconds(timestamp):
+    """Seconds since the Unix epoch for a report timestamp (naive values are taken as UTC, like the DB columns)."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH).total_seconds()
+
+def from_epoch_seconds(seconds):
+    """Naive UTC datetime for an epoch value, exact to the microsecond."""
+    return EPOCH + timedelta(microseconds=round(float(seconds) * 1e6))
+
+class StringTable:
+    """Interns repeated strings (event types, details, device ids) as small integer codes; code 0 is None."""
+
+    def __init__(self):
+        self.values = [None]
+        self._codes = {}
+
+    def code_for(self, value):
+        if value is None:
+            return NO_VALUE_CODE
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(sys.intern(value))
+            self._codes[value] = code
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+class TrackBuilder:
+    """
+    Accumulates parsed rows into compact typed arrays.
+
+    array('d') / array('i') buffers grow without per-point Python objects;
+    build() wraps them as NumPy arrays without copying.
+    """
+
+    def __init__(self):
+        self.epochs = array('d')
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.event_type_codes = array('i')
+        self.event_detail_codes = array('i')
+        self.event_types = StringTable()
+        self.event_details = StringTable()
+        self.devices = StringTable()
+        # Files almost always hold one device id, so per-row device codes are
+        # only kept once a second one appears
+        self.device_codes = None
+        self._device_code = None
+
+    def append(self, device_id, epoch_seconds, latitude, longitude, event_type=None, event_details=None):
+        device_code = self.devices.code_for(device_id)
+        if self.device_codes is None and device_code != self._device_code:
+            if self._device_code is None:
+                self._device_code = device_code
+            else:
+                self.device_codes = array('i', [self._device_code]) * len(self.epochs)
+        if self.device_codes is not None:
+            self.device_codes.append(device_code)
+        self.epochs.append(epoch_seconds)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        self.event_type_codes.append(self.event_types.code_for(event_type))
+        self.event_detail_codes.append(self.event_details.code_for(event_details))
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def build(self):
+        return Track(
+            epochs=np.frombuffer(self.epochs, dtype=np.float64),
+            latitudes=np.frombuffer(self.latitudes, dtype=np.float64),
+            longitudes=np.frombuffer(self.longitudes, dtype=np.float64),
+            event_type_codes=np.frombuffer(self.event_type_codes, dtype=np.intc),
+            event_types=self.event_types.values,
+            event_detail_codes=np.frombuffer(self.event_detail_codes, dtype=np.intc),
+            event_details=self.event_details.values,
+            device_codes=np.frombuffer(self.device_codes, dtype=np.intc) if self.device_codes is not None else None,
+            devices=self.devices.values
+        )
+
+class Track:
+    """
+    Columnar patrol track: parallel arrays of epoch seconds, latitude and
+    longitude plus interned event type/details and device id codes
+    (``device_codes`` is None when every row has the same device id).
+
+    Slicing returns a Track over views of the same arrays (no copy).
+    Integer indexing returns the row as a location dict with the keys the
+    rest of the pipeline has always used, so per-point code keeps working.
+    """
+
+    __slots__ = ('epochs', 'latitudes', 'longitudes', 'event_type_codes', 'event_types',
+                 'event_detail_codes', 'event_details', 'device_codes', 'devices')
+
+    def __init__(self, epochs, latitudes, longitudes, event_type_codes=None, event_types=None,
+                 event_detail_codes=None, event_details=None, device_codes=None, devices=None):
+        count = len(epochs)
+        self.epochs = epochs
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.event_type_codes = event_type_codes if event_type_codes is not None else np.zeros(count, dtype=np.intc)
+        self.event_types = event_types or [None]
+        self.event_detail_codes = event_detail_codes if event_detail_codes is not None else np.zeros(count, dtype=np.intc)
+        self.event_details = event_details or [None]
+        self.device_codes = device_codes
+        self.devices = devices or [None]
+
+    @classmethod
+    def from_locations(cls, locations):
+        """Build a Track from a list of location dicts ('timestamp', 'latitude', 'longitude', optional event fields)."""
+        builder = TrackBuilder()
+        for location in locations:
+            builder.append(
+                location.get('original_device_id'),
+                to_epoch_seconds(location['timestamp']),
+                float(location['latitude']),
+                float(location['longitude']),
+                location.get('event_type'),
+                location.get('event_details')
+            )
+        return builder.build()
+
+    @property
+    def device_ids(self):
+        """Distinct device identifiers in first-seen order."""
+        return self.devices[1:]
+
+    @property
+    def device_id(self):
+        """Primary device identifier: the first one encountered in the file."""
+        return self.devices[1] if len(self.devices) > 1 else None
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return Track(
+                self.epochs[key], self.latitudes[key], self.longitudes[key],
+                self.event_type_codes[key], self.event_types,
+                self.event_detail_codes[key], self.event_details,
+                self.device_codes[key] if self.device_codes is not None else None, self.devices
+            )
+        return {
+            'timestamp': self.timestamp(key),
+            'latitude': float(self.latitudes[key]),
+            'longitude': float(self.longitudes[key]),
+            'event_type': self.event_types[self.event_type_codes[key]],
+            'event_details': self.event_details[self.event_detail_codes[key]],
+            'original_device_id': self.devices[self.device_codes[key]] if self.device_codes is not None else self.device_id
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def timestamp(self, i):
+        return from_epoch_seconds(self.epochs[i])
+
+    def seconds_of_day(self):
+        """Time of day (UTC) of every point, in seconds, for time-window checks."""
+        return np.mod(self.epochs, SECONDS_PER_DAY)
+
+    @property
+    def nbytes(self):
+        """Memory held by the point arrays (excluding the shared string tables)."""
+        return (self.epochs.nbytes + self.latitudes.nbytes + self.longitudes.nbytes
+                + self.event_type_codes.nbytes + self.event_detail_codes.nbytes
+                + (self.device_codes.nbytes if self.device_codes is not None else 0))
+
+    def __repr__(self):
+        return f'<Track {len(self)} points device={self.device_id}>'
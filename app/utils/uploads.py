@@ -0,0 +1,159 @@
+import codecs
+import hashlib
+import io
+import os
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+DEFAULT_CHUNK_SIZE = 64 * 1024  # Bytes per read/write when copying an upload
+HEAD_SIZE = 8 * 1024  # Leading bytes kept for sniffing the content type
+INCOMING_DIRECTORY = '.incoming'  # Under UPLOAD_FOLDER; same filesystem, so claiming a spool is a rename
+BLOB_DIRECTORY = 'blobs'  # Under UPLOAD_FOLDER; content-addressed store, one file per SHA-256
+
+class UploadDigest:
+    """SHA-256, size and line count of an upload, fed chunk by chunk as the bytes go by."""
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.newlines = 0
+        self.head = b''
+        self._last_byte = b''
+
+    def update(self, chunk):
+        if not chunk:
+            return
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        self.newlines += chunk.count(b'\n')
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[:HEAD_SIZE - len(self.head)]
+        self._last_byte = chunk[-1:]
+
+    @property
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    @property
+    def line_count(self):
+        # A final line without a trailing newline still counts
+        return self.newlines + (1 if self._last_byte not in (b'', b'\n') else 0)
+
+    @property
+    def row_count(self):
+        """Lines after the header. Counted on raw bytes, so blank lines and quoted newlines are included."""
+        return max(self.line_count - 1, 0)
+
+    def looks_like_text(self):
+        """False when the leading bytes are not UTF-8 text (NUL bytes or invalid sequences), i.e. a binary file."""
+        if b'\x00' in self.head:
+            return False
+        try:
+            # final=False: the head may end part-way through a multi-byte character
+            codecs.getincrementaldecoder('utf-8')().decode(self.head, final=False)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+class UploadSpool(io.BufferedRandom):
+    """
+    Disk file Werkzeug streams a multipart file part into.
+
+    The part is written in the chunks Werkzeug reads from the request body
+    and digested as it arrives, so the view gets the hash, size and line
+    count without reading the file again. ``claim()`` moves the file to its
+    final path; an unclaimed spool deletes itself when closed.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        fd, path = tempfile.mkstemp(prefix='upload-', suffix='.part', dir=directory)
+        super().__init__(io.FileIO(fd, 'w+b'))
+        self.path = path
+        self.max_bytes = max_bytes
+        self.digest = UploadDigest()
+        self._claimed = False
+
+    def write(self, data):
+        if self.max_bytes and self.digest.size + len(data) > self.max_bytes:
+            # Stop before anything else is written; the client sees a 413
+            self.close()
+            raise RequestEntityTooLarge(f'Uploaded file exceeds the {self.max_bytes // (1024 * 1024)} MB limit.')
+        self.digest.update(data)
+        return super().write(data)
+
+    def claim(self, destination):
+        """Move the spooled file to ``destination`` (a rename, not a copy) and close the spool."""
+        self.flush()
+        os.replace(self.path, destination)
+        self._claimed = True
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        if not self._claimed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+def _upload_directory(name):
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class SpoolingRequest(Request):
+    """Request whose uploaded files are streamed to UploadSpools under UPLOAD_FOLDER."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(_upload_directory(INCOMING_DIRECTORY), max_bytes=current_app.config.get('UPLOAD_MAX_FILE_SIZE'))
+
+def spool_stream(stream, max_bytes=None, chunk_size=None):
+    """
+    Copy a file-like object into a new UploadSpool in fixed-size chunks.
+
+    Used for uploads that were not spooled by the request (e.g. a
+    FileStorage built around an in-memory stream). Raises
+    RequestEntityTooLarge, leaving nothing behind, past ``max_bytes``.
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    spool = UploadSpool(_upload_directory(INCOMING_DIRECTORY), max_bytes=max_bytes)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+def blob_path(sha256):
+    """Path of the content-addressed copy of a file with this SHA-256 (uploads/blobs/<sha256>)."""
+    return os.path.join(_upload_directory(BLOB_DIRECTORY), sha256)
+
+def store_blob(spool):
+    """
+    Move a spool into the blob store under its SHA-256.
+
+    Identical content is stored once: if the blob already exists the spool
+    is discarded and the existing file is used.
+
+    Returns:
+        tuple: (blob path, True if the blob was created by this call)
+    """
+    path = blob_path(spool.digest.hexdigest)
+    if os.path.exists(path):
+        spool.close()
+        return path, False
+    spool.claim(path)
+    return path, True
+
+def init_app(app):
+    """Stream uploaded files straight to disk (UPLOAD_SPOOL_TO_DISK) instead of Werkzeug's memory/temp-file buffering."""
+    if not app.config.get('UPLOAD_SPOOL_TO_DISK', True):
+        return
+    app.request_class = SpoolingRequest
@@ -1,7 +1,26 @@
+import logging
+from collections import namedtuple
 from math import radians, sin, cos, sqrt, atan2
 from datetime import datetime, time
 from flask import current_app
 from app.exceptions import VerificationLogicError
+from app.utils.verification_vectorized import (
+    match_locations_vectorized, match_segments_vectorized, candidate_hits, DEFAULT_CHUNK_SIZE
+)
+from app.utils.route_matching import longest_ordered_chain, sequence_position_bounds
+from app.utils.track import Track, from_epoch_seconds
+from app.utils.logging_queue import RecordSummary
+
+# Engines selectable through the VERIFICATION_ENGINE config key
+VERIFICATION_ENGINE_SCALAR = 'scalar'
+VERIFICATION_ENGINE_VECTORIZED = 'vectorized'
+
+# Assignment strategies selectable through the VERIFICATION_MATCHING config key
+VERIFICATION_MATCHING_FIRST_HIT = 'first_hit'
+VERIFICATION_MATCHING_SEQUENCE = 'sequence'
+
+# Outcome of verify_patrol_report; out_of_order is only filled in 'sequence' matching mode
+VerificationResult = namedtuple('VerificationResult', 'visits missed out_of_order')
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
@@ -70,19 +89,70 @@ def verify_checkpoint_visit(location, checkpoint, time_window_start=None, time_w
         current_app.logger.error(f"Error verifying checkpoint visit: {str(e)}", exc_info=True)
         raise VerificationLogicError(f"Failed to verify checkpoint visit: {str(e)}")
 
-def verify_patrol_report(report_id, shift, locations):
+def _match_locations_scalar(locations, route_checkpoints, index=None):
+    """
+    Reference matcher: test every location against every unvisited checkpoint.
+
+    With a CheckpointGridIndex only the checkpoints registered in the
+    location's grid neighbourhood are tested.
+
+    Returns:
+        list: (location_index, route_checkpoint) tuples in visit order
+    """
+    matches = []
+    unvisited_ids = {rc.id for rc in route_checkpoints}
+
+    # Process each location point
+    for index_in_track, location in enumerate(locations):
+        if not unvisited_ids:
+            break
+        if index is not None:
+            columns = index.candidates(location['latitude'], location['longitude'])
+            candidates = [route_checkpoints[column] for column in columns]
+        else:
+            candidates = route_checkpoints
+
+        # Check against remaining unvisited checkpoints
+        for checkpoint in candidates:
+            if checkpoint.id not in unvisited_ids:
+                continue
+            try:
+                if verify_checkpoint_visit(
+                    location,
+                    checkpoint.checkpoint,
+                    checkpoint.expected_time_window_start,
+                    checkpoint.expected_time_window_end
+                ):
+                    matches.append((index_in_track, checkpoint))
+                    unvisited_ids.discard(checkpoint.id)
+                    break  # Move to next location after finding a match
+            except Exception as e:
+                current_app.logger.error(f"Error processing checkpoint {checkpoint.id}: {str(e)}", exc_info=True)
+                # Continue with next checkpoint instead of failing the whole verification
+
+    return matches
+
+def verify_patrol_report(report_id, shift, locations, location_ids=None):
     """
     Verify a patrol report against the planned route checkpoints.
     
     Args:
         report_id: ID of the UploadedPatrolReport
         shift: Shift object containing the route
-        locations: List of location dictionaries from the CSV
-    
+        locations: Track from the CSV parser (a list of location dictionaries is also accepted)
+        location_ids: Optional ReportedLocation IDs aligned with ``locations``,
+            used to link each verified visit to the fix that produced it
+
+    Matching follows VERIFICATION_MATCHING: 'first_hit' credits each fix to
+    the first unvisited checkpoint it satisfies; 'sequence' credits the
+    longest set of visits consistent with sequence_order.
+
     Returns:
-        tuple: (verified_visits, missed_checkpoints)
+        VerificationResult: (verified visits, missed route checkpoints, the
+        missed ones that were reached out of sequence)
     """
-    from app.models import VerifiedVisit, RouteCheckpoint, db
+    from app.models import VerifiedVisit
+    from app.utils.route_plan import load_route_plan
     
     try:
         # Validate inputs
@@ -90,53 +160,108 @@ def verify_patrol_report(report_id, shift, locations):
             raise VerificationLogicError("No shift provided for verification")
         if not locations:
             raise VerificationLogicError("No location data provided for verification")
+        if not isinstance(locations, Track):
+            locations = Track.from_locations(locations)
         
-        # Get all checkpoints for the route in sequence
-        route_checkpoints = RouteCheckpoint.query\
-            .filter_by(route_id=shift.route_id)\
-            .order_by(RouteCheckpoint.sequence_order)\
-            .all()
-        
+        # Compiled checkpoints for the route in sequence (cached per route version)
+        route_checkpoints = load_route_plan(shift.route_id)
+
         if not route_checkpoints:
             raise VerificationLogicError(f"No checkpoints found for route {shift.route_id}")
-        
+
+        index = None
+        if current_app.config.get('VERIFICATION_SPATIAL_INDEX', False):
+            index = route_checkpoints.index
+        chunk_size = current_app.config.get('VERIFICATION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        column_of = {rc.id: column for column, rc in enumerate(route_checkpoints)}
+
+        matching = current_app.config.get('VERIFICATION_MATCHING', VERIFICATION_MATCHING_FIRST_HIT)
+        hit_columns = None
+        if matching == VERIFICATION_MATCHING_SEQUENCE:
+            hit_locations, hit_columns = candidate_hits(locations, route_checkpoints, chunk_size=chunk_size, index=index)
+            matches = [(location_index, route_checkpoints[column])
+                       for location_index, column in longest_ordered_chain(hit_locations, hit_columns)]
+        elif matching != VERIFICATION_MATCHING_FIRST_HIT:
+            raise VerificationLogicError(f"Unknown verification matching mode '{matching}'")
+        else:
+            engine = current_app.config.get('VERIFICATION_ENGINE', VERIFICATION_ENGINE_SCALAR)
+            if engine == VERIFICATION_ENGINE_VECTORIZED:
+                matches = match_locations_vectorized(locations, route_checkpoints, chunk_size=chunk_size, index=index)
+            elif engine == VERIFICATION_ENGINE_SCALAR:
+                matches = _match_locations_scalar(locations, route_checkpoints, index=index)
+            else:
+                raise VerificationLogicError(f"Unknown verification engine '{engine}'")
+
+        # Visit values per match: (location_index, route_checkpoint, timestamp, latitude, longitude)
+        visits = [
+            (location_index, checkpoint, locations.timestamp(location_index),
+             float(locations.latitudes[location_index]), float(locations.longitudes[location_index]))
+            for location_index, checkpoint in matches
+        ]
+
+        # Checkpoints walked through between two sparse fixes
+        if current_app.config.get('VERIFICATION_SEGMENT_INTERPOLATION', False):
+            matched_positions = {column_of[checkpoint.id]: location_index for location_index, checkpoint in matches}
+            remaining = [column for column in range(len(route_checkpoints)) if column not in matched_positions]
+            segment_options = dict(
+                used_locations={location_index for location_index, _ in matches},
+                max_gap_seconds=current_app.config.get('VERIFICATION_SEGMENT_MAX_GAP_SECONDS', 120),
+                max_segment_meters=current_app.config.get('VERIFICATION_SEGMENT_MAX_METERS', 1000),
+                chunk_size=chunk_size
+            )
+            if matching == VERIFICATION_MATCHING_SEQUENCE:
+                # One checkpoint at a time, each confined to its slot between the matched visits
+                segment_matches = []
+                for column in remaining:
+                    found = match_segments_vectorized(
+                        locations, route_checkpoints, [column],
+                        position_bounds=sequence_position_bounds(column, matched_positions),
+                        **segment_options
+                    )
+                    if found:
+                        matched_positions[column] = found[0][-1]
+                        segment_matches.extend(found)
+            else:
+                segment_matches = match_segments_vectorized(locations, route_checkpoints, remaining, **segment_options)
+            visits.extend(
+                (location_index, checkpoint, from_epoch_seconds(epoch_seconds), latitude, longitude)
+                for location_index, checkpoint, epoch_seconds, latitude, longitude, _ in segment_matches
+            )
+
         verified_visits = []
-        missed_checkpoints = []
-        unvisited_checkpoints = route_checkpoints.copy()
-        
-        # Process each location point
-        for location in locations:
-            # Check against remaining unvisited checkpoints
-            for checkpoint in unvisited_checkpoints[:]:  # Copy to allow modification during iteration
-                try:
-                    if verify_checkpoint_visit(
-                        location,
-                        checkpoint.checkpoint,
-                        checkpoint.expected_time_window_start,
-                        checkpoint.expected_time_window_end
-                    ):
-                        # Create verified visit record
-                        visit = VerifiedVisit(
-                            report_id=report_id,
-                            route_checkpoint_id=checkpoint.id,
-                            visit_timestamp=location['timestamp'],
-                            visit_latitude=location['latitude'],
-                            visit_longitude=location['longitude']
-                        )
-                        verified_visits.append(visit)
-                        unvisited_checkpoints.remove(checkpoint)
-                        current_app.logger.info(f"Verified visit to checkpoint {checkpoint.checkpoint.name} at {location['timestamp']}")
-                        break  # Move to next location after finding a match
-                except Exception as e:
-                    current_app.logger.error(f"Error processing checkpoint {checkpoint.id}: {str(e)}", exc_info=True)
-                    # Continue with next checkpoint instead of failing the whole verification
-        
+        visited_ids = set()
+        visit_log = RecordSummary(current_app.logger, f"Verified visits in report {report_id}", level=logging.INFO)
+        for location_index, checkpoint, visit_timestamp, latitude, longitude in visits:
+            # Create verified visit record
+            visit = VerifiedVisit(
+                report_id=report_id,
+                route_checkpoint_id=checkpoint.id,
+                reported_location_id=location_ids[location_index] if location_ids is not None else None,
+                visit_timestamp=visit_timestamp,
+                visit_latitude=latitude,
+                visit_longitude=longitude
+            )
+            verified_visits.append(visit)
+            visited_ids.add(checkpoint.id)
+            visit_log.add(f"{checkpoint.checkpoint.name} at {visit_timestamp}")
+        visit_log.emit()
+
         # Any remaining unvisited checkpoints are missed
-        missed_checkpoints = unvisited_checkpoints
+        missed_checkpoints = [rc for rc in route_checkpoints if rc.id not in visited_ids]
         if missed_checkpoints:
             current_app.logger.warning(f"Missed {len(missed_checkpoints)} checkpoints in report {report_id}")
-        
-        return verified_visits, missed_checkpoints
+
+        # In sequence mode, missed checkpoints that were reached at the wrong point in the route
+        out_of_order_checkpoints = []
+        if hit_columns is not None:
+            reached = set(hit_columns.tolist())
+            out_of_order_checkpoints = [rc for rc in missed_checkpoints if column_of[rc.id] in reached]
+            if out_of_order_checkpoints:
+                current_app.logger.warning(
+                    f"{len(out_of_order_checkpoints)} checkpoints visited out of sequence in report {report_id}"
+                )
+
+        return VerificationResult(verified_visits, missed_checkpoints, out_of_order_checkpoints)
         
     except Exception as e:
         if isinstance(e, VerificationLogicError):
@@ -0,0 +1,299 @@
+import numpy as np
+from app.exceptions import VerificationLogicError
+from app.utils.track import Track
+from app.utils.route_plan import RoutePlan
+
+EARTH_RADIUS_METERS = 6371000
+
+DEFAULT_CHUNK_SIZE = 4096
+
+def haversine_matrix(lats, lons, cp_lats, cp_lons):
+    """
+    Great circle distance in meters between every point and every checkpoint.
+
+    Args:
+        lats, lons: 1-D arrays of point coordinates in decimal degrees
+        cp_lats, cp_lons: 1-D arrays of checkpoint coordinates in decimal degrees
+
+    Returns:
+        ndarray of shape (len(lats), len(cp_lats))
+    """
+    lat1 = np.radians(lats)[:, np.newaxis]
+    lon1 = np.radians(lons)[:, np.newaxis]
+    lat2 = np.radians(cp_lats)[np.newaxis, :]
+    lon2 = np.radians(cp_lons)[np.newaxis, :]
+
+    # Same haversine formulation as verification.calculate_distance
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_METERS * c
+
+def _within_matrix(lats, lons, seconds, cp_lats, cp_lons, cp_radii, has_window, window_starts, window_ends):
+    """Boolean matrix of points that satisfy each checkpoint's radius and time window."""
+    within = haversine_matrix(lats, lons, cp_lats, cp_lons) <= cp_radii
+    if seconds is not None:
+        seconds = seconds[:, np.newaxis]
+        in_window = (window_starts <= seconds) & (seconds <= window_ends)
+        within &= in_window | ~has_window
+    return within
+
+def _load_arrays(locations, route_checkpoints):
+    try:
+        track = locations if isinstance(locations, Track) else Track.from_locations(locations)
+        plan = RoutePlan.compile(route_checkpoints)
+        point_seconds = track.seconds_of_day() if plan.has_window.any() else None
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise VerificationLogicError(f"Failed to load locations for verification: {str(e)}")
+    window = (plan.has_window, plan.window_starts, plan.window_ends)
+    return track, plan.latitudes, plan.longitudes, plan.radii, window, point_seconds
+
+def _iter_within_blocks(locations, route_checkpoints, chunk_size, index, active):
+    """
+    Yield (start, within) for consecutive chunks of locations, where within[i, j]
+    tells whether location start + i satisfies route checkpoint j. Only
+    columns set in the ``active`` mask are computed; the caller may clear
+    entries between chunks.
+    """
+    track, cp_lats, cp_lons, cp_radii, window, point_seconds = _load_arrays(locations, route_checkpoints)
+    has_window, window_starts, window_ends = window
+    lats = track.latitudes
+    lons = track.longitudes
+    count = len(track)
+
+    for start in range(0, count, chunk_size):
+        if not active.any():
+            break
+        stop = min(start + chunk_size, count)
+        seconds = point_seconds[start:stop] if point_seconds is not None else None
+
+        if index is None or index.exhaustive:
+            within = _within_matrix(
+                lats[start:stop], lons[start:stop], seconds, cp_lats, cp_lons, cp_radii, *window
+            )
+        else:
+            within = np.zeros((stop - start, len(route_checkpoints)), dtype=bool)
+            cell_rows, cell_cols = index.cells_of(lats[start:stop], lons[start:stop])
+            cells, inverse = np.unique(np.stack([cell_rows, cell_cols], axis=1), axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            # Group chunk rows by cell with one sort instead of a mask per cell
+            rows_by_cell = np.split(np.argsort(inverse, kind='stable'), np.cumsum(np.bincount(inverse))[:-1])
+            for (cell_row, cell_col), rows in zip(cells, rows_by_cell):
+                columns = index.candidates_for_cell((int(cell_row), int(cell_col)))
+                columns = columns[active[columns]]
+                if columns.size == 0:
+                    continue
+                block = _within_matrix(
+                    lats[start + rows], lons[start + rows],
+                    seconds[rows] if seconds is not None else None,
+                    cp_lats[columns], cp_lons[columns], cp_radii[columns],
+                    has_window[columns], window_starts[columns], window_ends[columns]
+                )
+                within[rows[:, np.newaxis], columns] = block
+
+        within &= active
+        yield start, within
+
+def match_locations_vectorized(locations, route_checkpoints, chunk_size=DEFAULT_CHUNK_SIZE, index=None):
+    """
+    Match reported locations to route checkpoints using NumPy.
+
+    Produces the same assignment as the scalar loop in verify_patrol_report:
+    locations are consumed in order, each location verifies at most one
+    checkpoint (the first unvisited one in sequence order whose radius and
+    time window it satisfies) and each checkpoint is verified at most once.
+
+    Args:
+        locations: Track (or list of location dictionaries) from the CSV
+        route_checkpoints: RouteCheckpoint objects ordered by sequence_order
+        chunk_size: Number of locations per distance-matrix block
+        index: Optional CheckpointGridIndex; when given, distances are only
+            computed between points and the checkpoints in neighbouring cells
+
+    Returns:
+        list: (location_index, route_checkpoint) tuples in visit order
+    """
+    unvisited = np.ones(len(route_checkpoints), dtype=bool)
+    matches = []
+
+    for start, within in _iter_within_blocks(locations, route_checkpoints, chunk_size, index, unvisited):
+        # Greedy assignment only needs to walk rows that hit at least one checkpoint
+        for row in np.flatnonzero(within.any(axis=1)):
+            hits = np.flatnonzero(within[row] & unvisited)
+            if hits.size == 0:
+                continue
+            column = hits[0]
+            unvisited[column] = False
+            matches.append((start + int(row), route_checkpoints[column]))
+
+    return matches
+
+def candidate_hits(locations, route_checkpoints, chunk_size=DEFAULT_CHUNK_SIZE, index=None):
+    """
+    Every (location, checkpoint) pair where the location satisfies the
+    checkpoint's radius and time window.
+
+    Returns:
+        tuple: (location_indexes, columns) integer arrays sorted by location,
+        then by column (index into route_checkpoints)
+    """
+    active = np.ones(len(route_checkpoints), dtype=bool)
+    point_parts, column_parts = [], []
+    for start, within in _iter_within_blocks(locations, route_checkpoints, chunk_size, index, active):
+        rows, columns = np.nonzero(within)  # Row-major, so already sorted
+        point_parts.append(rows + start)
+        column_parts.append(columns)
+    if not point_parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(point_parts).astype(np.int64), np.concatenate(column_parts).astype(np.int64)
+
+def _wrap_longitude(delta):
+    """Normalise longitude differences to [-180, 180) so segments may cross the antimeridian."""
+    return (delta + 180.0) % 360.0 - 180.0
+
+def _segment_closest_approach(ax, ay, bx, by):
+    """
+    Closest approach of segments A->B to the origin, in projected meters.
+
+    Returns (distance, fraction) where fraction in [0, 1] locates the closest
+    point along each segment.
+    """
+    dx = bx - ax
+    dy = by - ay
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(length_sq > 0, -(ax * dx + ay * dy) / length_sq, 0.0)
+    fraction = np.clip(fraction, 0.0, 1.0)
+    closest_x = ax + fraction * dx
+    closest_y = ay + fraction * dy
+    return np.hypot(closest_x, closest_y), fraction
+
+def _segment_candidates(plan, track, segments):
+    """
+    Pre-filter segments per checkpoint with the plan's CheckpointGridIndex.
+
+    A segment can only pass within range of a checkpoint when its bounding
+    box, widened by one grid cell, contains the checkpoint's cell. Segments
+    are sorted by the first row of their widened box, so each checkpoint
+    only inspects the band of rows that can reach it instead of the whole
+    track. Returns a function mapping a column to its candidate segment
+    indexes in track order (every segment when the grid is exhaustive).
+    """
+    index = plan.index
+    if index.exhaustive:
+        return lambda column: segments
+    rows_a, cols_a = index.cells_of(track.latitudes[segments], track.longitudes[segments])
+    rows_b, cols_b = index.cells_of(track.latitudes[segments + 1], track.longitudes[segments + 1])
+    row_lo, row_hi = np.minimum(rows_a, rows_b) - 1, np.maximum(rows_a, rows_b) + 1
+    col_lo, col_hi = np.minimum(cols_a, cols_b) - 1, np.maximum(cols_a, cols_b) + 1
+    order = np.argsort(row_lo, kind='stable')
+    sorted_row_lo = row_lo[order]
+    tallest = int((row_hi - row_lo).max())
+
+    def candidates(column):
+        row, col = index.cell_of(float(plan.latitudes[column]), float(plan.longitudes[column]))
+        band = order[np.searchsorted(sorted_row_lo, row - tallest):np.searchsorted(sorted_row_lo, row, side='right')]
+        band = band[(row_hi[band] >= row) & (col_lo[band] <= col) & (col <= col_hi[band])]
+        return segments[np.sort(band)]
+
+    return candidates
+
+def match_segments_vectorized(track, route_checkpoints, columns, used_locations,
+                              max_gap_seconds, max_segment_meters, chunk_size=DEFAULT_CHUNK_SIZE,
+                              position_bounds=None):
+    """
+    Find checkpoints passed between two consecutive fixes.
+
+    Each segment between fixes i and i+1 is projected onto a local
+    equirectangular plane centred on the checkpoint and tested by closest
+    approach against the checkpoint's radius; the visit time and position are
+    interpolated along the segment. Segments longer than ``max_segment_meters``
+    or spanning more than ``max_gap_seconds`` are ignored, since a straight
+    line is no longer a credible path across them.
+
+    Only segments the route's grid index places near a checkpoint are
+    tested against it. Every checkpoint in ``columns`` (sequence order)
+    takes the earliest hit whose time satisfies its window. A visit is
+    linked to the segment's nearer fix, falling back to the other end,
+    because a fix can only verify one checkpoint; when both ends are in
+    ``used_locations`` the next hit is tried. The set is updated in place.
+
+    Args:
+        track: Track of the report's fixes
+        route_checkpoints: RouteCheckpoint objects ordered by sequence_order
+        columns: Indexes into route_checkpoints still to be matched
+        position_bounds: Optional (low, high) exclusive limits on the track
+            position (segment index + fraction along it) of accepted hits
+
+    Returns:
+        list: (location_index, route_checkpoint, epoch_seconds, latitude, longitude, position) tuples
+    """
+    count = len(track)
+    if count < 2 or len(columns) == 0:
+        return []
+
+    lat_radians = np.radians(track.latitudes)
+    lon_degrees = track.longitudes
+    epochs = track.epochs
+
+    # Segment k joins fix k and fix k + 1
+    gaps = np.diff(epochs)
+    mid_cos = np.cos((lat_radians[:-1] + lat_radians[1:]) / 2)
+    seg_dx = np.radians(_wrap_longitude(np.diff(lon_degrees))) * mid_cos * EARTH_RADIUS_METERS
+    seg_dy = np.diff(lat_radians) * EARTH_RADIUS_METERS
+    usable = (gaps >= 0) & (gaps <= max_gap_seconds) & (np.hypot(seg_dx, seg_dy) <= max_segment_meters)
+    segments = np.flatnonzero(usable)
+    if segments.size == 0:
+        return []
+
+    plan = RoutePlan.compile(route_checkpoints)
+    segments_near = _segment_candidates(plan, track, segments)
+    matches = []
+    for column in columns:
+        rc = plan[column]
+        cp_lon = plan.longitudes[column]
+        cp_lat = plan.lat_radians[column]
+        cos_lat = plan.cos_lat[column]
+        candidates = segments_near(column)
+        for start in range(0, candidates.size, chunk_size):
+            chunk = candidates[start:start + chunk_size]
+            ax = np.radians(_wrap_longitude(lon_degrees[chunk] - cp_lon)) * cos_lat * EARTH_RADIUS_METERS
+            ay = (lat_radians[chunk] - cp_lat) * EARTH_RADIUS_METERS
+            bx = np.radians(_wrap_longitude(lon_degrees[chunk + 1] - cp_lon)) * cos_lat * EARTH_RADIUS_METERS
+            by = (lat_radians[chunk + 1] - cp_lat) * EARTH_RADIUS_METERS
+            distance, fraction = _segment_closest_approach(ax, ay, bx, by)
+            hit = distance <= plan.radii[column]
+            if position_bounds is not None:
+                positions = chunk + fraction
+                hit &= (positions > position_bounds[0]) & (positions < position_bounds[1])
+            times = epochs[chunk] + fraction * gaps[chunk]
+            if plan.has_window[column]:
+                seconds = np.mod(times, 86400)
+                hit &= (plan.window_starts[column] <= seconds) & (seconds <= plan.window_ends[column])
+
+            match = None
+            for k in np.flatnonzero(hit):
+                first, second = int(chunk[k]), int(chunk[k]) + 1
+                if fraction[k] > 0.5:
+                    first, second = second, first
+                location_index = first if first not in used_locations else second
+                if location_index in used_locations:
+                    continue
+                f = float(fraction[k])
+                segment = int(chunk[k])
+                lat_a, lon_a = float(track.latitudes[segment]), float(track.longitudes[segment])
+                lat_b, lon_b = float(track.latitudes[segment + 1]), float(track.longitudes[segment + 1])
+                match = (
+                    location_index, rc, float(times[k]),
+                    lat_a + f * (lat_b - lat_a),
+                    float(_wrap_longitude(lon_a + f * _wrap_longitude(lon_b - lon_a))),
+                    segment + f
+                )
+                break
+            if match is not None:
+                used_locations.add(match[0])
+                matches.append(match)
+                break
+
+    return matches
@@ -0,0 +1,111 @@
+"""
+Compare the streaming CSV parser with the previous csv.DictReader implementation:
+parse time and peak memory of the parsed result.
+
+Usage (from the project root):
+    python -m benchmarks.csv_parser [--rows 100000] [--repeat 3]
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.utils.file_handlers import (
+    validate_and_read_csv_data, EXPECTED_HEADERS, DEVICE_ID_COLUMN_NAME, TIMESTAMP_COLUMN_NAME,
+    LATITUDE_COLUMN_NAME, LONGITUDE_COLUMN_NAME, EVENT_TYPE_COLUMN_NAME, EVENT_DETAILS_COLUMN_NAME,
+    TIMESTAMP_FORMAT
+)
+
+
+def legacy_read_csv(file_path):
+    """The previous csv.DictReader + strptime row loop, kept here as the baseline."""
+    locations_data = []
+    with open(file_path, mode='r', encoding='utf-8-sig') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            device_id = row.get(DEVICE_ID_COLUMN_NAME, '').strip()
+            timestamp = datetime.strptime(row.get(TIMESTAMP_COLUMN_NAME), TIMESTAMP_FORMAT)
+            latitude = float(row.get(LATITUDE_COLUMN_NAME))
+            if not (-90 <= latitude <= 90):
+                raise ValueError("Latitude out of range")
+            longitude = float(row.get(LONGITUDE_COLUMN_NAME))
+            if not (-180 <= longitude <= 180):
+                raise ValueError("Longitude out of range")
+            locations_data.append({
+                'timestamp': timestamp,
+                'latitude': latitude,
+                'longitude': longitude,
+                'event_type': row.get(EVENT_TYPE_COLUMN_NAME),
+                'event_details': row.get(EVENT_DETAILS_COLUMN_NAME),
+                'original_device_id': device_id
+            })
+    return locations_data, locations_data[0]['original_device_id']
+
+
+def write_track_csv(path, rows):
+    start = datetime(2024, 1, 1, 20, 0, 0)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPECTED_HEADERS + [EVENT_TYPE_COLUMN_NAME, EVENT_DETAILS_COLUMN_NAME])
+        for i in range(rows):
+            writer.writerow([
+                '123456789012345',
+                (start + timedelta(seconds=i)).strftime(TIMESTAMP_FORMAT),
+                f"{51.5 + (i % 1000) * 1e-5:.6f}",
+                f"{-0.12 + (i % 700) * 1e-5:.6f}",
+                'GPS',
+                ''
+            ])
+
+
+def best_of(func, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(path)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def peak_memory(func, path):
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context(), tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'track.csv')
+        write_track_csv(path, args.rows)
+
+        legacy_seconds, (legacy_rows, _) = best_of(legacy_read_csv, path, args.repeat)
+        streaming_seconds, (track, _) = best_of(validate_and_read_csv_data, path, args.repeat)
+        assert len(legacy_rows) == len(track), "Parsers disagree on the row count"
+        assert legacy_rows[-1] == track[len(track) - 1], "Parsers disagree on the parsed rows"
+        del legacy_rows, track
+
+        legacy_peak = peak_memory(legacy_read_csv, path)
+        streaming_peak = peak_memory(validate_and_read_csv_data, path)
+
+        print(f"{args.rows} rows, best of {args.repeat}")
+        print(f"  DictReader + strptime : {legacy_seconds:8.3f}s ({args.rows / legacy_seconds:,.0f} rows/s)")
+        print(f"  streaming fast path   : {streaming_seconds:8.3f}s ({args.rows / streaming_seconds:,.0f} rows/s)")
+        print(f"  speedup               : {legacy_seconds / streaming_seconds:8.2f}x")
+        print(f"  peak memory           : {legacy_peak / 2**20:.1f} MiB (list of dicts) vs "
+              f"{streaming_peak / 2**20:.1f} MiB (Track)")
+
+
+if __name__ == '__main__':
+    main()
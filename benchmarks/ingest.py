@@ -0,0 +1,274 @@
+"""
+Time the report pipeline on synthetic patrols: CSV parse, verification, DB
+persistence and the full upload (handle_report_submission_and_processing)
+on in-memory SQLite. Results are printed and written as JSON so runs on
+different commits can be compared.
+
+Usage (from the project root):
+    python -m benchmarks.ingest [--points 1000 10000 100000] [--checkpoints 5 50 500]
+                                [--repeat 3] [--output results.json] [--compare baseline.json]
+
+Add 1000000 to --points for the largest tracks (several minutes per case).
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from werkzeug.datastructures import FileStorage
+
+from app import create_app, db
+from app.models import Client, Device, Site, Checkpoint, Route, RouteCheckpoint, Shift, UploadedPatrolReport
+from app.utils.file_handlers import (
+    validate_and_read_csv_data, EXPECTED_HEADERS, EVENT_TYPE_COLUMN_NAME, EVENT_DETAILS_COLUMN_NAME, TIMESTAMP_FORMAT
+)
+from app.utils.location_persistence import persist_reported_locations, clear_report_results
+from app.utils.report_processing import handle_report_submission_and_processing
+from app.utils.verification import verify_patrol_report
+
+DEFAULT_POINTS = (1000, 10000, 100000)
+DEFAULT_CHECKPOINTS = (5, 50, 500)
+CASES = ('parse', 'verify', 'persist', 'full')
+
+ORIGIN = (51.5, -0.12)
+CHECKPOINT_SPACING_DEGREES = 0.001  # About 110 m between consecutive checkpoints
+TRACK_START = datetime(2024, 1, 1, 20, 0, 0)
+
+
+def checkpoint_positions(count):
+    """Checkpoints on a serpentine through a square grid, so any route length stays compact."""
+    side = max(int(count ** 0.5), 1)
+    positions = []
+    for i in range(count):
+        row, column = divmod(i, side)
+        if row % 2:
+            column = side - 1 - column
+        positions.append((ORIGIN[0] + row * CHECKPOINT_SPACING_DEGREES, ORIGIN[1] + column * CHECKPOINT_SPACING_DEGREES))
+    return positions
+
+
+def create_patrol_setup(checkpoint_count, number=1):
+    """
+    A client (the ``number``th) with one device, site and route of
+    ``checkpoint_count`` checkpoints, in the spirit of
+    app.utils.test_data_generator but sized for benchmarking.
+    Returns (client, device, site, route).
+    """
+    client = Client(name=f"Benchmark Client {number}")
+    db.session.add(client)
+    db.session.flush()
+    device = Device(client_id=client.id, imei=f"35693803{number:07d}", name="Benchmark Unit")
+    site = Site(client_id=client.id, name="Benchmark Site")
+    route = Route(client_id=client.id, name=f"Benchmark Route ({checkpoint_count} checkpoints)")
+    db.session.add_all([device, site, route])
+    db.session.flush()
+    checkpoints = [
+        Checkpoint(client_id=client.id, name=f"CP {i + 1}", latitude=latitude, longitude=longitude, radius=15)
+        for i, (latitude, longitude) in enumerate(checkpoint_positions(checkpoint_count))
+    ]
+    db.session.add_all(checkpoints)
+    db.session.flush()
+    db.session.add_all(
+        RouteCheckpoint(route_id=route.id, checkpoint_id=checkpoint.id, sequence_order=order)
+        for order, checkpoint in enumerate(checkpoints, start=1)
+    )
+    db.session.commit()
+    return client, device, site, route
+
+
+def create_shift(device, site, route):
+    shift = Shift(device_id=device.id, route_id=route.id, site_id=site.id,
+                  start_time=TRACK_START - timedelta(minutes=5), end_time=TRACK_START + timedelta(days=30))
+    db.session.add(shift)
+    db.session.commit()
+    return shift
+
+
+def write_patrol_csv(path, device_imei, checkpoint_count, points):
+    """
+    A track of ``points`` fixes, one per second, walking the route's
+    checkpoints in order with evenly spaced fixes in between (like the
+    'perfect' scenario of test_data_generator).
+    """
+    positions = checkpoint_positions(checkpoint_count)
+    legs = max(len(positions) - 1, 1)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPECTED_HEADERS + [EVENT_TYPE_COLUMN_NAME, EVENT_DETAILS_COLUMN_NAME])
+        for i in range(points):
+            progress = i * legs / max(points - 1, 1)
+            leg = min(int(progress), len(positions) - 1)
+            start, end = positions[leg], positions[min(leg + 1, len(positions) - 1)]
+            fraction = progress - leg
+            writer.writerow([
+                device_imei,
+                (TRACK_START + timedelta(seconds=i)).strftime(TIMESTAMP_FORMAT),
+                f"{start[0] + (end[0] - start[0]) * fraction:.6f}",
+                f"{start[1] + (end[1] - start[1]) * fraction:.6f}",
+                'GPS',
+                ''
+            ])
+
+
+def time_runs(func, repeat, setup=None, teardown=None):
+    """Seconds of each of ``repeat`` calls; setup/teardown run around every call, untimed."""
+    timings = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        func(argument)
+        timings.append(time.perf_counter() - started)
+        if teardown:
+            teardown(argument)
+    return timings
+
+
+def bench_combination(points, checkpoint_count, repeat, workdir, number=1):
+    """Timings of every case for one track size and route size."""
+    client, device, site, route = create_patrol_setup(checkpoint_count, number)
+    shift = create_shift(device, site, route)
+    path = os.path.join(workdir, f'track_{points}_{checkpoint_count}.csv')
+    write_patrol_csv(path, device.imei, checkpoint_count, points)
+    track, _ = validate_and_read_csv_data(path)
+
+    report = UploadedPatrolReport(shift_id=shift.id, filename=os.path.basename(path), file_path=path)
+    db.session.add(report)
+    db.session.commit()
+
+    def clear_locations(_):
+        clear_report_results(report.id)
+        db.session.commit()
+
+    def persist(_):
+        persist_reported_locations(report.id, track)
+        db.session.commit()
+
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    def upload(new_shift):
+        success, _, message, _ = handle_report_submission_and_processing(
+            shift_id=new_shift.id,
+            uploaded_file=FileStorage(stream=BytesIO(content), filename='track.csv'),
+            current_user_id=None,
+            client_id=client.id
+        )
+        if not success:
+            raise RuntimeError(f"Benchmark upload failed: {message}")
+
+    timings = {
+        'parse': time_runs(lambda _: validate_and_read_csv_data(path), repeat),
+        'verify': time_runs(lambda _: verify_patrol_report(report.id, shift, track), repeat),
+        'persist': time_runs(persist, repeat, teardown=clear_locations),
+        # A new shift per run, so the upload is not recognised as a duplicate
+        'full': time_runs(upload, repeat, setup=lambda: create_shift(device, site, route)),
+    }
+    result = verify_patrol_report(report.id, shift, track)
+    return timings, {'visited': len(result.visits), 'missed': len(result.missed), 'file_bytes': os.path.getsize(path)}
+
+
+def summarise(case, points, checkpoint_count, timings, details):
+    best = min(timings)
+    return {
+        'case': case,
+        'points': points,
+        'checkpoints': checkpoint_count,
+        'runs': len(timings),
+        'min_s': round(best, 6),
+        'median_s': round(statistics.median(timings), 6),
+        'max_s': round(max(timings), 6),
+        'points_per_s': round(points / best) if best else None,
+        **details,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(points_list=DEFAULT_POINTS, checkpoint_list=DEFAULT_CHECKPOINTS, repeat=3, progress=None):
+    """Run every case for every (points, checkpoints) pair; returns the JSON-ready result document."""
+    import numpy
+
+    app = create_app('testing')
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        app.config['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+        os.makedirs(app.config['UPLOAD_FOLDER'])
+        with app.app_context():
+            db.create_all()
+            app.logger.setLevel('WARNING')  # Per-report INFO lines would dominate the output
+            for points in points_list:
+                for checkpoint_count in checkpoint_list:
+                    timings, details = bench_combination(points, checkpoint_count, repeat, workdir, number=len(results) + 1)
+                    for case in CASES:
+                        result = summarise(case, points, checkpoint_count, timings[case], details)
+                        results.append(result)
+                        if progress:
+                            progress(result)
+            db.session.remove()
+            db.drop_all()
+    return {
+        'benchmark': 'ingest',
+        'revision': git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'config': {
+            'repeat': repeat,
+            'verification_engine': app.config.get('VERIFICATION_ENGINE'),
+            'verification_matching': app.config.get('VERIFICATION_MATCHING'),
+        },
+        'results': results,
+    }
+
+
+def print_result(result, baseline=None):
+    line = (f"  {result['case']:<8} {result['points']:>8} pts {result['checkpoints']:>4} cps  "
+            f"min {result['min_s']:9.4f}s  median {result['median_s']:9.4f}s  {result['points_per_s'] or 0:>12,} pts/s")
+    if baseline:
+        previous = baseline.get((result['case'], result['points'], result['checkpoints']))
+        if previous and result['min_s']:
+            line += f"  {previous['min_s'] / result['min_s']:5.2f}x vs baseline"
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, nargs='+', default=list(DEFAULT_POINTS))
+    parser.add_argument('--checkpoints', type=int, nargs='+', default=list(DEFAULT_CHECKPOINTS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to show speedups against')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['case'], r['points'], r['checkpoints']): r for r in json.load(f)['results']}
+
+    print(f"Best of {args.repeat} runs on in-memory SQLite", flush=True)
+    document = run_suite(args.points, args.checkpoints, args.repeat, progress=lambda r: print_result(r, baseline))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
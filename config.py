@@ -1,8 +1,6 @@
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
-import logging
-import logging.handlers
 
 # Determine the absolute path of the project's root directory
 # This config.py file is in the root, alongside .env and run.py
@@ -23,8 +21,46 @@ class Config:
     
     # File Upload
     UPLOAD_FOLDER = os.path.join(project_root, 'uploads')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    
+    MAX_CONTENT_LENGTH = 64 * 1024 * 1024  # 64MB max request size
+    UPLOAD_MAX_FILE_SIZE = 64 * 1024 * 1024  # Per uploaded file, enforced while it streams in
+    UPLOAD_SPOOL_TO_DISK = True  # Stream uploaded files straight to UPLOAD_FOLDER instead of buffering them
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes per chunk when copying an upload that was not spooled
+    REPORT_MAX_UNCOMPRESSED_SIZE = 1024 * 1024 * 1024  # Cap on a .csv.gz/.zip report's decompressed size
+
+    # Patrol verification
+    VERIFICATION_ENGINE = os.environ.get('VERIFICATION_ENGINE') or 'vectorized'  # 'vectorized' or 'scalar' (reference)
+    VERIFICATION_MATCHING = os.environ.get('VERIFICATION_MATCHING') or 'first_hit'  # 'first_hit' or 'sequence' (honours sequence_order)
+    VERIFICATION_CHUNK_SIZE = 4096  # Locations per distance-matrix block in the vectorized engine
+    VERIFICATION_SPATIAL_INDEX = True  # Only test checkpoints in the location's grid neighbourhood
+    VERIFICATION_SEGMENT_INTERPOLATION = True  # Also detect checkpoints passed between consecutive fixes
+    VERIFICATION_SEGMENT_MAX_GAP_SECONDS = 120  # Longer gaps are not interpolated
+    VERIFICATION_SEGMENT_MAX_METERS = 1000  # Nor are longer jumps (GPS glitches, device restarts)
+    ROUTE_PLAN_CACHE_SIZE = 128  # Compiled route plans kept per process (LRU)
+    REPORTED_LOCATION_BATCH_SIZE = 2000  # Rows per bulk INSERT when storing a report's track (non-PostgreSQL)
+    DEVICE_IMPORT_LOOKUP_CHUNK_SIZE = 500  # IMEIs per IN (...) query when checking a device CSV for existing devices
+    DEVICE_IMPORT_BATCH_SIZE = 1000  # Devices per bulk INSERT batch when importing a device CSV
+
+    # Background report processing (run workers with `flask process-reports`)
+    REPORT_PROCESSING_ASYNC = os.environ.get('REPORT_PROCESSING_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+    REPORT_JOB_LEASE_SECONDS = 600  # Running jobs whose worker has not renewed their lease for this long are re-claimed
+    REPORT_JOB_MAX_ATTEMPTS = 3
+    REPORT_STATUS_POLL_INTERVAL_MS = 3000  # How often the report page polls the status endpoint
+    BATCH_UPLOAD_MAX_FILES = 100  # Reports per batch upload (files, or CSVs inside uploaded zips)
+    BATCH_UPLOAD_WORKERS = None  # Processes verifying a batch in parallel; None = one per CPU, 0 or 1 = in the request process
+    BATCH_UPLOAD_MATCH_TOLERANCE_MINUTES = 30  # A track may start this long before/after its shift's window
+
+    # SQL instrumentation (per-request query count, DB time and repeated statements)
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'false').lower() in ('1', 'true', 'yes')
+    SQL_INSTRUMENTATION_MAX_QUERIES = 50  # Log requests running more queries than this
+    SQL_INSTRUMENTATION_MAX_DB_MS = 500  # ... or spending longer than this in the database
+    SQL_INSTRUMENTATION_REPEAT_THRESHOLD = 10  # ... or running one statement shape this often (likely N+1)
+
+    # Prometheus metrics at /admin/metrics (scrape with "Authorization: Bearer <METRICS_TOKEN>")
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Endpoint returns 404 while unset
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(project_root, 'instance', 'metrics')  # Shared by the workers on a host
+    METRICS_FLUSH_INTERVAL = 5.0  # Seconds between writes of a process's values to METRICS_DIR
+
     # Session config
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
     
@@ -35,7 +71,10 @@ class Config:
     REMEMBER_COOKIE_HTTPONLY = True
     
     # Logging
-    LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
+    LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')  # Set to log to stderr only, without logs/ultraguard.log
+    LOG_FILE_MAX_BYTES = 10 * 1024 * 1024  # Rotate logs/ultraguard.log at 10MB
+    LOG_FILE_BACKUP_COUNT = 5
+    LOG_QUEUE_SIZE = 10000  # Records waiting for the writer thread; further records are dropped, never blocking a request
     
     @staticmethod
     def init_app(app):
@@ -54,6 +93,8 @@ class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    REPORT_PROCESSING_ASYNC = False
+    METRICS_DIR = None  # Keep metrics in memory
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -71,6 +112,9 @@ class ProductionConfig(Config):
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
     
+    # Queue uploads for the worker process unless explicitly disabled
+    REPORT_PROCESSING_ASYNC = os.environ.get('REPORT_PROCESSING_ASYNC', 'true').lower() in ('1', 'true', 'yes')
+
     # SQLAlchemy Engine Options for Production
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_size': 10,  # Maximum number of connections to keep
@@ -90,28 +134,8 @@ class ProductionConfig(Config):
     
     @classmethod
     def init_app(cls, app):
+        # Logging is set up by create_app (app.utils.logging_queue)
         Config.init_app(app)
-        
-        # Log to stderr in production
-        if app.logger.handlers:
-            for handler in app.logger.handlers:
-                app.logger.removeHandler(handler)
-        if not app.debug and not app.testing:
-            if not os.path.exists('logs'):
-                os.mkdir('logs')
-            file_handler = logging.handlers.RotatingFileHandler(
-                'logs/ultraguard.log',
-                maxBytes=102400,
-                backupCount=10
-            )
-            file_handler.setFormatter(logging.Formatter(
-                '%(asctime)s %(levelname)s: %(message)s '
-                '[in %(pathname)s:%(lineno)d]'
-            ))
-            file_handler.setLevel(logging.INFO)
-            app.logger.addHandler(file_handler)
-            app.logger.setLevel(logging.INFO)
-            app.logger.info('Ultraguard startup')
 
 config_by_name = dict(
     development=DevelopmentConfig,
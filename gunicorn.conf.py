@@ -8,4 +8,10 @@ keepalive = 2
 max_requests = 1000
 max_requests_jitter = 50
 preload_app = True
-reload = False 
\ No newline at end of file
+reload = False 
+
+def on_starting(server):
+    # Start every deploy with fresh metrics; workers write their values to METRICS_DIR
+    from config import Config
+    from app.utils.metrics import clear_directory
+    clear_directory(Config.METRICS_DIR)
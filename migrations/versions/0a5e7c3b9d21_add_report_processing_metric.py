@@ -0,0 +1,41 @@
+"""Add report_processing_metric for per-stage report processing times
+
+Revision ID: 0a5e7c3b9d21
+Revises: f6a1c8e2d947
+Create Date: 2026-10-17 20:35:18.774092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a5e7c3b9d21'
+down_revision = 'f6a1c8e2d947'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_processing_metric',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('report_id', sa.Integer(), nullable=False),
+    sa.Column('stage', sa.String(length=32), nullable=False),
+    sa.Column('wall_ms', sa.Float(), nullable=False),
+    sa.Column('cpu_ms', sa.Float(), nullable=True),
+    sa.Column('rows', sa.Integer(), nullable=True),
+    sa.Column('bytes', sa.BigInteger(), nullable=True),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['report_id'], ['uploaded_patrol_report.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('report_id', 'stage', name='_report_processing_metric_stage_uc')
+    )
+    with op.batch_alter_table('report_processing_metric', schema=None) as batch_op:
+        batch_op.create_index('ix_report_processing_metric_stage_recorded_at', ['stage', 'recorded_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_processing_metric', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_processing_metric_stage_recorded_at')
+
+    op.drop_table('report_processing_metric')
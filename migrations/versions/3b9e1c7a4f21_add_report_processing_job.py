@@ -0,0 +1,42 @@
+"""Add report_processing_job queue table
+
+Revision ID: 3b9e1c7a4f21
+Revises: d52fcaf39ebd
+Create Date: 2026-10-17 09:12:44.301522
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9e1c7a4f21'
+down_revision = 'd52fcaf39ebd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_processing_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('report_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.String(length=100), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('enqueued_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['report_id'], ['uploaded_patrol_report.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('report_id')
+    )
+    with op.batch_alter_table('report_processing_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_report_processing_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_processing_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_report_processing_job_status'))
+
+    op.drop_table('report_processing_job')
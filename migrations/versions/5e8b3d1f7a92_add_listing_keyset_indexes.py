@@ -0,0 +1,38 @@
+"""Add composite indexes for keyset pagination of client portal listings
+
+Revision ID: 5e8b3d1f7a92
+Revises: c41a7e9d2b08
+Create Date: 2026-10-17 15:02:41.208114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b3d1f7a92'
+down_revision = 'c41a7e9d2b08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.create_index('ix_uploaded_patrol_report_upload_timestamp_id', ['upload_timestamp', 'id'], unique=False)
+
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.create_index('ix_shift_start_time_id', ['start_time', 'id'], unique=False)
+
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.create_index('ix_device_client_id_name_id', ['client_id', 'name', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_client_id_name_id')
+
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.drop_index('ix_shift_start_time_id')
+
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.drop_index('ix_uploaded_patrol_report_upload_timestamp_id')
@@ -0,0 +1,26 @@
+"""Add report_processing_job.lease_expires_at for worker heartbeats
+
+Revision ID: 7d3f9b2e6a15
+Revises: 0a5e7c3b9d21
+Create Date: 2026-10-17 18:04:37.918254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3f9b2e6a15'
+down_revision = '0a5e7c3b9d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('report_processing_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('report_processing_job', schema=None) as batch_op:
+        batch_op.drop_column('lease_expires_at')
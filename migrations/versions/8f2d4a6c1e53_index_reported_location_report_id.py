@@ -0,0 +1,26 @@
+"""Index reported_location.report_id for bulk track storage
+
+Revision ID: 8f2d4a6c1e53
+Revises: 3b9e1c7a4f21
+Create Date: 2026-10-17 11:03:27.845102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2d4a6c1e53'
+down_revision = '3b9e1c7a4f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reported_location', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_reported_location_report_id'), ['report_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reported_location', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_reported_location_report_id'))
@@ -0,0 +1,53 @@
+"""Add client_stats rollup of per-client dashboard counters
+
+Revision ID: a7c2e5f8b314
+Revises: 5e8b3d1f7a92
+Create Date: 2026-10-17 15:41:12.094527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e5f8b314'
+down_revision = '5e8b3d1f7a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('client_stats',
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('sites', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('devices', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('routes', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('checkpoints', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('shifts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('reports', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['client_id'], ['client.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('client_id')
+    )
+
+    # Backfill from the current data (`flask rebuild-client-stats` does the same later on)
+    op.execute("""
+        INSERT INTO client_stats (client_id, sites, devices, routes, checkpoints, shifts, reports, updated_at)
+        SELECT c.id,
+            (SELECT COUNT(*) FROM site s WHERE s.client_id = c.id),
+            (SELECT COUNT(*) FROM device d WHERE d.client_id = c.id),
+            (SELECT COUNT(*) FROM route r WHERE r.client_id = c.id),
+            (SELECT COUNT(DISTINCT rc.checkpoint_id) FROM route_checkpoint rc
+                JOIN route r ON rc.route_id = r.id WHERE r.client_id = c.id),
+            (SELECT COUNT(*) FROM shift sh
+                JOIN device d ON sh.device_id = d.id WHERE d.client_id = c.id),
+            (SELECT COUNT(*) FROM uploaded_patrol_report upr
+                JOIN shift sh ON upr.shift_id = sh.id
+                JOIN device d ON sh.device_id = d.id WHERE d.client_id = c.id),
+            CURRENT_TIMESTAMP
+        FROM client c
+    """)
+
+
+def downgrade():
+    op.drop_table('client_stats')
@@ -0,0 +1,30 @@
+"""Add file_sha256, file_size and row_count to uploaded_patrol_report
+
+Revision ID: b9d4f2a6c813
+Revises: e3b7d9a1c456
+Create Date: 2026-10-17 19:11:37.402856
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d4f2a6c813'
+down_revision = 'e3b7d9a1c456'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('file_size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('row_count', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.drop_column('row_count')
+        batch_op.drop_column('file_size')
+        batch_op.drop_column('file_sha256')
@@ -0,0 +1,26 @@
+"""Add route.plan_version for compiled route plan invalidation
+
+Revision ID: c41a7e9d2b08
+Revises: 8f2d4a6c1e53
+Create Date: 2026-10-17 14:26:09.517338
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a7e9d2b08'
+down_revision = '8f2d4a6c1e53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('route', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('plan_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('route', schema=None) as batch_op:
+        batch_op.drop_column('plan_version')
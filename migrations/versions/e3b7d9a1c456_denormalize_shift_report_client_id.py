@@ -0,0 +1,76 @@
+"""Denormalize client_id onto shift and uploaded_patrol_report; add tenant-scoped and FK indexes
+
+Revision ID: e3b7d9a1c456
+Revises: a7c2e5f8b314
+Create Date: 2026-10-17 18:24:09.513207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7d9a1c456'
+down_revision = 'a7c2e5f8b314'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_id', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_id', sa.Integer(), nullable=True))
+
+    # Backfill from the owning device before the columns become NOT NULL
+    op.execute(
+        'UPDATE shift SET client_id = '
+        '(SELECT device.client_id FROM device WHERE device.id = shift.device_id)'
+    )
+    op.execute(
+        'UPDATE uploaded_patrol_report SET client_id = '
+        '(SELECT shift.client_id FROM shift WHERE shift.id = uploaded_patrol_report.shift_id)'
+    )
+
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.alter_column('client_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_shift_client_id_client', 'client', ['client_id'], ['id'])
+        batch_op.drop_index('ix_shift_start_time_id')
+        batch_op.create_index('ix_shift_client_id_start_time_id', ['client_id', 'start_time', 'id'], unique=False)
+        batch_op.create_index('ix_shift_device_id', ['device_id'], unique=False)
+
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.alter_column('client_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_uploaded_patrol_report_client_id_client', 'client', ['client_id'], ['id'])
+        batch_op.drop_index('ix_uploaded_patrol_report_upload_timestamp_id')
+        batch_op.create_index('ix_uploaded_patrol_report_client_id_upload_timestamp_id', ['client_id', 'upload_timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_uploaded_patrol_report_shift_id', ['shift_id'], unique=False)
+
+    with op.batch_alter_table('route_checkpoint', schema=None) as batch_op:
+        batch_op.create_index('ix_route_checkpoint_checkpoint_id', ['checkpoint_id'], unique=False)
+
+    with op.batch_alter_table('verified_visit', schema=None) as batch_op:
+        batch_op.create_index('ix_verified_visit_report_id_visit_timestamp', ['report_id', 'visit_timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('verified_visit', schema=None) as batch_op:
+        batch_op.drop_index('ix_verified_visit_report_id_visit_timestamp')
+
+    with op.batch_alter_table('route_checkpoint', schema=None) as batch_op:
+        batch_op.drop_index('ix_route_checkpoint_checkpoint_id')
+
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.drop_index('ix_uploaded_patrol_report_shift_id')
+        batch_op.drop_index('ix_uploaded_patrol_report_client_id_upload_timestamp_id')
+        batch_op.create_index('ix_uploaded_patrol_report_upload_timestamp_id', ['upload_timestamp', 'id'], unique=False)
+        batch_op.drop_constraint('fk_uploaded_patrol_report_client_id_client', type_='foreignkey')
+        batch_op.drop_column('client_id')
+
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.drop_index('ix_shift_device_id')
+        batch_op.drop_index('ix_shift_client_id_start_time_id')
+        batch_op.create_index('ix_shift_start_time_id', ['start_time', 'id'], unique=False)
+        batch_op.drop_constraint('fk_shift_client_id_client', type_='foreignkey')
+        batch_op.drop_column('client_id')
@@ -0,0 +1,28 @@
+"""Index uploaded_patrol_report (shift_id, file_sha256) for duplicate upload lookups
+
+Revision ID: f6a1c8e2d947
+Revises: b9d4f2a6c813
+Create Date: 2026-10-17 19:48:52.116730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a1c8e2d947'
+down_revision = 'b9d4f2a6c813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.drop_index('ix_uploaded_patrol_report_shift_id')
+        batch_op.create_index('ix_uploaded_patrol_report_shift_id_file_sha256', ['shift_id', 'file_sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('uploaded_patrol_report', schema=None) as batch_op:
+        batch_op.drop_index('ix_uploaded_patrol_report_shift_id_file_sha256')
+        batch_op.create_index('ix_uploaded_patrol_report_shift_id', ['shift_id'], unique=False)
@@ -1,6 +1,8 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import zipfile
+from io import BytesIO
 import pytest
 from app import create_app, db
 from app.models import User, Client, Site, Device, Route, Checkpoint, Shift, UploadedPatrolReport, RouteCheckpoint
@@ -9,8 +11,13 @@ from config import TestingConfig
 from sqlalchemy import select
 
 @pytest.fixture
-def app():
-    app = create_app('testing')
+def app_config(tmp_path):
+    """Settings the app fixture passes to create_app; override this fixture to change them for a module or class."""
+    return {'UPLOAD_FOLDER': str(tmp_path / 'uploads')}
+
+@pytest.fixture
+def app(app_config):
+    app = create_app('testing', app_config)
     
     with app.app_context():
         db.create_all()
@@ -132,6 +139,47 @@ def client(app):
 def runner(app):
     return app.test_cli_runner()
 
+@pytest.fixture
+def logged_in_client(client, client_admin_user):
+    """Test client signed in to the client portal as the client admin."""
+    client.post('/portal/login', data={
+        'username_or_email': 'clientadmin',
+        'password': 'testpass123',
+        'remember_me': False
+    })
+    return client
+
+@pytest.fixture
+def logged_in_admin(client, non_client_user):
+    """Test client signed in to the admin area as the Ultraguard admin."""
+    client.post('/admin/login', data={
+        'username_or_email': 'nonclient',
+        'password': 'testpass123',
+        'remember_me': False
+    })
+    return client
+
+@pytest.fixture
+def make_track_csv():
+    """Builds patrol track CSV bytes: ``rows`` fixes one second apart from ``start`` (now, UTC, by default)."""
+    def make(rows, imei='123456789012345', start=None, latitude=0.0):
+        start = start or datetime.now(timezone.utc).replace(tzinfo=None)
+        lines = ['Device_IMEI,Timestamp,Latitude,Longitude']
+        lines += [f'{imei},{start + timedelta(seconds=i):%Y-%m-%d %H:%M:%S},{latitude},0.0' for i in range(rows)]
+        return ('\n'.join(lines) + '\n').encode()
+    return make
+
+@pytest.fixture
+def make_zip():
+    """Builds zip archive bytes from a {member name: content} dict."""
+    def make(members):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, content in members.items():
+                archive.writestr(name, content)
+        return buffer.getvalue()
+    return make
+
 @pytest.fixture
 def client_admin_user(app):
     with app.app_context():
@@ -0,0 +1,108 @@
+import hashlib
+import os
+from datetime import timedelta
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import pytest
+from app.models import Shift, UploadedPatrolReport
+from app.utils import batch_upload
+from app.utils.batch_upload import match_shift
+from app.utils.uploads import blob_path
+
+def _batch(client, files):
+    return client.post('/portal/reports/batch-upload', data={
+        'report_files': [(BytesIO(content), name) for name, content in files],
+    }, content_type='multipart/form-data')
+
+def test_batch_upload_matches_and_verifies_each_file(app, logged_in_client, make_track_csv):
+    response = _batch(logged_in_client, [
+        ('guard_a.csv', make_track_csv(5)),
+        ('guard_b.csv', make_track_csv(5, latitude=0.00001)),
+        ('guard_a_again.csv', make_track_csv(5)),
+        ('stranger.csv', make_track_csv(5, imei='999999999999999')),
+        ('notes.csv', b'Name,Value\nfoo,1\n'),
+    ])
+    assert response.status_code == 200
+    body = response.data.decode()
+    for status in ('processed', 'duplicate', 'unmatched', 'rejected'):
+        assert status in body
+    with app.app_context():
+        shift = Shift.query.one()
+        reports = UploadedPatrolReport.query.order_by(UploadedPatrolReport.id).all()
+        assert [report.filename for report in reports] == ['guard_a.csv', 'guard_b.csv']
+        assert {report.shift_id for report in reports} == {shift.id}
+        assert {report.processing_status for report in reports} == {'completed'}
+
+def test_zip_of_reports_is_expanded(app, logged_in_client, make_track_csv, make_zip):
+    _batch(logged_in_client, [('week.zip', make_zip({
+        'monday.csv': make_track_csv(3),
+        'tuesday.csv': make_track_csv(3, latitude=0.00002),
+        'readme.txt': b'not a report',
+    }))])
+    with app.app_context():
+        assert sorted(report.filename for report in UploadedPatrolReport.query) == ['monday.csv', 'tuesday.csv']
+
+def test_batch_size_is_limited(app, logged_in_client, make_track_csv):
+    app.config['BATCH_UPLOAD_MAX_FILES'] = 2
+    response = _batch(logged_in_client, [(f'r{i}.csv', make_track_csv(2, latitude=i / 100000)) for i in range(3)])
+    assert b'at most 2 reports' in response.data
+    with app.app_context():
+        assert UploadedPatrolReport.query.count() == 0
+
+def test_match_shift_uses_device_and_time_window(app):
+    with app.app_context():
+        shift = Shift.query.one()
+        client_id, imei = shift.client_id, shift.device.imei
+        assert match_shift(client_id, imei, shift.start_time + timedelta(hours=1)).id == shift.id
+        assert match_shift(client_id, imei, shift.start_time - timedelta(minutes=10)).id == shift.id
+        assert match_shift(client_id, imei, shift.end_time + timedelta(hours=2)) is None
+        assert match_shift(client_id, '999999999999999', shift.start_time) is None
+        assert match_shift(client_id + 1, imei, shift.start_time) is None
+
+def test_rejected_and_unmatched_files_are_not_stored(app, logged_in_client, make_track_csv):
+    unmatched, rejected = make_track_csv(3, imei='999999999999999'), b'Name,Value\nfoo,1\n'
+    _batch(logged_in_client, [('stranger.csv', unmatched), ('notes.csv', rejected)])
+    with app.test_request_context():
+        for content in (unmatched, rejected):
+            assert not os.path.exists(blob_path(hashlib.sha256(content).hexdigest()))
+
+class TestProcessPool:
+    @pytest.fixture
+    def app_config(self, app_config, tmp_path):
+        # Worker processes need a database file they can open
+        return {**app_config, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'batch.db'}", 'BATCH_UPLOAD_WORKERS': 2}
+
+    @pytest.fixture(autouse=True)
+    def discard_pool(self):
+        yield
+        batch_upload._discard_pool()
+
+    def test_reports_are_verified_in_worker_processes(self, app, logged_in_client, make_track_csv):
+        response = _batch(logged_in_client, [
+            ('guard_a.csv', make_track_csv(5)),
+            ('guard_b.csv', make_track_csv(5, latitude=0.00001)),
+        ])
+        assert response.status_code == 200
+        assert batch_upload._pool is not None
+        with app.app_context():
+            reports = UploadedPatrolReport.query.all()
+            assert len(reports) == 2
+            assert {report.processing_status for report in reports} == {'completed'}
+
+    def test_broken_pool_fails_the_batch_and_is_replaced(self, app, logged_in_client, make_track_csv, monkeypatch):
+        class DeadPool:
+            def submit(self, *args):
+                raise BrokenProcessPool('A worker process terminated abruptly')
+
+            def shutdown(self, **kwargs):
+                pass
+
+        monkeypatch.setattr(batch_upload, '_pool', DeadPool())
+        response = _batch(logged_in_client, [
+            ('guard_a.csv', make_track_csv(5)),
+            ('guard_b.csv', make_track_csv(5, latitude=0.00001)),
+        ])
+        assert response.status_code == 200
+        assert batch_upload._pool is None
+        with app.app_context():
+            assert {report.processing_status for report in UploadedPatrolReport.query} == {'error_processing'}
@@ -0,0 +1,11 @@
+import json
+from benchmarks.ingest import CASES, run_suite
+
+def test_ingest_suite_smoke():
+    document = run_suite(points_list=[300], checkpoint_list=[5], repeat=1)
+    json.dumps(document)  # Must serialise for comparison across commits
+    assert [result['case'] for result in document['results']] == list(CASES)
+    for result in document['results']:
+        assert (result['points'], result['checkpoints'], result['runs']) == (300, 5, 1)
+        assert 0 < result['min_s'] <= result['max_s']
+        assert (result['visited'], result['missed']) == (5, 0)
@@ -211,4 +211,164 @@ def test_logout(client, client_admin_user):
     # Try accessing dashboard after logout
     response = client.get('/portal/dashboard', follow_redirects=True)
     assert response.status_code == 200
-    assert b'Please log in to access the client portal' in response.data 
\ No newline at end of file
+    assert b'Please log in to access the client portal' in response.data
+
+def test_report_status_endpoint(client, client_admin_user):
+    """Test the JSON status endpoint polled by the report page"""
+    client.post('/portal/login', data={
+        'username_or_email': 'clientadmin',
+        'password': 'testpass123',
+        'remember_me': False
+    })
+
+    with client.application.app_context():
+        from app import db
+        shift = Shift.query.first()
+        report = UploadedPatrolReport(shift_id=shift.id, filename='queued.csv', processing_status='processing')
+        db.session.add(report)
+        db.session.commit()
+        report_id = report.id
+
+    response = client.get(f'/portal/reports/{report_id}/status')
+    assert response.status_code == 200
+    assert response.json['processing_status'] == 'processing'
+    assert response.json['is_processing'] is True
+
+    response = client.get(f'/portal/reports/{report_id}')
+    assert response.status_code == 200
+    assert b'queued.csv' in response.data
+
+    response = client.get('/portal/reports/9999/status')
+    assert response.status_code == 404
+
+def test_report_listing_keyset_pages(client, client_admin_user):
+    """Reports are paged newest first with stable cursors, including ties on upload_timestamp"""
+    import base64
+    import json
+    import re
+    from datetime import datetime
+    from app import db
+    from app.utils.pagination import keyset_paginate, decode_cursor
+
+    with client.application.app_context():
+        shift = Shift.query.first()
+        same_time = datetime(2026, 1, 1, 12, 0, 0)
+        db.session.add_all([
+            UploadedPatrolReport(shift_id=shift.id, filename=f'report_{i:02d}.csv',
+                                 upload_timestamp=same_time if i % 3 == 0 else datetime(2026, 1, 1, i % 24, 0, 0))
+            for i in range(25)
+        ])
+        db.session.commit()
+        expected = [r.filename for r in UploadedPatrolReport.query.order_by(
+            UploadedPatrolReport.upload_timestamp.desc(), UploadedPatrolReport.id.desc()).all()]
+
+        columns = (UploadedPatrolReport.upload_timestamp, UploadedPatrolReport.id)
+        key = lambda report: (report.upload_timestamp, report.id)
+        seen, pages, cursor = [], [], None
+        while True:
+            page = keyset_paginate(UploadedPatrolReport.query, columns, key, after=cursor, per_page=10, descending=True)
+            pages.append(page)
+            seen.extend(r.filename for r in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        assert seen == expected
+        assert [len(p) for p in pages] == [10, 10, 5]
+        assert not pages[0].has_prev
+
+        back = keyset_paginate(UploadedPatrolReport.query, columns, key, before=pages[2].prev_cursor, per_page=10, descending=True)
+        assert [r.filename for r in back] == [r.filename for r in pages[1]]
+        assert back.has_prev and back.has_next
+        assert decode_cursor('not a cursor!') is None
+
+    client.post('/portal/login', data={
+        'username_or_email': 'clientadmin',
+        'password': 'testpass123',
+        'remember_me': False
+    })
+    response = client.get('/portal/reports')
+    assert response.status_code == 200
+    assert response.data.count(b'report_') == 10
+    next_link = re.search(rb'href="(/portal/reports\?after=[^"]+)"', response.data).group(1)
+    response = client.get(next_link.decode().replace('&amp;', '&'))
+    assert response.status_code == 200
+    assert response.data.count(b'report_') == 10
+    assert b'before=' in response.data
+
+    # A garbled cursor falls back to the first page instead of erroring
+    response = client.get('/portal/reports?after=garbage')
+    assert response.status_code == 200
+
+    # So do well-formed cursors whose values do not fit the sort columns
+    def crafted(values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+    for path, values in [
+        ('/portal/sites', [[1, 2], 5]),
+        ('/portal/reports', [{'dt': '2026-01-01T12:00:00'}, [1]]),
+        ('/portal/reports', ['2026-01-01T12:00:00', 5]),
+        ('/portal/reports', [{'dt': '2026-01-01T12:00:00'}, True]),
+    ]:
+        response = client.get(f'{path}?after={crafted(values)}')
+        assert response.status_code == 200, (path, values)
+    response = client.get(f"/portal/reports?before={crafted(['2026-01-01T12:00:00', 5])}")
+    assert response.status_code == 200
+    assert response.data.count(b'report_') == 10
+
+def test_portal_views_use_fixed_query_counts(client, client_admin_user):
+    """Pages cost the same number of queries with one row or many"""
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models import RouteCheckpoint, VerifiedVisit, ReportedLocation
+    from app.utils.sql_instrumentation import track_queries
+
+    client.post('/portal/login', data={
+        'username_or_email': 'clientadmin',
+        'password': 'testpass123',
+        'remember_me': False
+    })
+
+    def query_counts():
+        counts = {}
+        for path in ('/portal/shifts', '/portal/reports', '/portal/routes', '/portal/reports/upload', f'/portal/reports/{report_id}'):
+            with track_queries() as stats:
+                assert client.get(path).status_code == 200
+            counts[path] = stats.count
+        return counts
+
+    with client.application.app_context():
+        shift = Shift.query.first()
+        report = UploadedPatrolReport(shift_id=shift.id, filename='visits.csv', processing_status='completed')
+        db.session.add(report)
+        db.session.commit()
+        report_id = report.id
+
+    query_counts()  # Warm up: the test session keeps the user and client loaded between requests
+    before = query_counts()
+
+    with client.application.app_context():
+        shift = Shift.query.first()
+        device = Device.query.first()
+        start = datetime(2026, 1, 1, 8, 0, 0)
+        for i in range(8):
+            site = Site(client_id=device.client_id, name=f'Site {i}')
+            route = Route(client_id=device.client_id, name=f'Route {i}')
+            db.session.add_all([site, route])
+            db.session.flush()
+            other = Shift(device_id=device.id, route_id=route.id, site_id=site.id, start_time=start + timedelta(days=i))
+            db.session.add(other)
+            db.session.flush()
+            db.session.add(UploadedPatrolReport(shift_id=other.id, filename=f'r{i}.csv'))
+        for i in range(5):
+            checkpoint = Checkpoint(client_id=device.client_id, name=f'Point {i}', latitude=0.0, longitude=0.0, radius=10.0)
+            db.session.add(checkpoint)
+            db.session.flush()
+            route_checkpoint = RouteCheckpoint(route_id=shift.route_id, checkpoint_id=checkpoint.id, sequence_order=i + 2)
+            location = ReportedLocation(report_id=report_id, timestamp=start + timedelta(minutes=i), latitude=0.0, longitude=0.0)
+            db.session.add_all([route_checkpoint, location])
+            db.session.flush()
+            db.session.add(VerifiedVisit(report_id=report_id, route_checkpoint_id=route_checkpoint.id,
+                                         reported_location_id=location.id, visit_timestamp=location.timestamp,
+                                         visit_latitude=0.0, visit_longitude=0.0))
+        db.session.commit()
+
+    assert query_counts() == before
@@ -0,0 +1,125 @@
+from sqlalchemy import event, select
+from app import db
+from app.models import Client, ClientStats, Site, Device, Route, Checkpoint, RouteCheckpoint, Shift, UploadedPatrolReport
+from app.utils.client_stats import compute_client_stats, get_client_stats, COUNTER_COLUMNS
+
+def _stored(client_id):
+    row = db.session.execute(select(*ClientStats.__table__.c).where(ClientStats.client_id == client_id)).one()
+    return {column: getattr(row, column) for column in COUNTER_COLUMNS}
+
+def _recomputed(client_id):
+    return compute_client_stats(db.session.connection(), [client_id])[client_id]
+
+def test_fixture_data_is_counted(app):
+    with app.app_context():
+        client = Client.query.filter_by(name='Test Client Company').one()
+        assert _stored(client.id) == {'sites': 1, 'devices': 1, 'routes': 1, 'checkpoints': 1, 'shifts': 1, 'reports': 0}
+
+def test_hooks_track_inserts_and_deletes(app):
+    with app.app_context():
+        client = Client.query.filter_by(name='Test Client Company').one()
+        shift = Shift.query.first()
+        route = Route.query.first()
+
+        # A checkpoint shared by two routes is counted once
+        checkpoint = Checkpoint(client_id=client.id, name='Gate', latitude=1.0, longitude=1.0, radius=5.0)
+        second_route = Route(client_id=client.id, name='Night Route')
+        db.session.add_all([checkpoint, second_route])
+        db.session.flush()
+        db.session.add_all([
+            RouteCheckpoint(route_id=route.id, checkpoint_id=checkpoint.id, sequence_order=2),
+            RouteCheckpoint(route_id=second_route.id, checkpoint_id=checkpoint.id, sequence_order=1),
+            UploadedPatrolReport(shift_id=shift.id, filename='a.csv'),
+            UploadedPatrolReport(shift_id=shift.id, filename='b.csv'),
+        ])
+        db.session.commit()
+        assert _stored(client.id) == _recomputed(client.id)
+        assert _stored(client.id)['checkpoints'] == 2
+        assert _stored(client.id)['reports'] == 2
+
+        db.session.delete(UploadedPatrolReport.query.filter_by(filename='a.csv').one())
+        db.session.delete(second_route)
+        db.session.commit()
+        assert _stored(client.id) == _recomputed(client.id)
+        assert _stored(client.id)['routes'] == 1
+
+def test_moving_a_device_recounts_both_clients(app):
+    with app.app_context():
+        client = Client.query.filter_by(name='Test Client Company').one()
+        other = Client(name='Other Client')
+        db.session.add(other)
+        db.session.commit()
+        assert _stored(other.id) == dict.fromkeys(COUNTER_COLUMNS, 0)
+
+        device = Device.query.first()
+        device.client_id = other.id
+        db.session.commit()
+        assert _stored(other.id)['devices'] == 1
+        assert _stored(other.id)['shifts'] == 1
+        assert _stored(client.id)['devices'] == 0
+
+def test_dashboard_reads_one_row(app, logged_in_client):
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = logged_in_client.get('/portal/dashboard')
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    assert not any('count(' in statement.lower() for statement in statements)
+    assert sum('client_stats' in statement for statement in statements) == 1
+
+def test_rebuild_restores_drifted_counters(app, runner):
+    with app.app_context():
+        client_id = Client.query.filter_by(name='Test Client Company').one().id
+        db.session.execute(ClientStats.__table__.update().values(devices=99, reports=-3))
+        db.session.commit()
+
+    result = runner.invoke(args=['rebuild-client-stats'])
+    assert 'Rebuilt dashboard counters for 1 client(s)' in result.output
+    with app.app_context():
+        assert _stored(client_id) == _recomputed(client_id)
+
+        # A client without a row is counted from the base tables, without writing one
+        db.session.execute(ClientStats.__table__.delete())
+        db.session.commit()
+        assert get_client_stats(client_id).devices == 1
+        assert ClientStats.query.count() == 0
+
+        # Later counter changes recreate the row (an upsert, so concurrent writers cannot collide)
+        db.session.add(Device(name='Spare', imei='353000000000001', client_id=client_id))
+        db.session.commit()
+        assert _stored(client_id) == _recomputed(client_id)
+
+def test_bulk_route_checkpoint_delete_recounts(app):
+    with app.app_context():
+        client_id = Client.query.filter_by(name='Test Client Company').one().id
+        route = Route.query.first()
+        checkpoint = Checkpoint(client_id=client_id, name='Gate', latitude=1.0, longitude=1.0, radius=5.0)
+        db.session.add(checkpoint)
+        db.session.flush()
+        db.session.add(RouteCheckpoint(route_id=route.id, checkpoint_id=checkpoint.id, sequence_order=2))
+        db.session.commit()
+        assert _stored(client_id)['checkpoints'] == 2
+
+        # How edit_route removes checkpoints: a bulk Query.delete() skips the mapper hooks
+        RouteCheckpoint.query.filter(
+            RouteCheckpoint.route_id == route.id,
+            RouteCheckpoint.checkpoint_id.in_([checkpoint.id])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        assert _stored(client_id) == _recomputed(client_id)
+        assert _stored(client_id)['checkpoints'] == 1
+
+        # A bulk UPDATE moving a site to another client recounts both
+        other = Client(name='Other Client')
+        db.session.add(other)
+        db.session.commit()
+        Site.query.filter(Site.client_id == client_id).update({'client_id': other.id}, synchronize_session=False)
+        db.session.commit()
+        assert _stored(client_id) == _recomputed(client_id)
+        assert _stored(other.id)['sites'] == 1
@@ -0,0 +1,142 @@
+import io
+from sqlalchemy import event
+from app import db
+from app.models import Client, Device
+from app.utils.device_import import find_existing_devices, bulk_insert_devices, upsert_devices
+
+def _upload(client, client_id, csv_text):
+    return client.post('/admin/devices/upload', data={
+        'client_id': str(client_id),
+        'csv_file': (io.BytesIO(csv_text.encode('utf-8')), 'devices.csv')
+    }, content_type='multipart/form-data', follow_redirects=True)
+
+def _count_queries(engine):
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def test_find_existing_devices_chunks_lookups(app):
+    with app.app_context():
+        imeis = ['123456789012345'] + [f'35000000000{i:04d}' for i in range(25)]
+        statements, stop = _count_queries(db.engine)
+        try:
+            existing = find_existing_devices(imeis, chunk_size=10)
+        finally:
+            stop()
+        assert list(existing) == ['123456789012345']
+        assert existing['123456789012345'].client_name == 'Test Client Company'
+        assert len(statements) == 3
+
+def test_bulk_insert_devices_batches(app):
+    with app.app_context():
+        client_id = Client.query.first().id
+        devices = [
+            {'imei': f'86000000000{i:04d}', 'name': f'Tracker {i}', 'model': 'GT06', 'status': 'active',
+             'last_seen': None, 'notes': ''}
+            for i in range(25)
+        ]
+        statements, stop = _count_queries(db.engine)
+        try:
+            inserted = bulk_insert_devices(client_id, devices, batch_size=10)
+        finally:
+            stop()
+        db.session.commit()
+        assert inserted == 25
+        assert len([s for s in statements if s.startswith('INSERT INTO device')]) == 3
+        assert Device.query.filter(Device.imei.like('86%')).count() == 25
+
+def test_upload_devices_csv(app, logged_in_admin):
+    with app.app_context():
+        client_id = Client.query.first().id
+
+    rows = '\n'.join(f'86100000000{i:04d},Tracker {i},GT06,active,2024-03-14 10:30:00,' for i in range(50))
+    response = _upload(logged_in_admin, client_id, 'imei,name,model,status,last_seen,notes\n' + rows + '\n')
+    assert response.status_code == 200
+    assert b'50 new devices successfully imported' in response.data
+
+    # Existing IMEIs are reported per row and nothing is imported
+    response = _upload(logged_in_admin, client_id,
+                       'imei,name,model\n123456789012345,Dup,GT06\n861999999999999,New,GT06\n')
+    assert b"Row 1: IMEI &#39;123456789012345&#39; already exists" in response.data
+    assert b'Test Client Company' in response.data
+    with app.app_context():
+        assert Device.query.count() == 51
+
+def test_upsert_devices_counts_and_updates(app):
+    with app.app_context():
+        client_id = Client.query.first().id
+        devices = [
+            # Existing fixture device: status and notes change, blank name keeps the stored one
+            {'imei': '123456789012345', 'name': '', 'model': 'Test Model', 'status': 'inactive',
+             'last_seen': None, 'notes': 'Returned to depot'},
+            {'imei': '862000000000001', 'name': 'Tracker 1', 'model': 'GT06', 'status': 'active',
+             'last_seen': None, 'notes': ''},
+        ]
+        result = upsert_devices(client_id, devices, find_existing_devices([d['imei'] for d in devices]))
+        db.session.commit()
+        assert result == (1, 1, 0)
+
+        device = Device.query.filter_by(imei='123456789012345').one()
+        assert (device.name, device.status, device.notes) == ('Test Device', 'inactive', 'Returned to depot')
+
+        # Re-running the same sync writes nothing
+        statements, stop = _count_queries(db.engine)
+        try:
+            result = upsert_devices(client_id, devices, find_existing_devices([d['imei'] for d in devices]))
+        finally:
+            stop()
+        assert result == (0, 0, 2)
+        assert not any(s.lstrip().upper().startswith(('INSERT', 'UPDATE')) for s in statements)
+
+def test_upload_devices_csv_upsert_mode(app, logged_in_admin):
+    with app.app_context():
+        client_id = Client.query.first().id
+        other = Client(name='Other Client')
+        db.session.add(other)
+        db.session.flush()
+        db.session.add(Device(name='Foreign', imei='863000000000009', client_id=other.id))
+        db.session.commit()
+
+    csv_text = ('imei,name,model,status\n'
+                '123456789012345,Renamed,,inactive\n'
+                '862100000000001,Tracker,GT06,active\n')
+    response = logged_in_admin.post('/admin/devices/upload', data={
+        'client_id': str(client_id),
+        'update_existing': 'y',
+        'csv_file': (io.BytesIO(csv_text.encode('utf-8')), 'devices.csv')
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert b'1 added, 1 updated, 0 unchanged' in response.data
+    with app.app_context():
+        device = Device.query.filter_by(imei='123456789012345').one()
+        assert (device.name, device.model, device.status) == ('Renamed', 'Test Model', 'inactive')
+
+    # Devices owned by another client are rejected, not moved
+    response = logged_in_admin.post('/admin/devices/upload', data={
+        'client_id': str(client_id),
+        'update_existing': 'y',
+        'csv_file': (io.BytesIO(b'imei,name,model\n863000000000009,Mine,GT06\n'), 'devices.csv')
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert b'belongs to another client' in response.data
+    with app.app_context():
+        assert Device.query.filter_by(imei='863000000000009').one().name == 'Foreign'
+
+def test_upload_devices_csv_blank_status_keeps_stored_value(app, logged_in_admin):
+    with app.app_context():
+        client_id = Client.query.first().id
+        Device.query.filter_by(imei='123456789012345').one().status = 'inactive'
+        db.session.commit()
+
+    csv_text = ('imei,name,model,status\n'
+                '123456789012345,Test Device,Test Model,\n'
+                '862200000000001,Tracker,GT06,\n')
+    response = logged_in_admin.post('/admin/devices/upload', data={
+        'client_id': str(client_id),
+        'update_existing': 'y',
+        'csv_file': (io.BytesIO(csv_text.encode('utf-8')), 'devices.csv')
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert b'1 added, 0 updated, 1 unchanged' in response.data
+    with app.app_context():
+        assert Device.query.filter_by(imei='123456789012345').one().status == 'inactive'
+        assert Device.query.filter_by(imei='862200000000001').one().status == 'active'
@@ -2,9 +2,10 @@ import pytest
 import io
 import csv
 import os
-from datetime import datetime
+from datetime import datetime, timezone
+import numpy as np
 from app import create_app
-from app.utils.file_handlers import validate_and_read_csv_data, EXPECTED_HEADERS, DEVICE_ID_COLUMN_NAME, TIMESTAMP_COLUMN_NAME, LATITUDE_COLUMN_NAME, LONGITUDE_COLUMN_NAME, TIMESTAMP_FORMAT
+from app.utils.file_handlers import validate_and_read_csv_data, iter_csv_rows, parse_epoch_seconds, EXPECTED_HEADERS, DEVICE_ID_COLUMN_NAME, TIMESTAMP_COLUMN_NAME, LATITUDE_COLUMN_NAME, LONGITUDE_COLUMN_NAME, TIMESTAMP_FORMAT
 from app.exceptions import MissingHeaderError, DataTypeError, CSVValidationError
 
 @pytest.fixture(scope="module")
@@ -104,6 +105,7 @@ def test_validate_read_multiple_device_ids_warns(tmp_path, app_context, caplog):
     locations, device_id = validate_and_read_csv_data(str(p))
     assert device_id in ["IMEI123", "IMEI456"]
     assert len(locations) == 2
+    assert [row['original_device_id'] for row in locations] == ["IMEI123", "IMEI456"]
     assert any("multiple device ids" in r.lower() for r in caplog.text.splitlines())
 
 def test_validate_read_file_not_found(app_context):
@@ -118,4 +120,67 @@ def test_validate_read_csv_with_bom(tmp_path, app_context):
     p.write_text(file_content, encoding="utf-8-sig")
     locations, device_id = validate_and_read_csv_data(str(p))
     assert device_id == "IMEI123"
-    assert len(locations) == 1 
\ No newline at end of file
+    assert len(locations) == 1 
+
+@pytest.mark.parametrize("value", [
+    "2023-01-01 10:00:00",
+    "2024-02-29 23:59:59",
+    "2023-1-1 9:5:7",  # Single-digit fields only parse on the strptime fallback
+])
+def test_parse_epoch_seconds_matches_strptime(value):
+    expected = datetime.strptime(value, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+    day_cache = {}
+    assert parse_epoch_seconds(value, day_cache) == expected
+    assert parse_epoch_seconds(value, day_cache) == expected  # Cached day
+    assert parse_epoch_seconds(value) == expected
+
+@pytest.mark.parametrize("value", ["2023-13-01 10:00:00", "2023-02-30 10:00:00", "2023-01-01 24:00:00", "2023-01-01 1 :00:00", "2023-01-01T10:00:00", "not-a-date"])
+def test_parse_epoch_seconds_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_epoch_seconds(value, {})
+
+def test_data_type_error_reports_row_number(tmp_path, app_context):
+    rows = [
+        {DEVICE_ID_COLUMN_NAME: "IMEI123", TIMESTAMP_COLUMN_NAME: "2023-01-01 10:00:00", LATITUDE_COLUMN_NAME: "34.0", LONGITUDE_COLUMN_NAME: "-118.0"},
+        {DEVICE_ID_COLUMN_NAME: "IMEI123", TIMESTAMP_COLUMN_NAME: "2023-01-01 10:01:00", LATITUDE_COLUMN_NAME: "34.0", LONGITUDE_COLUMN_NAME: "-200.0"},
+    ]
+    p = tmp_path / "bad_second_row.csv"
+    p.write_text(create_csv_content(EXPECTED_HEADERS, rows))
+    with pytest.raises(DataTypeError) as excinfo:
+        validate_and_read_csv_data(str(p))
+    assert excinfo.value.column == LONGITUDE_COLUMN_NAME
+    assert excinfo.value.row_num == 3
+
+def test_iter_csv_rows_streams_typed_rows(tmp_path, app_context):
+    headers = ['Event_Type', LONGITUDE_COLUMN_NAME, LATITUDE_COLUMN_NAME, TIMESTAMP_COLUMN_NAME, DEVICE_ID_COLUMN_NAME]
+    p = tmp_path / "reordered.csv"
+    p.write_text(",".join(headers) + "\nGPS,-118.0,34.0,2023-01-01 10:00:00,IMEI123\n\n,-118.5,34.5,2023-01-01 10:05:00,IMEI123\n")
+    rows = iter_csv_rows(str(p))
+    assert next(rows) == ('IMEI123', datetime(2023, 1, 1, 10, 0, 0).replace(tzinfo=timezone.utc).timestamp(), 34.0, -118.0, 'GPS', None)
+    second = next(rows)
+    assert second[2] == 34.5 and second[4] == ''
+    assert list(rows) == []
+
+def test_validate_read_returns_columnar_track(tmp_path, app_context):
+    rows = [
+        {DEVICE_ID_COLUMN_NAME: "IMEI123", TIMESTAMP_COLUMN_NAME: f"2023-01-01 10:0{i}:00", LATITUDE_COLUMN_NAME: str(34.0 + i), LONGITUDE_COLUMN_NAME: "-118.0"}
+        for i in range(5)
+    ]
+    p = tmp_path / "track.csv"
+    p.write_text(create_csv_content(EXPECTED_HEADERS, rows))
+    track, _ = validate_and_read_csv_data(str(p))
+    assert list(track.latitudes) == [34.0, 35.0, 36.0, 37.0, 38.0]
+    assert track[2]['timestamp'] == datetime(2023, 1, 1, 10, 2, 0)
+
+    tail = track[3:]
+    assert len(tail) == 2
+    assert tail[0]['latitude'] == 37.0
+    assert np.shares_memory(tail.latitudes, track.latitudes)  # Slices are views, not copies
+
+def test_short_row_raises_data_type_error(tmp_path, app_context):
+    p = tmp_path / "short_row.csv"
+    p.write_text(",".join(EXPECTED_HEADERS) + "\nIMEI123,2023-01-01 10:00:00,34.0\n")
+    with pytest.raises(DataTypeError) as excinfo:
+        validate_and_read_csv_data(str(p))
+    assert excinfo.value.column == LONGITUDE_COLUMN_NAME
+    assert excinfo.value.row_num == 2
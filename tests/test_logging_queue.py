@@ -0,0 +1,69 @@
+import logging
+import queue
+from flask.logging import default_handler
+from app.utils import logging_queue
+from app.utils.file_handlers import read_csv_data
+from app.utils.logging_queue import DroppingQueueHandler, RecordSummary, configure_logging
+
+def test_record_summary_logs_once(caplog):
+    logger = logging.getLogger('test_record_summary')
+    with caplog.at_level(logging.WARNING, logger='test_record_summary'):
+        with RecordSummary(logger, 'Rows skipped', max_examples=2) as summary:
+            for row_num in range(2, 1002):
+                summary.add(f'row {row_num}')
+    assert [record.getMessage() for record in caplog.records] == ['Rows skipped: 1000; row 2; row 3 (+998 more)']
+
+def test_record_summary_silent_without_messages(caplog):
+    with caplog.at_level(logging.DEBUG):
+        RecordSummary(logging.getLogger('test_record_summary'), 'Nothing').emit()
+    assert not caplog.records
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger('test_dropping_queue')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(3):
+            logger.warning('message %d', i)
+        assert handler.dropped == 2
+        handler.queue.get_nowait()
+        logger.warning('after')
+        assert handler.queue.get_nowait().getMessage() == 'after (2 earlier log record(s) dropped, queue full)'
+    finally:
+        logger.removeHandler(handler)
+
+def test_configure_logging_writes_through_listener(app, tmp_path):
+    app.config['LOG_FILE_MAX_BYTES'] = 4096
+    try:
+        configure_logging(app, str(tmp_path))
+        assert [type(handler) for handler in app.logger.handlers] == [DroppingQueueHandler]
+        app.logger.info('queued record')
+        logging_queue.stop_listener()  # Drains the queue
+        assert 'queued record' in (tmp_path / 'ultraguard.log').read_text()
+        assert logging_queue._handlers[1].maxBytes == 4096
+    finally:
+        logging_queue.stop_listener()
+        app.logger.removeHandler(logging_queue._queue_handler)
+        app.logger.addHandler(default_handler)
+
+def test_bad_rows_are_summarised(app, tmp_path, caplog):
+    path = tmp_path / 'report.csv'
+    rows = ''.join(f'123,2024-01-01 00:00:00,not-a-number,0\n' for _ in range(50))
+    path.write_text('Device_Identifier,Timestamp,Latitude,Longitude\n' + rows + '123,2024-01-01 00:00:00,1.0,2.0\n')
+    with app.app_context(), caplog.at_level(logging.WARNING):
+        assert len(read_csv_data(str(path))) == 1
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert warnings[0].startswith("Rows skipped in 'report.csv': 50; Error in row 2:")
+
+def test_bad_rows_are_summarised_for_tabular_reports(app, tmp_path, caplog):
+    from app.utils.file_handlers import read_report_data
+    path = tmp_path / 'report.csv'
+    rows = ''.join(f'123,2024-01-01 00:00:00,not-a-number,0\n' for _ in range(20))
+    path.write_text('Device_Identifier,Timestamp,Latitude,Longitude\n' + rows + '123,2024-01-01 00:00:00,1.0,2.0\n')
+    with app.app_context(), caplog.at_level(logging.WARNING):
+        assert len(read_report_data(str(path))) == 1
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert warnings[0].startswith("Rows skipped in 'report.csv': 20; Error in row 2:")
@@ -0,0 +1,111 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+from werkzeug.datastructures import FileStorage
+from app.models import Shift
+from app.utils import metrics
+from app.utils.report_processing import handle_report_submission_and_processing
+
+def _scrape(client, token='scrape-token'):
+    return client.get('/admin/metrics', headers={'Authorization': f'Bearer {token}'})
+
+def _submit_report(rows):
+    timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    content = 'Device_IMEI,Timestamp,Latitude,Longitude\n' + ''.join(f'123456789012345,{timestamp},0.0,{i / 1e7}\n' for i in range(rows))
+    shift = Shift.query.first()
+    return handle_report_submission_and_processing(
+        shift_id=shift.id,
+        uploaded_file=FileStorage(stream=BytesIO(content.encode()), filename='track.csv'),
+        current_user_id=None,
+        client_id=shift.client_id
+    )
+
+def _sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+def test_endpoint_requires_token(app, client):
+    assert _scrape(client).status_code == 404  # No METRICS_TOKEN configured
+    app.config['METRICS_TOKEN'] = 'scrape-token'
+    assert _scrape(client, token='wrong').status_code == 401
+    assert client.get('/admin/metrics').status_code == 401
+    response = _scrape(client)
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+
+def test_request_upload_and_verification_metrics(app, client):
+    app.config['METRICS_TOKEN'] = 'scrape-token'
+    before = _scrape(client).get_data(as_text=True)
+    client.get('/portal/login')
+    _submit_report(rows=40)
+    text = _scrape(client).get_data(as_text=True)
+
+    login_count = 'ultraguard_http_request_duration_seconds_count{endpoint="client_portal.login",method="GET"}'
+    assert _sample(text, login_count) == (_sample(before, login_count) or 0) + 1
+    assert 'ultraguard_http_request_duration_seconds_bucket{endpoint="client_portal.login",method="GET",le="+Inf"}' in text
+    assert _sample(text, 'ultraguard_http_requests_total{endpoint="client_portal.login",method="GET",status="200"}') >= 1
+    assert _sample(text, 'ultraguard_upload_size_bytes_count') == (_sample(before, 'ultraguard_upload_size_bytes_count') or 0) + 1
+    assert _sample(text, 'ultraguard_report_verified_points_total') == (_sample(before, 'ultraguard_report_verified_points_total') or 0) + 40
+    assert _sample(text, 'ultraguard_report_verification_seconds_count') >= 1
+    assert sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith('ultraguard_reports{')) == 1
+
+def test_histogram_exposition():
+    histogram = metrics.Histogram('test_exposition_seconds', 'Test histogram.', ('kind',), buckets=(1, 5))
+    try:
+        for value in (0.5, 2, 3, 10):
+            histogram.observe(value, kind='a"b')
+        text = '\n'.join(metrics._family_lines(
+            histogram.name, histogram.documentation, 'histogram', histogram.values, histogram.labels, histogram.buckets
+        ))
+    finally:
+        del metrics._registry[histogram.name]
+    assert '# TYPE test_exposition_seconds histogram' in text
+    assert 'test_exposition_seconds_bucket{kind="a\\"b",le="1.0"} 1' in text
+    assert 'test_exposition_seconds_bucket{kind="a\\"b",le="5.0"} 3' in text
+    assert 'test_exposition_seconds_bucket{kind="a\\"b",le="+Inf"} 4' in text
+    assert 'test_exposition_seconds_sum{kind="a\\"b"} 15.5' in text
+    assert 'test_exposition_seconds_count{kind="a\\"b"} 4' in text
+
+def _exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def test_values_are_summed_across_processes(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, '_directory', str(tmp_path))
+    own = metrics.VERIFIED_POINTS.values.get((), 0)
+    live_pid, dead_pid = os.getppid(), _exited_pid()
+    snapshot = lambda points, pool: {
+        'ultraguard_report_verified_points_total': {'type': 'counter', 'samples': [[[], points]]},
+        'ultraguard_db_pool_checked_out': {'type': 'gauge', 'samples': [[[str(pool)], 3]]},
+    }
+    (tmp_path / f'{live_pid}-aaaa.json').write_text(json.dumps(snapshot(100, live_pid)))
+    (tmp_path / f'{dead_pid}-bbbb.json').write_text(json.dumps(snapshot(10, dead_pid)))
+
+    totals = metrics.collect()
+    assert totals['ultraguard_report_verified_points_total'][()] == own + 110
+    assert totals['ultraguard_db_pool_checked_out'] == {(str(live_pid),): 3}  # Exited processes hold no connections
+
+    # The exited process's counts move to the archive and keep being reported
+    assert not (tmp_path / f'{dead_pid}-bbbb.json').exists()
+    assert metrics.collect()['ultraguard_report_verified_points_total'][()] == own + 110
+    archive = json.loads((tmp_path / metrics.ARCHIVE_FILENAME).read_text())
+    assert list(archive) == ['ultraguard_report_verified_points_total']
+
+def test_flush_thread_writes_without_new_activity(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, '_directory', str(tmp_path))
+    monkeypatch.setattr(metrics, '_flush_interval', 0.05)
+    metrics.VERIFIED_POINTS.inc(7)
+    metrics._start_flusher()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(metrics._snapshot_path()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    with open(metrics._snapshot_path()) as f:
+        snapshot = json.load(f)
+    assert snapshot['ultraguard_report_verified_points_total']['samples'][0][1] >= 7
@@ -1,5 +1,6 @@
 import pytest
 from datetime import datetime, timezone
+from types import SimpleNamespace
 from io import BytesIO
 from werkzeug.datastructures import FileStorage
 from app import create_app, db
@@ -7,8 +8,8 @@ from app.models import User, Client, Device, Shift, Route, Site, UploadedPatrolR
 from app.utils.report_processing import handle_report_submission_and_processing
 
 @pytest.fixture
-def app():
-    app = create_app('testing')
+def app(tmp_path):
+    app = create_app('testing', {'UPLOAD_FOLDER': str(tmp_path / 'uploads')})
     with app.app_context():
         db.create_all()
         yield app
@@ -229,4 +230,200 @@ def test_empty_csv(app, client_user, test_shift):
         # Verify the report was created with error status
         report = db.session.get(UploadedPatrolReport, report_id)
         assert report is not None
-        assert report.processing_status == 'error_validation' 
\ No newline at end of file
+        assert report.processing_status == 'error_validation'
+
+def test_async_submission_is_queued_and_processed_by_worker(app, client_user, test_shift):
+    """Test that async uploads return immediately and the worker completes them"""
+    from app.models import ReportProcessingJob
+    from app.utils.report_queue import run_worker, JOB_STATUS_QUEUED, JOB_STATUS_DONE
+    with app.app_context():
+        app.config['REPORT_PROCESSING_ASYNC'] = True
+        shift = db.session.get(Shift, test_shift['shift_id'])
+        device = db.session.get(Device, test_shift['device_id'])
+
+        success, msg_category, msg_text, report_id = handle_report_submission_and_processing(
+            shift_id=shift.id,
+            uploaded_file=create_test_csv_file(device.imei),
+            current_user_id=client_user['user_id'],
+            client_id=client_user['client_id']
+        )
+
+        assert success is True
+        assert msg_category == 'info'
+        report = db.session.get(UploadedPatrolReport, report_id)
+        assert report.processing_status == 'processing'
+        assert report.file_path is not None
+        assert report.processing_job.status == JOB_STATUS_QUEUED
+
+        assert run_worker(burst=True) == 1
+
+        report = db.session.get(UploadedPatrolReport, report_id)
+        assert report.processing_status == 'completed'
+        job = ReportProcessingJob.query.filter_by(report_id=report_id).one()
+        assert job.status == JOB_STATUS_DONE
+        assert job.attempts == 1
+        assert run_worker(burst=True) == 0
+
+def test_worker_records_validation_failure(app, client_user, test_shift):
+    """Test that a queued report with bad data ends in an error status and a finished job"""
+    from app.utils.report_queue import run_worker, JOB_STATUS_DONE
+    with app.app_context():
+        app.config['REPORT_PROCESSING_ASYNC'] = True
+        shift = db.session.get(Shift, test_shift['shift_id'])
+
+        _, _, _, report_id = handle_report_submission_and_processing(
+            shift_id=shift.id,
+            uploaded_file=create_test_csv_file('999999999999999'),
+            current_user_id=client_user['user_id'],
+            client_id=client_user['client_id']
+        )
+        run_worker(burst=True)
+
+        report = db.session.get(UploadedPatrolReport, report_id)
+        assert report.processing_status == 'error_device_mismatch'
+        assert report.processing_job.status == JOB_STATUS_DONE
+        assert 'device id' in report.processing_job.last_error.lower()
+
+def test_reported_locations_and_visits_are_persisted(app, client_user, test_shift):
+    """Test that the CSV track is stored in bulk and visits link to their fixes"""
+    from app.models import ReportedLocation, VerifiedVisit
+    with app.app_context():
+        device = db.session.get(Device, test_shift['device_id'])
+
+        success, _, _, report_id = handle_report_submission_and_processing(
+            shift_id=test_shift['shift_id'],
+            uploaded_file=create_test_csv_file(device.imei),
+            current_user_id=client_user['user_id'],
+            client_id=client_user['client_id']
+        )
+        assert success is True
+
+        locations = ReportedLocation.query.filter_by(report_id=report_id).order_by(ReportedLocation.id).all()
+        assert [(loc.latitude, loc.longitude) for loc in locations] == [(51.5074, -0.1278), (51.5075, -0.1279)]
+
+        visits = VerifiedVisit.query.filter_by(report_id=report_id).all()
+        assert len(visits) == 2
+        location_ids = {loc.id for loc in locations}
+        assert all(visit.reported_location_id in location_ids for visit in visits)
+
+def test_persist_reported_locations_batches_and_reprocessing(app, client_user, test_shift):
+    """Test batched inserts keep row order and reprocessing replaces earlier rows"""
+    from app.models import ReportedLocation
+    from app.utils.location_persistence import persist_reported_locations, clear_report_results
+    with app.app_context():
+        report = UploadedPatrolReport(
+            shift_id=test_shift['shift_id'],
+            uploaded_by_user_id=client_user['user_id'],
+            filename='bulk.csv',
+            processing_status='processing'
+        )
+        db.session.add(report)
+        db.session.flush()
+
+        start = datetime(2024, 1, 1, 8, 0, 0)
+        locations = [
+            {'timestamp': start, 'latitude': 51.0 + i * 1e-5, 'longitude': -0.1, 'event_type': 'GPS', 'event_details': None}
+            for i in range(25)
+        ]
+        location_ids = persist_reported_locations(report.id, locations, batch_size=7)
+        assert len(location_ids) == 25
+        stored = [db.session.get(ReportedLocation, location_id).latitude for location_id in location_ids]
+        assert stored == [loc['latitude'] for loc in locations]
+
+        clear_report_results(report.id)
+        new_ids = persist_reported_locations(report.id, locations[:3])
+        assert len(new_ids) == 3
+        assert ReportedLocation.query.filter_by(report_id=report.id).count() == 3
+
+def test_processing_report_is_reused_only_while_its_job_is_live(app, client_user, test_shift):
+    """Test that a re-upload joins a queued report however old, but reprocesses one whose running job's lease has run out"""
+    from datetime import timedelta
+    from app.models import ReportProcessingJob
+    from app.utils.report_queue import claim_next_job
+    with app.app_context():
+        app.config['REPORT_PROCESSING_ASYNC'] = True
+        content = create_test_csv_file('123456789012345').read()
+
+        def submit():
+            return handle_report_submission_and_processing(
+                shift_id=test_shift['shift_id'],
+                uploaded_file=FileStorage(stream=BytesIO(content), filename='test_report.csv'),
+                current_user_id=client_user['user_id'],
+                client_id=client_user['client_id']
+            )[3]
+
+        report_id = submit()
+        job = ReportProcessingJob.query.filter_by(report_id=report_id).one()
+        job.enqueued_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
+        db.session.commit()
+        assert submit() == report_id  # Still waiting in a backlog
+
+        job = claim_next_job('stalled-worker')
+        assert submit() == report_id
+        job.lease_expires_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+        db.session.commit()
+        assert submit() != report_id
+
+def test_running_job_is_reclaimed_only_after_its_lease(app, client_user, test_shift):
+    """Test that a job left running by a dead worker is claimed again once its lease has expired"""
+    from datetime import timedelta
+    from app.utils.report_queue import claim_next_job, JOB_STATUS_RUNNING
+    with app.app_context():
+        app.config['REPORT_PROCESSING_ASYNC'] = True
+        handle_report_submission_and_processing(
+            shift_id=test_shift['shift_id'],
+            uploaded_file=create_test_csv_file('123456789012345'),
+            current_user_id=client_user['user_id'],
+            client_id=client_user['client_id']
+        )
+        job = claim_next_job('dead-worker')
+        assert job.status == JOB_STATUS_RUNNING
+        assert claim_next_job('other-worker') is None  # Still within its lease
+
+        job.lease_expires_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+        db.session.commit()
+        reclaimed = claim_next_job('other-worker')
+        assert reclaimed.id == job.id
+        assert (reclaimed.worker_id, reclaimed.attempts) == ('other-worker', 2)
+
+def test_job_lease_heartbeat(app, client_user, test_shift):
+    """Test that a running worker keeps its job by renewing the lease, and stops once the job is reclaimed"""
+    from datetime import timedelta
+    from app.models import ReportProcessingJob, ReportedLocation
+    from app.exceptions import JobLeaseLostError
+    from app.utils.report_queue import claim_next_job, run_job, JobLease, JOB_STATUS_RUNNING
+    with app.app_context():
+        app.config['REPORT_PROCESSING_ASYNC'] = True
+        handle_report_submission_and_processing(
+            shift_id=test_shift['shift_id'],
+            uploaded_file=create_test_csv_file('123456789012345'),
+            current_user_id=client_user['user_id'],
+            client_id=client_user['client_id']
+        )
+        job = claim_next_job('slow-worker')
+        lease = JobLease(job)
+        lease()  # Renewed less than a third of the lease ago: nothing to do
+        expires_at = job.lease_expires_at
+
+        lease.renewed_at -= app.config['REPORT_JOB_LEASE_SECONDS']
+        lease()
+        db.session.expire_all()
+        job = db.session.get(ReportProcessingJob, job.id)
+        assert job.lease_expires_at > expires_at
+        assert claim_next_job('other-worker') is None
+
+        # Another worker took the job over after the lease expired
+        job.lease_expires_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+        db.session.commit()
+        claim_next_job('other-worker')
+        lease.renewed_at -= app.config['REPORT_JOB_LEASE_SECONDS']
+        with pytest.raises(JobLeaseLostError):
+            lease()
+
+        # The stale worker's run_job leaves the job and the report to the new owner
+        app.config['REPORT_JOB_LEASE_SECONDS'] = 0  # Renew between every stage
+        stale = SimpleNamespace(id=job.id, report_id=job.report_id, worker_id='slow-worker', attempts=1)
+        assert run_job(stale) is False
+        job = db.session.get(ReportProcessingJob, job.id)
+        assert (job.status, job.worker_id) == (JOB_STATUS_RUNNING, 'other-worker')
+        assert ReportedLocation.query.filter_by(report_id=job.report_id).count() == 0
@@ -0,0 +1,133 @@
+import pytest
+from datetime import datetime, timedelta, time
+from sqlalchemy import event
+from app import create_app, db
+from app.models import Client, Device, Site, Route, Checkpoint, RouteCheckpoint, Shift, UploadedPatrolReport
+from app.utils.route_plan import load_route_plan, get_route_plan_cache, RoutePlanCache, RoutePlan
+from app.utils.verification import verify_patrol_report
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def route_setup(app):
+    with app.app_context():
+        client = Client(name='Plan Client')
+        db.session.add(client)
+        db.session.flush()
+        device = Device(imei='123456789012345', name='Device', client_id=client.id)
+        site = Site(name='Site', client_id=client.id)
+        route = Route(name='Route', client_id=client.id)
+        db.session.add_all([device, site, route])
+        db.session.flush()
+        cp1 = Checkpoint(name='CP1', latitude=10.0, longitude=20.0, radius=50, client_id=client.id)
+        cp2 = Checkpoint(name='CP2', latitude=10.01, longitude=20.01, radius=50, client_id=client.id)
+        db.session.add_all([cp1, cp2])
+        db.session.flush()
+        db.session.add_all([
+            RouteCheckpoint(route_id=route.id, checkpoint_id=cp1.id, sequence_order=1),
+            RouteCheckpoint(route_id=route.id, checkpoint_id=cp2.id, sequence_order=2),
+        ])
+        shift = Shift(device_id=device.id, route_id=route.id, site_id=site.id,
+                      start_time=datetime.now(), end_time=datetime.now() + timedelta(hours=1))
+        db.session.add(shift)
+        db.session.flush()
+        report = UploadedPatrolReport(shift_id=shift.id, filename='test.csv', processing_status='processing')
+        db.session.add(report)
+        db.session.commit()
+        return {'route_id': route.id, 'checkpoint_ids': [cp1.id, cp2.id], 'shift_id': shift.id, 'report_id': report.id}
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+def count_queries(func):
+    counter = QueryCounter()
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    try:
+        func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', counter)
+    return counter.statements
+
+def test_plan_is_compiled_once_per_version(app, route_setup):
+    with app.app_context():
+        plan = load_route_plan(route_setup['route_id'])
+        assert [rc.checkpoint.name for rc in plan] == ['CP1', 'CP2']
+        assert plan.cos_lat[0] == pytest.approx(0.984807753)
+        assert not plan.latitudes.flags.writeable
+
+        statements = count_queries(lambda: load_route_plan(route_setup['route_id']))
+        assert len(statements) == 1  # Only the plan_version lookup
+        assert 'checkpoint' not in statements[0].lower().split('from')[1]
+        assert load_route_plan(route_setup['route_id']) is plan
+
+def test_repeated_verification_skips_route_queries(app, route_setup):
+    with app.app_context():
+        shift = db.session.get(Shift, route_setup['shift_id'])
+        locations = [{'timestamp': datetime(2024, 1, 1, 22, 0), 'latitude': 10.0, 'longitude': 20.0}]
+        verify_patrol_report(route_setup['report_id'], shift, locations)
+
+        statements = count_queries(lambda: verify_patrol_report(route_setup['report_id'], shift, locations))
+        assert not any('route_checkpoint' in s for s in statements)
+        assert get_route_plan_cache().hits >= 1
+
+@pytest.mark.parametrize('change', ['checkpoint', 'route_checkpoint', 'new_route_checkpoint', 'bulk_delete'])
+def test_route_changes_invalidate_plan(app, route_setup, change):
+    with app.app_context():
+        route_id = route_setup['route_id']
+        plan = load_route_plan(route_id)
+
+        if change == 'checkpoint':
+            db.session.get(Checkpoint, route_setup['checkpoint_ids'][0]).radius = 75
+        elif change == 'route_checkpoint':
+            RouteCheckpoint.query.filter_by(route_id=route_id, sequence_order=2).one().expected_time_window_start = time(8, 0)
+        elif change == 'new_route_checkpoint':
+            route = db.session.get(Route, route_id)
+            checkpoint = db.session.get(Checkpoint, route_setup['checkpoint_ids'][0])
+            db.session.add(RouteCheckpoint(route=route, checkpoint=checkpoint, sequence_order=3))
+        else:
+            RouteCheckpoint.query.filter_by(route_id=route_id, sequence_order=2).delete(synchronize_session=False)
+        db.session.commit()
+
+        new_plan = load_route_plan(route_id)
+        assert new_plan is not plan
+        assert new_plan.version > plan.version
+        if change == 'checkpoint':
+            assert new_plan.radii[0] == 75
+        elif change == 'new_route_checkpoint':
+            assert len(new_plan) == 3
+        elif change == 'bulk_delete':
+            assert len(new_plan) == 1
+
+def test_unrelated_changes_keep_plan(app, route_setup):
+    with app.app_context():
+        plan = load_route_plan(route_setup['route_id'])
+        db.session.get(Site, 1).description = 'Updated'
+        db.session.commit()
+        assert load_route_plan(route_setup['route_id']) is plan
+
+        # Bulk statements on other tables do not invalidate either
+        Site.query.filter_by(id=1).update({'description': 'Bulk update'}, synchronize_session=False)
+        db.session.commit()
+        assert load_route_plan(route_setup['route_id']) is plan
+
+def test_cache_evicts_least_recently_used():
+    cache = RoutePlanCache(maxsize=2)
+    plans = [RoutePlan(route_id, 1, []) for route_id in (1, 2, 3)]
+    cache.put(plans[0])
+    cache.put(plans[1])
+    assert cache.get(1, 1) is plans[0]  # Route 1 is now most recently used
+    cache.put(plans[2])
+    assert cache.get(2, 1) is None
+    assert cache.get(1, 1) is plans[0]
+    assert cache.get(3, 2) is None  # Stale version
@@ -0,0 +1,89 @@
+import random
+import pytest
+from app.utils.spatial_index import CheckpointGridIndex
+from app.utils.verification import calculate_distance
+
+def test_empty_index_has_no_candidates():
+    index = CheckpointGridIndex([], [], [])
+    assert index.size == 0
+
+def test_candidates_include_checkpoint_cell_and_neighbours():
+    index = CheckpointGridIndex([10.0, 11.0], [20.0, 21.0], [50, 50])
+    assert list(index.candidates(10.0, 20.0)) == [0]
+    assert list(index.candidates(11.0, 21.0)) == [1]
+    assert list(index.candidates(10.5, 20.5)) == []
+
+def test_candidates_are_in_sequence_order():
+    index = CheckpointGridIndex([34.0520, 34.0522, 34.0521], [-118.2435, -118.2437, -118.2436], [30, 30, 30])
+    assert list(index.candidates(34.0521, -118.2436)) == [0, 1, 2]
+
+def test_index_never_prunes_a_checkpoint_within_radius():
+    rng = random.Random(7)
+    lats = [34.05 + rng.uniform(-0.01, 0.01) for _ in range(60)]
+    lons = [-118.24 + rng.uniform(-0.01, 0.01) for _ in range(60)]
+    radii = [rng.choice([10, 25, 50]) for _ in range(60)]
+    index = CheckpointGridIndex(lats, lons, radii)
+    assert not index.exhaustive
+
+    for _ in range(2000):
+        lat = 34.05 + rng.uniform(-0.011, 0.011)
+        lon = -118.24 + rng.uniform(-0.011, 0.011)
+        candidates = set(index.candidates(lat, lon))
+        for column in range(60):
+            if calculate_distance(lat, lon, lats[column], lons[column]) <= radii[column]:
+                assert column in candidates
+
+@pytest.mark.parametrize('latitude, longitude', [(89.9, 0.0), (0.0, 179.99995)])
+def test_index_falls_back_to_exhaustive_near_pole_or_antimeridian(latitude, longitude):
+    index = CheckpointGridIndex([latitude], [longitude], [50])
+    assert index.exhaustive
+    assert list(index.candidates(-45.0, -90.0)) == [0]
+
+def _planned_route(positions, radius):
+    from app.utils.route_plan import PlannedCheckpoint, PlannedRouteCheckpoint, RoutePlan
+    return RoutePlan.compile([
+        PlannedRouteCheckpoint(column + 1, 1, column + 1, column + 1, None, None,
+                               PlannedCheckpoint(column + 1, f'CP {column + 1}', lat, lon, radius))
+        for column, (lat, lon) in enumerate(positions)
+    ])
+
+def _track(positions, seconds=5):
+    from datetime import datetime, timedelta
+    from app.utils.track import Track
+    start = datetime(2024, 1, 1, 22, 0, 0)
+    return Track.from_locations([
+        {'timestamp': start + timedelta(seconds=i * seconds), 'latitude': lat, 'longitude': lon}
+        for i, (lat, lon) in enumerate(positions)
+    ])
+
+def test_segment_prefilter_matches_full_scan():
+    from app.utils.verification_vectorized import match_segments_vectorized
+    rng = random.Random(11)
+    checkpoints = [(34.05 + rng.uniform(-0.005, 0.005), -118.24 + rng.uniform(-0.005, 0.005)) for _ in range(40)]
+    walk, lat, lon = [], 34.05, -118.24
+    for _ in range(400):
+        lat += rng.uniform(-0.0004, 0.0004)
+        lon += rng.uniform(-0.0004, 0.0004)
+        walk.append((lat, lon))
+    track = _track(walk)
+    options = dict(max_gap_seconds=120, max_segment_meters=1000)
+
+    indexed = _planned_route(checkpoints, 25)
+    assert not indexed.index.exhaustive
+    full = _planned_route(checkpoints, 25)
+    full.index.exhaustive = True
+    columns = list(range(len(checkpoints)))
+    found = match_segments_vectorized(track, indexed, columns, used_locations=set(), **options)
+    expected = match_segments_vectorized(track, full, columns, used_locations=set(), **options)
+    assert found == expected
+    assert len(found) > 5
+
+def test_segment_match_falls_back_when_both_fixes_are_used():
+    from app.utils.verification_vectorized import match_segments_vectorized
+    plan = _planned_route([(10.0, 20.0)], 50)
+    # The track crosses the checkpoint twice: between fixes 0-1 and again between 2-3
+    track = _track([(10.0, 19.9991), (10.0, 20.0009), (10.0010, 20.0009), (10.0, 19.9991)], seconds=30)
+    used = {0, 1}
+    found = match_segments_vectorized(track, plan, [0], used_locations=used, max_gap_seconds=120, max_segment_meters=1000)
+    assert [match[0] for match in found] == [3]
+    assert used == {0, 1, 3}
@@ -0,0 +1,50 @@
+import logging
+import pytest
+from app import db
+from app.models import Client, Device
+from app.utils.sql_instrumentation import track_queries, query_budget, QueryBudgetExceeded, statement_shape
+
+def test_statement_shape_folds_in_lists():
+    assert statement_shape('SELECT  id\n FROM device WHERE imei IN (?, ?, ?)') == 'SELECT id FROM device WHERE imei IN (...)'
+    assert statement_shape('SELECT 1 WHERE a IN (%(a_1)s, %(a_2)s)') == 'SELECT 1 WHERE a IN (...)'
+
+def test_track_queries_counts_and_groups_repeats(app):
+    with app.app_context():
+        client_id = Client.query.first().id
+        with track_queries() as stats:
+            for _ in range(3):
+                db.session.get(Device, 1, populate_existing=True)
+            Client.query.filter_by(id=client_id).all()
+        assert stats.count == 4
+        assert stats.total_seconds > 0
+        assert stats.repeated(3)[0][1] == 3
+
+        # Nested blocks both see the inner statements
+        with track_queries() as outer:
+            with track_queries() as inner:
+                Client.query.all()
+        assert outer.count == inner.count == 1
+
+def test_query_budget_failure_lists_repeats(app):
+    with app.app_context():
+        with pytest.raises(QueryBudgetExceeded, match='3x SELECT'):
+            with query_budget(2):
+                for _ in range(3):
+                    db.session.get(Device, 1, populate_existing=True)
+
+def test_portal_pages_within_query_budget(logged_in_client):
+    for path, budget in (('/portal/dashboard', 6), ('/portal/reports', 8), ('/portal/shifts', 8)):
+        with query_budget(budget):
+            assert logged_in_client.get(path).status_code == 200
+
+class TestRequestInstrumentation:
+    @pytest.fixture
+    def app_config(self, app_config):
+        return {**app_config, 'SQL_INSTRUMENTATION': True, 'SQL_INSTRUMENTATION_MAX_QUERIES': 1}
+
+    def test_request_instrumentation_logs_over_threshold(self, app, logged_in_client, caplog):
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            response = logged_in_client.get('/portal/dashboard')
+        assert response.status_code == 200
+        assert 'queries"' in response.headers['Server-Timing']
+        assert any('SQL: GET /portal/dashboard' in record.getMessage() for record in caplog.records)
@@ -0,0 +1,71 @@
+from datetime import datetime
+from io import BytesIO
+from werkzeug.datastructures import FileStorage
+from app import db
+from app.models import Shift, UploadedPatrolReport, ReportProcessingMetric
+from app.utils.report_processing import handle_report_submission_and_processing
+from app.utils.stage_metrics import StageTimer, stage_percentiles, report_stage_metrics, STAGES
+
+def _submit(app, rows=50, imei='123456789012345'):
+    timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    content = 'Device_IMEI,Timestamp,Latitude,Longitude\n' + ''.join(f'{imei},{timestamp},0.0,{i / 1e7}\n' for i in range(rows))
+    shift = Shift.query.first()
+    return handle_report_submission_and_processing(
+        shift_id=shift.id,
+        uploaded_file=FileStorage(stream=BytesIO(content.encode()), filename='track.csv'),
+        current_user_id=None,
+        client_id=shift.client_id
+    )
+
+def test_every_stage_is_recorded(app):
+    with app.app_context():
+        success, _, _, report_id = _submit(app, rows=50)
+        assert success
+        metrics = report_stage_metrics(report_id)
+        assert [metric.stage for metric in metrics] == list(STAGES)
+        by_stage = {metric.stage: metric for metric in metrics}
+        assert by_stage['parse'].rows == 50
+        assert by_stage['parse'].bytes == by_stage['save'].bytes > 0
+        assert all(metric.wall_ms >= 0 and metric.cpu_ms >= 0 for metric in metrics)
+
+def test_failed_report_keeps_the_stages_it_ran(app):
+    with app.app_context():
+        success, _, _, report_id = _submit(app, imei='999999999999999')
+        assert not success
+        assert [metric.stage for metric in report_stage_metrics(report_id)] == ['save', 'parse', 'device_check']
+
+def test_rerecording_replaces_earlier_samples(app):
+    with app.app_context():
+        _, _, _, report_id = _submit(app)
+        timer = StageTimer()
+        with timer.stage('verify', rows=7):
+            pass
+        timer.record(report_id)
+        db.session.commit()
+        verify = ReportProcessingMetric.query.filter_by(report_id=report_id, stage='verify').all()
+        assert [metric.rows for metric in verify] == [7]
+
+def test_percentiles_per_stage(app):
+    with app.app_context():
+        shift = Shift.query.first()
+        ReportProcessingMetric.query.delete()
+        for wall_ms in range(1, 101):
+            report = UploadedPatrolReport(shift_id=shift.id, filename=f'{wall_ms}.csv')
+            db.session.add(report)
+            db.session.flush()
+            db.session.add(ReportProcessingMetric(report_id=report.id, stage='parse', wall_ms=float(wall_ms), rows=1000))
+        db.session.add(ReportProcessingMetric(report_id=report.id, stage='verify', wall_ms=2000.0, cpu_ms=1000.0))
+        db.session.commit()
+
+        parse, verify = stage_percentiles()
+        assert (parse.stage, parse.count, parse.p50, parse.p95, parse.p99) == ('parse', 100, 50.0, 95.0, 99.0)
+        assert parse.rows_per_second == 100 * 1000 / (5050 / 1000)
+        assert (verify.count, verify.p99, verify.mean_cpu_ms, verify.rows_per_second) == (1, 2000.0, 1000.0, None)
+
+def test_admin_metrics_page(app, logged_in_admin):
+    with app.app_context():
+        _submit(app)
+    response = logged_in_admin.get('/admin/reports/processing-metrics?days=7')
+    assert response.status_code == 200
+    assert b'p95' in response.data
+    assert b'device_check' in response.data
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+from app import db
+from app.models import User
+from app.commands import BASELINE_REVISION
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Measured at about 1 s and 85 MB; the budgets leave room for slower machines
+STARTUP_SECONDS_BUDGET = 3.0
+STARTUP_RSS_MB_BUDGET = 120
+
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+from app import create_app
+app = create_app('production')
+seconds = time.perf_counter() - started
+
+def peak_rss_mb():
+    # VmHWM starts afresh at exec; ru_maxrss can include the forking parent's peak
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+print(json.dumps({
+    'seconds': seconds,
+    'rss_mb': peak_rss_mb(),
+    'modules': sorted(name for name in ('pandas', 'openpyxl') if name in sys.modules),
+}))
+"""
+
+def test_production_startup_budget(tmp_path):
+    database = tmp_path / 'startup.db'
+    env = dict(
+        os.environ,
+        SECRET_KEY='startup-test',
+        DATABASE_URL=f'sqlite:///{database}',
+        LOG_TO_STDOUT='1',
+        METRICS_DIR=str(tmp_path / 'metrics'),
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', STARTUP_SCRIPT], cwd=PROJECT_ROOT, env=env,
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert not database.exists()  # create_app never connects to the database
+    assert measured['modules'] == []  # pandas is only imported by the XLSX/CSV helpers that need it
+    assert measured['seconds'] < STARTUP_SECONDS_BUDGET, measured
+    assert measured['rss_mb'] < STARTUP_RSS_MB_BUDGET, measured
+
+def test_init_db_creates_tables_and_admin(app, runner):
+    db.session.remove()  # The fixture's users are about to be dropped
+    db.drop_all()
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    assert 'Database tables created successfully' in result.output
+    with app.app_context():
+        assert inspect(db.engine).has_table('users')
+        admin = User.query.filter_by(username='admin').one()
+        assert admin.role == 'ULTRAGUARD_ADMIN'
+        # Stamped at the latest migration, so `flask db upgrade` has nothing left to apply
+        assert db.session.execute(text('SELECT version_num FROM alembic_version')).scalar() == ScriptDirectory(os.path.join(PROJECT_ROOT, 'migrations')).get_current_head()
+
+def test_init_db_leaves_existing_database_alone(app, runner):
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    assert 'Database tables exist' in result.output
+    with app.app_context():
+        assert User.query.filter_by(username='admin').first() is None
+        # Tables created before migrations were tracked: `flask db upgrade` applies everything since the baseline
+        assert db.session.execute(text('SELECT version_num FROM alembic_version')).scalar() == BASELINE_REVISION
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app import db
+from app.models import Client, Device, Shift, UploadedPatrolReport
+
+def _client_ids(model):
+    return set(db.session.execute(select(model.client_id)).scalars())
+
+def test_client_id_is_copied_on_insert(app):
+    with app.app_context():
+        client = Client.query.filter_by(name='Test Client Company').one()
+        shift = Shift.query.first()
+        assert shift.client_id == client.id
+
+        report = UploadedPatrolReport(shift_id=shift.id, filename='tenant.csv')
+        db.session.add(report)
+        db.session.commit()
+        assert report.client_id == client.id
+
+def test_moving_a_device_carries_its_shifts_and_reports(app):
+    with app.app_context():
+        other = Client(name='Other Client')
+        db.session.add(other)
+        shift = Shift.query.first()
+        db.session.add(UploadedPatrolReport(shift_id=shift.id, filename='tenant.csv'))
+        db.session.commit()
+
+        device = Device.query.first()
+        device.client_id = other.id
+        db.session.commit()
+        db.session.expire_all()
+        assert _client_ids(Shift) == {other.id}
+        assert _client_ids(UploadedPatrolReport) == {other.id}
+
+def test_moving_a_shift_to_another_clients_device(app):
+    with app.app_context():
+        other = Client(name='Other Client')
+        db.session.add(other)
+        db.session.flush()
+        other_device = Device(client_id=other.id, imei='999999999999999', name='Other Device')
+        db.session.add(other_device)
+        shift = Shift.query.first()
+        db.session.add(UploadedPatrolReport(shift_id=shift.id, filename='tenant.csv'))
+        db.session.commit()
+
+        shift.device_id = other_device.id
+        db.session.commit()
+        db.session.expire_all()
+        assert Shift.query.first().client_id == other.id
+        assert _client_ids(UploadedPatrolReport) == {other.id}
+
+def test_listing_filters_on_own_client_id(app, logged_in_client):
+    with app.app_context():
+        other = Client(name='Other Client')
+        db.session.add(other)
+        db.session.flush()
+        other_device = Device(client_id=other.id, imei='999999999999999', name='Other Device')
+        db.session.add(other_device)
+        db.session.flush()
+        shift = Shift.query.first()
+        db.session.add(Shift(device_id=other_device.id, route_id=shift.route_id, site_id=shift.site_id,
+                             start_time=datetime.now() + timedelta(days=1), notes='other client shift'))
+        db.session.commit()
+
+    response = logged_in_client.get('/portal/shifts')
+    assert response.status_code == 200
+    assert b'Test Device' in response.data
+    assert b'Other Device' not in response.data
@@ -0,0 +1,65 @@
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+from app.utils.track import Track, TrackBuilder, to_epoch_seconds, from_epoch_seconds
+
+
+def _build(count):
+    start = datetime(2024, 1, 1, 22, 0, 0)
+    builder = TrackBuilder()
+    for i in range(count):
+        builder.append('IMEI123', to_epoch_seconds(start + timedelta(seconds=i)),
+                       51.5 + i * 1e-6, -0.12, 'GPS' if i % 2 else 'ALARM', None)
+    return builder.build()
+
+
+def test_epoch_round_trip_keeps_microseconds():
+    value = datetime(2024, 5, 17, 13, 45, 12, 654321)
+    assert from_epoch_seconds(to_epoch_seconds(value)) == value
+
+
+def test_event_types_are_interned():
+    track = _build(10)
+    assert track.event_types == [None, 'ALARM', 'GPS']
+    assert track.event_type_codes.dtype == np.intc
+    assert [track[i]['event_type'] for i in range(3)] == ['ALARM', 'GPS', 'ALARM']
+    assert track[0]['event_details'] is None
+
+
+def test_from_locations_matches_row_access():
+    locations = [
+        {'timestamp': datetime(2024, 1, 1, 8, 0, 0), 'latitude': 10.0, 'longitude': 20.0, 'original_device_id': 'A'},
+        {'timestamp': datetime(2024, 1, 1, 8, 0, 5), 'latitude': 10.5, 'longitude': 20.5, 'event_type': 'GPS', 'original_device_id': 'B'},
+    ]
+    track = Track.from_locations(locations)
+    assert track.device_ids == ['A', 'B']
+    assert track.device_id == 'A'
+    assert [row['original_device_id'] for row in track] == ['A', 'B']
+    assert track[1:][0]['original_device_id'] == 'B'
+    assert track[1]['timestamp'] == locations[1]['timestamp']
+    assert list(track.seconds_of_day()) == [8 * 3600, 8 * 3600 + 5]
+
+
+def test_slices_share_memory():
+    track = _build(100)
+    window = track[10:20]
+    assert len(window) == 10
+    assert np.shares_memory(window.epochs, track.epochs)
+    assert window[0] == track[10]
+
+
+def test_track_memory_is_an_order_of_magnitude_below_dicts():
+    count = 50000
+    tracemalloc.start()
+    track = _build(count)
+    _, track_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    dicts = [track[i] for i in range(count)]
+    dicts_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert track.nbytes == count * (3 * 8 + 2 * np.dtype(np.intc).itemsize)
+    assert track_peak * 10 < dicts_current
+    assert len(dicts) == count
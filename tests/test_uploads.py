@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import os
+from io import BytesIO
+from werkzeug.datastructures import FileStorage
+from app.models import Shift, UploadedPatrolReport
+from app.utils.file_handlers import save_uploaded_file
+from app.utils.uploads import INCOMING_DIRECTORY, blob_path
+
+def _incoming(app):
+    return os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], INCOMING_DIRECTORY))
+
+def _upload(client, content, filename='track.csv'):
+    with client.application.app_context():
+        shift_id = Shift.query.first().id
+    return client.post('/portal/reports/upload', data={
+        'shift_id': shift_id,
+        'report_file': (BytesIO(content), filename),
+    }, content_type='multipart/form-data')
+
+def test_upload_is_hashed_and_counted_while_streaming(app, logged_in_client, make_track_csv):
+    content = make_track_csv(250)
+    _upload(logged_in_client, content)
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert report.file_sha256 == hashlib.sha256(content).hexdigest()
+        assert report.file_size == len(content)
+        assert report.row_count == 250
+        with open(report.file_path, 'rb') as f:
+            assert f.read() == content
+    # The spooled part was moved into place, not copied
+    assert _incoming(app) == []
+
+def test_oversized_upload_is_rejected_while_streaming(app, logged_in_client, make_track_csv):
+    app.config['UPLOAD_MAX_FILE_SIZE'] = 4096
+    response = _upload(logged_in_client, make_track_csv(500))
+    assert response.status_code == 413
+    assert _incoming(app) == []
+    with app.app_context():
+        assert UploadedPatrolReport.query.count() == 0
+
+def test_binary_content_is_rejected(app, logged_in_client):
+    _upload(logged_in_client, b'PK\x03\x04\x00\x00binary' * 100)
+    assert _incoming(app) == []
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert report.processing_status == 'error_validation'
+        assert report.file_path is None
+
+def test_unspooled_stream_is_copied_in_chunks(app, make_track_csv):
+    app.config['UPLOAD_CHUNK_SIZE'] = 100
+    content = make_track_csv(40).replace(b'\n', b'\r\n').rstrip(b'\r\n')  # No trailing newline
+    with app.app_context():
+        saved = save_uploaded_file(FileStorage(stream=BytesIO(content), filename='track.csv'))
+        assert saved.sha256 == hashlib.sha256(content).hexdigest()
+        assert saved.path == blob_path(saved.sha256)
+        assert (saved.size, saved.row_count) == (len(content), 40)
+        with open(saved.path, 'rb') as f:
+            assert f.read() == content
+
+def test_duplicate_upload_reuses_the_existing_report(app, logged_in_client, make_track_csv):
+    content = make_track_csv(20)
+    _upload(logged_in_client, content)
+    response = _upload(logged_in_client, content, filename='same_track_again.csv')
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert response.headers['Location'].endswith(f'/portal/reports/{report.id}')
+        assert report.file_path == blob_path(hashlib.sha256(content).hexdigest())
+
+    # Different content for the same shift is a new report, stored as a new blob
+    _upload(logged_in_client, make_track_csv(21))
+    with app.app_context():
+        reports = UploadedPatrolReport.query.order_by(UploadedPatrolReport.id).all()
+        assert len(reports) == 2
+        assert reports[0].file_path != reports[1].file_path
+    assert _incoming(app) == []
+
+def test_failed_report_is_not_reused(app, logged_in_client, make_track_csv):
+    content = make_track_csv(5, imei='999999999999999')  # Not the shift's device
+    _upload(logged_in_client, content)
+    _upload(logged_in_client, content)
+    with app.app_context():
+        reports = UploadedPatrolReport.query.all()
+        assert [report.processing_status for report in reports] == ['error_device_mismatch'] * 2
+        # Both point at the one stored copy
+        assert reports[0].file_path == reports[1].file_path
+
+def test_gzip_upload_is_parsed_while_decompressing(app, logged_in_client, make_track_csv):
+    content = gzip.compress(make_track_csv(300))
+    _upload(logged_in_client, content, filename='track.csv.gz')
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert report.processing_status == 'completed'
+        assert report.file_sha256 == hashlib.sha256(content).hexdigest()
+        assert report.file_size == len(content)
+        assert report.row_count == 300
+        with open(report.file_path, 'rb') as f:
+            assert f.read() == content  # Stored compressed
+
+def test_zip_upload(app, logged_in_client, make_track_csv, make_zip):
+    _upload(logged_in_client, make_zip({'__MACOSX/._track.csv': b'\x00', 'exports/track.csv': make_track_csv(10)}), filename='track.zip')
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert report.processing_status == 'completed'
+        assert report.row_count == 10
+
+def test_zip_with_several_csvs_is_rejected(app, logged_in_client, make_track_csv, make_zip):
+    _upload(logged_in_client, make_zip({'a.csv': make_track_csv(2), 'b.csv': make_track_csv(2)}), filename='tracks.zip')
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert report.processing_status == 'error_validation'
+        assert 'exactly one CSV' in report.error_message
+
+def test_decompressed_size_is_capped(app, logged_in_client, make_track_csv):
+    app.config['REPORT_MAX_UNCOMPRESSED_SIZE'] = 10 * 1024
+    _upload(logged_in_client, gzip.compress(make_track_csv(2000)), filename='track.csv.gz')
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert report.processing_status == 'error_validation'
+        assert 'exceeds' in report.error_message
+
+def test_compressed_name_with_text_content_is_rejected(app, logged_in_client, make_track_csv):
+    _upload(logged_in_client, make_track_csv(2), filename='track.csv.gz')
+    with app.app_context():
+        report = UploadedPatrolReport.query.one()
+        assert report.processing_status == 'error_validation'
+        assert report.file_path is None
@@ -1,5 +1,5 @@
 import pytest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 from app import create_app, db
 from app.models import Client, Device, Site, Route, Checkpoint, RouteCheckpoint, Shift, UploadedPatrolReport
 from app.utils.verification import verify_patrol_report, VerificationLogicError
@@ -66,7 +66,7 @@ def test_all_checkpoints_visited(app, setup_route_with_checkpoints):
             {'timestamp': datetime.now(), 'latitude': 10.0, 'longitude': 20.0},
             {'timestamp': datetime.now(), 'latitude': 11.0, 'longitude': 21.0}
         ]
-        verified, missed = verify_patrol_report(report.id, shift, locations)
+        verified, missed, _ = verify_patrol_report(report.id, shift, locations)
         assert len(verified) == 2
         assert len(missed) == 0
 
@@ -81,7 +81,7 @@ def test_some_checkpoints_missed(app, setup_route_with_checkpoints):
         locations = [
             {'timestamp': datetime.now(), 'latitude': 10.0, 'longitude': 20.0}
         ]
-        verified, missed = verify_patrol_report(report.id, shift, locations)
+        verified, missed, _ = verify_patrol_report(report.id, shift, locations)
         assert len(verified) == 1
         assert len(missed) == 1
 
@@ -96,7 +96,7 @@ def test_all_checkpoints_missed(app, setup_route_with_checkpoints):
         locations = [
             {'timestamp': datetime.now(), 'latitude': 0.0, 'longitude': 0.0}
         ]
-        verified, missed = verify_patrol_report(report.id, shift, locations)
+        verified, missed, _ = verify_patrol_report(report.id, shift, locations)
         assert len(verified) == 0
         assert len(missed) == 2
 
@@ -112,7 +112,7 @@ def test_points_outside_radius(app, setup_route_with_checkpoints):
             {'timestamp': datetime.now(), 'latitude': 10.5, 'longitude': 20.5},
             {'timestamp': datetime.now(), 'latitude': 11.5, 'longitude': 21.5}
         ]
-        verified, missed = verify_patrol_report(report.id, shift, locations)
+        verified, missed, _ = verify_patrol_report(report.id, shift, locations)
         assert len(verified) == 0
         assert len(missed) == 2
 
@@ -166,7 +166,214 @@ def test_duplicate_verification_attempts(app, setup_route_with_checkpoints):
             {'timestamp': datetime.now(), 'latitude': 10.0, 'longitude': 20.0},
             {'timestamp': datetime.now(), 'latitude': 10.0, 'longitude': 20.0}
         ]
-        verified, missed = verify_patrol_report(report.id, shift, locations)
+        verified, missed, _ = verify_patrol_report(report.id, shift, locations)
         # Only one should be counted for the checkpoint
         assert len(verified) == 1
-        assert len(missed) == 1 
\ No newline at end of file
+        assert len(missed) == 1 
+
+@pytest.mark.parametrize('engine', ['scalar', 'vectorized'])
+def test_engines_verify_same_checkpoints(app, setup_route_with_checkpoints, engine):
+    with app.app_context():
+        app.config['VERIFICATION_ENGINE'] = engine
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+
+        # Second checkpoint is reached first; the first is reached afterwards
+        locations = [
+            {'timestamp': datetime.now(), 'latitude': 0.0, 'longitude': 0.0},
+            {'timestamp': datetime.now(), 'latitude': 11.0, 'longitude': 21.0},
+            {'timestamp': datetime.now(), 'latitude': 10.0, 'longitude': 20.0}
+        ]
+        verified, missed, _ = verify_patrol_report(data['report_id'], shift, locations)
+        assert [v.route_checkpoint_id for v in verified] == list(reversed(data['route_checkpoint_ids']))
+        assert missed == []
+
+def test_vectorized_engine_matches_scalar_reference(app, setup_route_with_checkpoints):
+    import random
+    with app.app_context():
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        rng = random.Random(42)
+        start = datetime(2024, 1, 1, 8, 0, 0)
+        # Noisy track wandering around both checkpoints, split across several chunks
+        locations = [
+            {
+                'timestamp': start + timedelta(seconds=i),
+                'latitude': rng.choice([10.0, 11.0]) + rng.uniform(-0.001, 0.001),
+                'longitude': rng.choice([20.0, 21.0]) + rng.uniform(-0.001, 0.001)
+            }
+            for i in range(500)
+        ]
+
+        app.config['VERIFICATION_ENGINE'] = 'scalar'
+        scalar_verified, scalar_missed, _ = verify_patrol_report(data['report_id'], shift, locations)
+        app.config['VERIFICATION_ENGINE'] = 'vectorized'
+        app.config['VERIFICATION_CHUNK_SIZE'] = 64
+        vector_verified, vector_missed, _ = verify_patrol_report(data['report_id'], shift, locations)
+
+        assert [(v.route_checkpoint_id, v.visit_timestamp) for v in vector_verified] == \
+            [(v.route_checkpoint_id, v.visit_timestamp) for v in scalar_verified]
+        assert [rc.id for rc in vector_missed] == [rc.id for rc in scalar_missed]
+
+def test_unknown_verification_engine(app, setup_route_with_checkpoints):
+    with app.app_context():
+        app.config['VERIFICATION_ENGINE'] = 'quantum'
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        locations = [{'timestamp': datetime.now(), 'latitude': 10.0, 'longitude': 20.0}]
+        with pytest.raises(VerificationLogicError):
+            verify_patrol_report(data['report_id'], shift, locations)
+
+@pytest.mark.parametrize('engine', ['scalar', 'vectorized'])
+def test_time_window_respected(app, setup_route_with_checkpoints, engine):
+    from datetime import time
+    with app.app_context():
+        app.config['VERIFICATION_ENGINE'] = engine
+        data = setup_route_with_checkpoints
+        rc1 = db.session.get(RouteCheckpoint, data['route_checkpoint_ids'][0])
+        rc1.expected_time_window_start = time(9, 0)
+        rc1.expected_time_window_end = time(10, 0)
+        db.session.commit()
+        shift = db.session.get(Shift, data['shift_id'])
+
+        locations = [
+            {'timestamp': datetime(2024, 1, 1, 8, 30), 'latitude': 10.0, 'longitude': 20.0},
+            {'timestamp': datetime(2024, 1, 1, 9, 30), 'latitude': 10.0, 'longitude': 20.0}
+        ]
+        verified, missed, _ = verify_patrol_report(data['report_id'], shift, locations)
+        assert len(verified) == 1
+        assert verified[0].visit_timestamp == datetime(2024, 1, 1, 9, 30)
+        assert len(missed) == 1
+
+@pytest.mark.parametrize('engine', ['scalar', 'vectorized'])
+def test_spatial_index_does_not_change_results(app, setup_route_with_checkpoints, engine):
+    with app.app_context():
+        app.config['VERIFICATION_ENGINE'] = engine
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        locations = [
+            {'timestamp': datetime.now(), 'latitude': 10.0003, 'longitude': 20.0002},
+            {'timestamp': datetime.now(), 'latitude': 10.5, 'longitude': 20.5},
+            {'timestamp': datetime.now(), 'latitude': 11.0, 'longitude': 21.0004}
+        ]
+
+        app.config['VERIFICATION_SPATIAL_INDEX'] = False
+        full_verified, full_missed, _ = verify_patrol_report(data['report_id'], shift, locations)
+        app.config['VERIFICATION_SPATIAL_INDEX'] = True
+        indexed_verified, indexed_missed, _ = verify_patrol_report(data['report_id'], shift, locations)
+
+        assert [v.route_checkpoint_id for v in indexed_verified] == [v.route_checkpoint_id for v in full_verified]
+        assert len(indexed_verified) == 2
+        assert indexed_missed == full_missed == []
+
+@pytest.mark.parametrize('engine', ['scalar', 'vectorized'])
+def test_sparse_fixes_detect_checkpoint_on_segment(app, setup_route_with_checkpoints, engine):
+    """Two fixes ~100 m either side of CP1 (radius 50 m), 60 s apart, pass through it"""
+    with app.app_context():
+        app.config['VERIFICATION_ENGINE'] = engine
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        start = datetime(2024, 1, 1, 22, 0, 0)
+        locations = [
+            {'timestamp': start, 'latitude': 10.0, 'longitude': 19.9991},
+            {'timestamp': start + timedelta(seconds=60), 'latitude': 10.0, 'longitude': 20.0009},
+        ]
+        verified, missed, _ = verify_patrol_report(data['report_id'], shift, locations, location_ids=[101, 102])
+        assert [v.route_checkpoint_id for v in verified] == [data['route_checkpoint_ids'][0]]
+        visit = verified[0]
+        assert visit.visit_timestamp == start + timedelta(seconds=30)
+        assert visit.visit_latitude == pytest.approx(10.0)
+        assert visit.visit_longitude == pytest.approx(20.0)
+        assert visit.reported_location_id in (101, 102)
+        assert [rc.id for rc in missed] == [data['route_checkpoint_ids'][1]]
+
+        app.config['VERIFICATION_SEGMENT_INTERPOLATION'] = False
+        verified, missed, _ = verify_patrol_report(data['report_id'], shift, locations)
+        assert verified == []
+
+def test_segment_interpolation_skips_long_gaps_and_jumps(app, setup_route_with_checkpoints):
+    with app.app_context():
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        start = datetime(2024, 1, 1, 22, 0, 0)
+        long_gap = [
+            {'timestamp': start, 'latitude': 10.0, 'longitude': 19.9991},
+            {'timestamp': start + timedelta(minutes=10), 'latitude': 10.0, 'longitude': 20.0009},
+        ]
+        verified, _, _ = verify_patrol_report(data['report_id'], shift, long_gap)
+        assert verified == []
+
+        jump = [
+            {'timestamp': start, 'latitude': 9.99, 'longitude': 19.99},
+            {'timestamp': start + timedelta(seconds=30), 'latitude': 10.01, 'longitude': 20.01},
+        ]
+        verified, _, _ = verify_patrol_report(data['report_id'], shift, jump)
+        assert verified == []
+
+def test_segment_visit_respects_time_window(app, setup_route_with_checkpoints):
+    with app.app_context():
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        rc1 = db.session.get(RouteCheckpoint, data['route_checkpoint_ids'][0])
+        rc1.expected_time_window_start = time(22, 0, 40)
+        rc1.expected_time_window_end = time(23, 0, 0)
+        db.session.commit()
+
+        start = datetime(2024, 1, 1, 22, 0, 0)
+        locations = [
+            {'timestamp': start, 'latitude': 10.0, 'longitude': 19.9991},
+            {'timestamp': start + timedelta(seconds=60), 'latitude': 10.0, 'longitude': 20.0009},
+        ]
+        # The interpolated pass at 22:00:30 falls before the window
+        verified, _, _ = verify_patrol_report(data['report_id'], shift, locations)
+        assert verified == []
+
+def test_longest_ordered_chain_prefers_in_sequence_visits():
+    from app.utils.route_matching import longest_ordered_chain
+    # Checkpoint 2 is hit first (fix 0), then 0, 1, 2 in order
+    points = [0, 1, 2, 3]
+    columns = [2, 0, 1, 2]
+    assert longest_ordered_chain(points, columns) == [(1, 0), (2, 1), (3, 2)]
+    # A single fix never verifies two checkpoints
+    assert longest_ordered_chain([5, 5], [0, 1]) == [(5, 0)]
+    assert longest_ordered_chain([], []) == []
+
+def test_longest_ordered_chain_handles_revisited_checkpoint():
+    from app.utils.route_matching import longest_ordered_chain
+    # Route HQ(0) -> A(1) -> HQ(2): both HQ columns are hit by every HQ fix
+    points = [0, 0, 1, 5, 5]
+    columns = [0, 2, 1, 0, 2]
+    assert longest_ordered_chain(points, columns) == [(0, 0), (1, 1), (5, 2)]
+
+def test_sequence_matching_reports_out_of_order_visits(app, setup_route_with_checkpoints):
+    with app.app_context():
+        app.config['VERIFICATION_MATCHING'] = 'sequence'
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        start = datetime(2024, 1, 1, 22, 0, 0)
+        # CP2 is visited before CP1, so only one of them can count in sequence
+        locations = [
+            {'timestamp': start, 'latitude': 11.0, 'longitude': 21.0},
+            {'timestamp': start + timedelta(minutes=30), 'latitude': 10.0, 'longitude': 20.0},
+        ]
+        verified, missed, out_of_order = verify_patrol_report(
+            data['report_id'], shift, locations
+        )
+        assert len(verified) == 1
+        assert len(missed) == 1
+        assert out_of_order == missed
+
+        app.config['VERIFICATION_MATCHING'] = 'first_hit'
+        verified, missed, out_of_order = verify_patrol_report(
+            data['report_id'], shift, locations
+        )
+        assert len(verified) == 2
+        assert missed == [] and out_of_order == []
+
+def test_unknown_matching_mode(app, setup_route_with_checkpoints):
+    with app.app_context():
+        app.config['VERIFICATION_MATCHING'] = 'bogus'
+        data = setup_route_with_checkpoints
+        shift = db.session.get(Shift, data['shift_id'])
+        with pytest.raises(VerificationLogicError):
+            verify_patrol_report(data['report_id'], shift, [{'timestamp': datetime.now(), 'latitude': 10.0, 'longitude': 20.0}])